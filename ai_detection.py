@@ -0,0 +1,289 @@
+"""Long-document AI text detection with overlapping token windows.
+
+The detector model only sees 512 tokens at a time. Rather than truncating a
+long text, it is tokenized once (with character offsets), split into
+overlapping windows of at most `window_tokens` tokens, and all windows are
+classified in a single batched forward pass. The document score is the mean of
+the window scores weighted by the tokens each window adds to the coverage, so
+overlapping tokens are only counted once. Cost grows linearly with the text
+and is bounded by `max_windows`; tokens past the last window are not scored.
+
+The detector itself comes from one of several inference backends (see
+`load_detector`): the full-precision PyTorch pipeline, the same model with
+dynamic int8 quantization of its linear layers, or an exported ONNX Runtime
+graph. All of them return pipeline-style `{"label", "score"}` predictions and
+a model callable usable by `score_long_document`.
+"""
+import functools
+import hashlib
+import os
+import tempfile
+import time
+
+import torch
+from transformers import AutoConfig, AutoModelForSequenceClassification, AutoTokenizer, pipeline
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+AI_LABELS = ("Fake", "LABEL_1")  # roberta-base-openai-detector: 'Fake' is GPT-2 output
+HUMAN_LABELS = ("Real", "LABEL_0")
+
+DEFAULT_WINDOW_TOKENS = 512
+DEFAULT_OVERLAP_TOKENS = 128
+DEFAULT_MAX_WINDOWS = 16
+
+
+def window_spans(n_tokens, window_size, overlap, max_windows=None):
+    """Token (start, end) spans covering `n_tokens`, plus whether the cap cut coverage short.
+
+    Windows advance by `window_size - overlap`; the last window is aligned to
+    the end of the text so it is as full as possible.
+    """
+    if window_size < 1 or not 0 <= overlap < window_size:
+        raise ValueError("window_size must be positive and overlap in [0, window_size)")
+    if n_tokens <= window_size:
+        return [(0, n_tokens)], False
+    starts = list(range(0, n_tokens - window_size, window_size - overlap)) + [n_tokens - window_size]
+    truncated = max_windows is not None and len(starts) > max_windows
+    if truncated:
+        starts = starts[:max_windows]
+    return [(start, start + window_size) for start in starts], truncated
+
+
+def ai_label_index(id2label):
+    """Index of the AI-generated class in a model's id2label mapping, or None if unrecognised."""
+    for index, label in id2label.items():
+        if label in AI_LABELS:
+            return int(index)
+    human = [int(index) for index, label in id2label.items() if label in HUMAN_LABELS]
+    if len(id2label) == 2 and human:
+        return 1 - human[0]
+    return None
+
+
+def ai_score_from_prediction(label, score):
+    """Probability of AI generation from a pipeline prediction, or None for an unknown label."""
+    if label in AI_LABELS:
+        return score
+    if label in HUMAN_LABELS:
+        return 1.0 - score
+    return None
+
+
+def _special_token_ids(tokenizer):
+    first = tokenizer.cls_token_id if tokenizer.cls_token_id is not None else tokenizer.bos_token_id
+    last = tokenizer.sep_token_id if tokenizer.sep_token_id is not None else tokenizer.eos_token_id
+    return ([first] if first is not None else []), ([last] if last is not None else [])
+
+
+def score_long_document(text, tokenizer, model, window_tokens=DEFAULT_WINDOW_TOKENS,
+                        overlap_tokens=DEFAULT_OVERLAP_TOKENS, max_windows=DEFAULT_MAX_WINDOWS):
+    """Classify a text of any length with a sequence-classification model.
+
+    Returns a dict shaped like the /api/checkAiText response (`ai_score`,
+    `prediction_label`, `model_score`) plus `windows`, one entry per window
+    with its character span and AI score, `n_tokens`, `scored_chars` and
+    `truncated`. Needs a fast tokenizer (for offsets); raises ValueError if
+    the model's labels cannot be mapped to AI / human.
+    """
+    id2label = model.config.id2label
+    ai_index = ai_label_index(id2label)
+    if ai_index is None:
+        raise ValueError(f"Cannot tell which of the model labels {list(id2label.values())} means AI-generated")
+    if not getattr(tokenizer, "is_fast", False):
+        raise ValueError("Long-document detection needs a fast tokenizer for character offsets")
+
+    # verbose=False: the whole text is expected to exceed the model's length limit here.
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    token_ids, offsets = encoding["input_ids"], encoding["offset_mapping"]
+    if not token_ids:
+        raise ValueError("Text has no tokens")
+    prefix, suffix = _special_token_ids(tokenizer)
+    window_size = min(window_tokens, tokenizer.model_max_length) - len(prefix) - len(suffix)
+    spans, truncated = window_spans(len(token_ids), window_size, min(overlap_tokens, window_size - 1), max_windows)
+
+    rows = [prefix + token_ids[start:end] + suffix for start, end in spans]
+    width = max(len(row) for row in rows)
+    pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+    input_ids = torch.tensor([row + [pad_id] * (width - len(row)) for row in rows], device=model.device)
+    attention_mask = torch.tensor([[1] * len(row) + [0] * (width - len(row)) for row in rows], device=model.device)
+    with torch.no_grad():
+        logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+    ai_probabilities = torch.softmax(logits.float(), dim=-1)[:, ai_index].tolist()
+
+    windows, covered, weighted_sum = [], 0, 0.0
+    for (start, end), probability in zip(spans, ai_probabilities):
+        weight = end - max(start, covered)
+        covered = end
+        weighted_sum += weight * probability
+        windows.append({"start": offsets[start][0], "end": offsets[end - 1][1], "tokens": end - start,
+                        "ai_score": round(probability, 3)})
+    ai_score = weighted_sum / covered
+
+    is_ai = ai_score >= 0.5
+    if is_ai or len(id2label) != 2:
+        label_index = ai_index
+    else:
+        label_index = next(int(index) for index in id2label if int(index) != ai_index)
+    return {
+        "ai_score": round(ai_score, 3),
+        "prediction_label": id2label[label_index],
+        "model_score": round(ai_score if label_index == ai_index else 1.0 - ai_score, 3),
+        "windows": windows,
+        "n_tokens": len(token_ids),
+        "scored_chars": offsets[covered - 1][1],
+        "truncated": truncated,
+    }
+
+
+# --- Inference Backends ---
+BACKENDS = ("pytorch", "pytorch_int8", "onnx")
+ONNX_OPSET = 17
+
+
+def quantize_int8(model):
+    """Dynamically quantize a PyTorch model's Linear layers to int8, in place (CPU only)."""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class OnnxSequenceClassifier:
+    """An ONNX Runtime session called like a transformers sequence-classification model."""
+
+    def __init__(self, session, config):
+        self.session = session
+        self.config = config
+        self.device = torch.device("cpu")
+
+    @staticmethod
+    def export(model, path, opset=ONNX_OPSET):
+        """Export a PyTorch classifier to `path` with dynamic batch and sequence axes."""
+        example = torch.tensor([[0, 1, 2], [0, 1, 2]])
+        dynamic_axes = {"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"},
+                        "logits": {0: "batch"}}
+        with torch.no_grad():
+            torch.onnx.export(model.eval(), (example, torch.ones_like(example)), path, opset_version=opset,
+                              input_names=["input_ids", "attention_mask"], output_names=["logits"],
+                              dynamic_axes=dynamic_axes, dynamo=False)
+
+    @classmethod
+    def load(cls, path, config):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The 'onnx' backend needs onnxruntime: pip install onnxruntime") from e
+        session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return cls(session, config)
+
+    def __call__(self, input_ids, attention_mask):
+        logits = self.session.run(["logits"], {"input_ids": input_ids.cpu().numpy().astype("int64"),
+                                               "attention_mask": attention_mask.cpu().numpy().astype("int64")})[0]
+        return SequenceClassifierOutput(logits=torch.from_numpy(logits))
+
+
+class TextClassifier:
+    """Minimal text-classification pipeline over a tokenizer and any model callable.
+
+    `classifier(texts, batch_size=n)` returns one `{"label", "score"}` dict per
+    text, the top label and its softmax probability, like
+    `transformers.pipeline("text-classification")`.
+    """
+
+    def __init__(self, tokenizer, model):
+        self.tokenizer = tokenizer
+        self.model = model
+
+    def __call__(self, texts, batch_size=None):
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        batch_size = batch_size or len(texts) or 1
+        predictions = []
+        for start in range(0, len(texts), batch_size):
+            predictions.extend(self.postprocess(self._forward(self.preprocess(texts[start:start + batch_size]))))
+        return predictions
+
+    # The stages are named like a transformers pipeline's, for `instrument_stages`.
+    def preprocess(self, texts):
+        return self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+
+    def _forward(self, encoded):
+        with torch.no_grad():
+            return self.model(input_ids=encoded["input_ids"], attention_mask=encoded["attention_mask"]).logits
+
+    def postprocess(self, logits):
+        scores, labels = torch.softmax(logits.float(), dim=-1).max(dim=-1)
+        return [{"label": self.model.config.id2label[int(label)], "score": float(score)}
+                for label, score in zip(labels, scores)]
+
+
+CLASSIFIER_STAGES = (("tokenize", "preprocess"), ("forward", "_forward"), ("postprocess", "postprocess"))
+
+
+def instrument_stages(classifier, observe):
+    """Call `observe(stage, seconds)` after every tokenize/forward/postprocess step of `classifier`.
+
+    Works for transformers pipelines and `TextClassifier` (both returned by
+    `load_detector`). Pipelines tokenize one text per call and run the forward
+    pass once per batch, so compare the stages' total time, not per-call time.
+    """
+    def timed(stage, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - start)
+        return wrapper
+
+    for stage, name in CLASSIFIER_STAGES:
+        setattr(classifier, name, timed(stage, getattr(classifier, name)))
+    return classifier
+
+
+def model_fingerprint(model, paths=()):
+    """A short hash identifying the weights behind a loaded model, for keying cached results.
+
+    Covers the model config and, for models from the Hugging Face Hub, the
+    commit they were downloaded at. For a local model directory, whose
+    contents can change under the same name, and for any extra `paths` (such as
+    an exported ONNX graph), file names, sizes and modification times are
+    hashed instead of the (large) file contents.
+    """
+    config = model.config
+    digest = hashlib.sha256(config.to_json_string().encode("utf-8"))
+    commit = getattr(config, "_commit_hash", None)
+    digest.update(f"\0commit:{commit}".encode("utf-8"))
+    files = list(paths)
+    directory = config.name_or_path
+    if not commit and directory and os.path.isdir(directory):
+        files.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)))
+    for path in files:
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            digest.update(f"\0{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_detector(model_name, backend="pytorch", onnx_path=None):
+    """Load a classifier with the given backend; returns (classifier, tokenizer, model).
+
+    `classifier(texts, batch_size=n)` returns pipeline-style predictions and
+    `model` can be passed to `score_long_document`. For the 'onnx' backend the
+    graph is read from `onnx_path` if it exists, otherwise exported there (or
+    to a temporary file) from the PyTorch weights first.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown AI detector backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == "pytorch":
+        classifier = pipeline("text-classification", model=model_name)
+        return classifier, classifier.tokenizer, classifier.model
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "pytorch_int8":
+        model = quantize_int8(AutoModelForSequenceClassification.from_pretrained(model_name))
+        return pipeline("text-classification", model=model, tokenizer=tokenizer), tokenizer, model
+
+    if not onnx_path:
+        onnx_path = os.path.join(tempfile.mkdtemp(prefix="ai-detector-"), "model.onnx")
+    if not os.path.exists(onnx_path):
+        OnnxSequenceClassifier.export(AutoModelForSequenceClassification.from_pretrained(model_name), onnx_path)
+    model = OnnxSequenceClassifier.load(onnx_path, AutoConfig.from_pretrained(model_name))
+    return TextClassifier(tokenizer, model), tokenizer, model
@@ -1,58 +1,252 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 import requests
 import os
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # --- Plagiarism Detection Imports ---
 import nltk
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import string # For punctuation removal
+from corpus_index import CorpusIndex, JournaledCorpus, LiveCorpus
+from incremental import (DocumentStore, check_segments, contiguous_runs, group_windows, merge_matches, merge_passages,
+                         split_matches, split_segments)
+from batch_pipeline import BATCH_CHECKS, analyze_batches
+from batching import MicroBatcher
+from languagetool_client import LanguageToolClient
+from metrics import Registry, RequestProfiler, SIZE_BUCKETS, TEXT_LENGTH_BUCKETS
+from readability import score_batch as readability_score_batch
+from result_cache import ResultCache, cache_key
+from startup import ComponentStatus, LOADING, PENDING, process_uptime
+from text_normalization import TOKENIZERS, normalize, normalize_batch
 
 # --- AI Text Detection Imports ---
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-import torch # Explicitly import torch to ensure it's recognized
+# ai_detection (torch + transformers, several seconds to import) is imported by the
+# model loader, so the grammar and plagiarism routes do not wait for it.
 
 app = Flask(__name__)
 
+# --- Metrics ---
+# Prometheus metrics, served on /metrics (see metrics.py). Set METRICS_DIR to sum the
+# metrics of all worker processes (gunicorn.conf.py does). PROFILE_SAMPLE_RATE > 0 runs
+# that fraction of requests under cProfile and writes the profiles to PROFILE_DIR.
+metrics = Registry(directory=os.environ.get("METRICS_DIR"))
+http_requests = metrics.counter("http_requests_total", "HTTP requests by endpoint, method and status.",
+                                ("endpoint", "method", "status"))
+http_request_errors = metrics.counter("http_request_errors_total", "HTTP responses with a 4xx or 5xx status.",
+                                      ("endpoint", "status"))
+http_request_seconds = metrics.histogram("http_request_duration_seconds", "Request latency by endpoint.",
+                                         ("endpoint",))
+text_length = metrics.histogram("text_length_chars", "Length of submitted texts by endpoint.", ("endpoint",),
+                                TEXT_LENGTH_BUCKETS)
+check_stage_seconds = metrics.histogram("check_stage_duration_seconds", "Time spent in each stage of a check.",
+                                        ("check", "stage"))
+languagetool_request_seconds = metrics.histogram("languagetool_request_duration_seconds",
+                                                 "LanguageTool backend request latency by backend and status.",
+                                                 ("backend", "status"))
+ai_batch_size = metrics.histogram("ai_detector_batch_size", "Texts per AI detection model call.",
+                                  buckets=SIZE_BUCKETS)
+result_cache_lookups = metrics.counter("result_cache_lookups_total", "Result cache lookups by namespace and result.",
+                                       ("namespace", "result"))
+incremental_segments = metrics.counter("incremental_segments_total",
+                                       "Segments of incremental /api/analyze checks, reused or checked.",
+                                       ("check", "result"))
+profiler = RequestProfiler(sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+                           directory=os.environ.get("PROFILE_DIR", "profiles"))
+
 LANGUAGETOOL_URL = os.environ.get("LANGUAGETOOL_URL", "http://localhost:8081/v2/check")
+# LanguageTool client (see languagetool_client.py). LANGUAGETOOL_URL may list several
+# comma-separated backends; texts longer than LANGUAGETOOL_MAX_CHUNK_CHARS are split on
+# paragraphs and checked concurrently across them.
+LANGUAGETOOL_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("LANGUAGETOOL_CONNECT_TIMEOUT_SECONDS", 3.05))
+LANGUAGETOOL_TIMEOUT_SECONDS = float(os.environ.get("LANGUAGETOOL_TIMEOUT_SECONDS", 30))
+LANGUAGETOOL_RETRIES = int(os.environ.get("LANGUAGETOOL_RETRIES", 2))
+LANGUAGETOOL_MAX_CHUNK_CHARS = int(os.environ.get("LANGUAGETOOL_MAX_CHUNK_CHARS", 4000))
+LANGUAGETOOL_MAX_WORKERS = int(os.environ.get("LANGUAGETOOL_MAX_WORKERS", 4))
+# Keep-alive connections per backend. The client is shared by every request thread (and the
+# /api/analyze pool), so the default covers the worker's threads times the chunk fan-out.
+LANGUAGETOOL_POOL_SIZE = int(os.environ.get("LANGUAGETOOL_POOL_SIZE",
+                                            int(os.environ.get("GUNICORN_THREADS", 8)) * LANGUAGETOOL_MAX_WORKERS))
+languagetool = LanguageToolClient([url.strip() for url in LANGUAGETOOL_URL.split(",") if url.strip()],
+                                  timeout=(LANGUAGETOOL_CONNECT_TIMEOUT_SECONDS, LANGUAGETOOL_TIMEOUT_SECONDS),
+                                  retries=LANGUAGETOOL_RETRIES, max_chunk_chars=LANGUAGETOOL_MAX_CHUNK_CHARS,
+                                  max_workers=LANGUAGETOOL_MAX_WORKERS, pool_size=LANGUAGETOOL_POOL_SIZE,
+                                  observe=lambda url, status, seconds: languagetool_request_seconds.observe(
+                                      seconds, backend=url, status=status))
+# Optional path to a saved corpus index artifact (see corpus_index.py). Loaded if it
+# exists, otherwise written after the index is built from SAMPLE_CORPUS.
+PLAGIARISM_INDEX_PATH = os.environ.get("PLAGIARISM_INDEX_PATH")
+# IDF weights are recomputed in the background once this fraction of the corpus has
+# changed through the ingestion API, and additionally every N seconds (0 disables).
+CORPUS_REWEIGHT_THRESHOLD = float(os.environ.get("CORPUS_REWEIGHT_THRESHOLD", 0.1))
+CORPUS_REWEIGHT_INTERVAL_SECONDS = float(os.environ.get("CORPUS_REWEIGHT_INTERVAL_SECONDS", 300))
+# Journal file through which processes serving the app share corpus updates (see
+# corpus_index.JournaledCorpus); gunicorn.conf.py sets one up for its workers. Without it,
+# an update only reaches the process that received it. Past CORPUS_JOURNAL_CHECKPOINT_BYTES
+# the journal is folded into a checkpoint of the index, which new workers load instead.
+CORPUS_JOURNAL_PATH = os.environ.get("CORPUS_JOURNAL_PATH")
+CORPUS_SYNC_INTERVAL_SECONDS = float(os.environ.get("CORPUS_SYNC_INTERVAL_SECONDS", 1))
+CORPUS_JOURNAL_CHECKPOINT_BYTES = int(os.environ.get("CORPUS_JOURNAL_CHECKPOINT_BYTES", 16 * 1024 * 1024))
+# Recall/latency knob for plagiarism candidate retrieval: when set, only documents sharing one
+# of the N rarest input terms are scored. 0 scores every document sharing any input term.
+PLAGIARISM_MAX_QUERY_TERMS = int(os.environ.get("PLAGIARISM_MAX_QUERY_TERMS", 0))
+# Tokenizer for plagiarism preprocessing (see text_normalization.py): "regex" (fast) or
+# "nltk" (nltk.word_tokenize). Both produce the same index terms.
+PLAGIARISM_TOKENIZER = os.environ.get("PLAGIARISM_TOKENIZER", "regex")
+if PLAGIARISM_TOKENIZER not in TOKENIZERS:
+    raise ValueError(f"PLAGIARISM_TOKENIZER must be one of {', '.join(TOKENIZERS)}")
+PLAGIARISM_DEFAULT_TOP_K = 5
+PLAGIARISM_MAX_TOP_K = 50
+PLAGIARISM_MAX_PASSAGES = 20
+
+# --- Result Cache ---
+# Identical resubmissions of a text are answered from cache (see result_cache.py). Keys
+# include everything a result depends on (language, model, corpus digest), so corpus or
+# model changes never serve stale results. RESULT_CACHE_MAX_ENTRIES=0 disables caching;
+# RESULT_CACHE_PATH adds an SQLite tier that survives restarts.
+result_cache = ResultCache(max_entries=int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", 2048)),
+                           max_bytes=int(os.environ.get("RESULT_CACHE_MAX_MB", 64)) * 1024 * 1024,
+                           ttl_seconds=float(os.environ.get("RESULT_CACHE_TTL_SECONDS", 3600)),
+                           disk_path=os.environ.get("RESULT_CACHE_PATH"),
+                           max_disk_entries=int(os.environ.get("RESULT_CACHE_MAX_DISK_ENTRIES", 100000)))
+
+def cached_result(namespace, text, params, compute, cacheable=lambda body: True):
+    """A check's (body, status, "HIT"|"MISS") from the result cache, or from `compute() -> (body, status)`.
+
+    200 bodies are cached; `cacheable(body)` can veto caching of degraded 200 answers.
+    """
+    key = cache_key(namespace, text, params)
+    body = result_cache.get(key, namespace)
+    result_cache_lookups.inc(namespace=namespace, result="miss" if body is None else "hit")
+    if body is not None:
+        return body, 200, "HIT"
+    body, status = compute()
+    if status == 200 and cacheable(body):
+        result_cache.put(key, body, namespace)
+    return body, status, "MISS"
+
+def cached_response(namespace, text, params, compute, cacheable=lambda body: True):
+    """Serve a check through `cached_result`, with an X-Cache header."""
+    body, status, cache_status = cached_result(namespace, text, params, compute, cacheable)
+    return jsonify(body), status, {"X-Cache": cache_status}
+
+# --- Startup Phases ---
+# NLTK data and the plagiarism corpus load while this module is imported; the AI
+# detection model loads separately (see AI_DETECTOR_LOADING). /readyz reports each one.
+startup_status = ComponentStatus(log=app.logger)
+startup_status.register("nltk_data")
+startup_status.register("plagiarism_corpus")
+# Set to make /readyz wait for the AI model too; by default it only gates /api/checkAiText.
+AI_DETECTOR_REQUIRED_FOR_READY = os.environ.get("AI_DETECTOR_REQUIRED_FOR_READY", "").lower() in ("1", "true", "yes")
+startup_status.register("ai_detector", required=AI_DETECTOR_REQUIRED_FOR_READY)
 
 # --- NLTK Data Download ---
 def download_nltk_data():
     try:
         nltk.data.find('tokenizers/punkt')
-    except nltk.downloader.DownloadError:
+    except LookupError:
         nltk.download('punkt', quiet=True)
     try:
         nltk.data.find('corpora/stopwords')
-    except nltk.downloader.DownloadError:
+    except LookupError:
         nltk.download('stopwords', quiet=True)
 
-download_nltk_data()
+with startup_status.loading("nltk_data"):
+    download_nltk_data()
 
 # --- AI Text Detection Model Loading ---
-AI_DETECTOR_MODEL_NAME = "roberta-base-openai-detector"
+# Hugging Face model id or local directory (e.g. a copy baked into a container image).
+AI_DETECTOR_MODEL_NAME = os.environ.get("AI_DETECTOR_MODEL", "roberta-base-openai-detector")
+# Inference backend (see ai_detection.py): "pytorch" (full precision), "pytorch_int8"
+# (dynamic int8 quantization, smaller and faster on CPU) or "onnx" (ONNX Runtime,
+# needs onnxruntime). The ONNX graph is exported to AI_DETECTOR_ONNX_PATH once and reused.
+# AI_DETECTOR_LOADING: "background" starts loading in a thread at startup (requests get a
+# 503 until it is done), "lazy" loads on the first /api/checkAiText request (which waits),
+# "eager" loads before the app finishes importing.
+AI_DETECTOR_LOADING = os.environ.get("AI_DETECTOR_LOADING", "background")
+AI_DETECTOR_BACKEND = os.environ.get("AI_DETECTOR_BACKEND", "pytorch")
+AI_DETECTOR_ONNX_PATH = os.environ.get("AI_DETECTOR_ONNX_PATH")
 ai_text_detector = None
 ai_detector_tokenizer = None
 ai_detector_model = None
+ai_detector_fingerprint = None  # Identifies the loaded weights in result cache keys
 
 def load_ai_detector_model():
-    global ai_text_detector, ai_detector_tokenizer, ai_detector_model
+    global ai_text_detector, ai_detector_tokenizer, ai_detector_model, ai_detector_fingerprint
     if ai_text_detector is None:
         try:
-            app.logger.info(f"Loading AI text detection model: {AI_DETECTOR_MODEL_NAME}...")
-            # Using pipeline for simplicity as per original plan and model card
-            ai_text_detector = pipeline("text-classification", model=AI_DETECTOR_MODEL_NAME)
-            
-            # Alternative: Load tokenizer and model separately if more control is needed
-            # ai_detector_tokenizer = AutoTokenizer.from_pretrained(AI_DETECTOR_MODEL_NAME)
-            # ai_detector_model = AutoModelForSequenceClassification.from_pretrained(AI_DETECTOR_MODEL_NAME)
+            app.logger.info(f"Loading AI text detection model: {AI_DETECTOR_MODEL_NAME} ({AI_DETECTOR_BACKEND} backend)...")
+            with startup_status.loading("ai_detector"):
+                from ai_detection import instrument_stages, load_detector, model_fingerprint
+                # The tokenizer and model are also used directly for long documents.
+                detector, tokenizer, model = load_detector(
+                    AI_DETECTOR_MODEL_NAME, AI_DETECTOR_BACKEND, onnx_path=AI_DETECTOR_ONNX_PATH)
+                instrument_stages(detector, lambda stage, seconds: check_stage_seconds.observe(
+                    seconds, check="ai", stage=stage))
+                onnx_paths = [AI_DETECTOR_ONNX_PATH] if AI_DETECTOR_BACKEND == "onnx" and AI_DETECTOR_ONNX_PATH else []
+                fingerprint = model_fingerprint(model, onnx_paths)
+            ai_detector_tokenizer, ai_detector_model, ai_detector_fingerprint = tokenizer, model, fingerprint
+            ai_text_detector = detector
             app.logger.info("AI text detection model loaded successfully.")
         except Exception as e:
             app.logger.error(f"Error loading AI text detection model '{AI_DETECTOR_MODEL_NAME}': {str(e)}")
             # The app can still run, but /api/checkAiText will fail gracefully.
-            ai_text_detector = None 
 
-load_ai_detector_model() # Load model on app startup
+_ai_detector_loader = None
+_ai_detector_loader_lock = threading.Lock()
+
+def start_ai_detector_loading():
+    """Start loading the AI model in a background thread, once; returns the thread."""
+    global _ai_detector_loader
+    with _ai_detector_loader_lock:
+        if _ai_detector_loader is None:
+            _ai_detector_loader = threading.Thread(target=load_ai_detector_model, name="ai-detector-loader",
+                                                   daemon=True)
+            _ai_detector_loader.start()
+    return _ai_detector_loader
+
+if AI_DETECTOR_LOADING == "eager":
+    load_ai_detector_model()
+elif AI_DETECTOR_LOADING == "background":
+    start_ai_detector_loading()
+
+# --- AI Text Detection Micro-Batching ---
+# Concurrent /api/checkAiText requests are coalesced into one padded forward pass.
+AI_BATCH_MAX_SIZE = int(os.environ.get("AI_BATCH_MAX_SIZE", 8))
+AI_BATCH_MAX_WAIT_MS = float(os.environ.get("AI_BATCH_MAX_WAIT_MS", 10))
+
+def run_ai_detector_batch(texts):
+    """Classify a batch of texts in one pipeline call; one result (or None) per text."""
+    ai_batch_size.observe(len(texts))
+    model_output = ai_text_detector(texts, batch_size=len(texts))
+    if not isinstance(model_output, list) or len(model_output) != len(texts):
+        return [None] * len(texts)
+    return model_output
+
+ai_batcher = MicroBatcher(run_ai_detector_batch, max_batch_size=AI_BATCH_MAX_SIZE,
+                          max_wait_ms=AI_BATCH_MAX_WAIT_MS, name="ai-detector-batcher")
+
+# --- AI Text Detection for Long Documents ---
+# Texts longer than MAX_TEXT_LENGTH are scored in overlapping 512-token windows
+# (see ai_detection.py) instead of being truncated. The window cap bounds the cost
+# of one request; text past the last window is reported as unscored.
+MAX_TEXT_LENGTH = 1000 # Character limit of the single-pass path
+AI_LONG_DOC_MAX_WINDOWS = int(os.environ.get("AI_LONG_DOC_MAX_WINDOWS", 16))
+AI_LONG_DOC_OVERLAP_TOKENS = int(os.environ.get("AI_LONG_DOC_OVERLAP_TOKENS", 128))
+
+def detect_ai_text_long(text):
+    """Windowed detection result for a long text, or None if the loaded model does not support it."""
+    if ai_detector_tokenizer is None or ai_detector_model is None:
+        return None
+    from ai_detection import score_long_document
+    try:
+        with check_stage_seconds.time(check="ai", stage="long_document"):
+            return score_long_document(text, ai_detector_tokenizer, ai_detector_model,
+                                       overlap_tokens=AI_LONG_DOC_OVERLAP_TOKENS, max_windows=AI_LONG_DOC_MAX_WINDOWS)
+    except ValueError as e:
+        app.logger.warning(f"Long-document AI detection unavailable, falling back to truncation: {str(e)}")
+        return None
 
 
 # --- Sample Corpus for Plagiarism Check ---
@@ -62,15 +256,66 @@ SAMPLE_CORPUS = {
     "doc3_cooking_basics": "Cooking involves applying heat to food to transform its chemical and physical properties. Common methods include baking, frying, boiling, and grilling. Understanding basic techniques and ingredient combinations is key to successful cooking.",
     "doc4_space_exploration": "Space exploration began with the launch of Sputnik 1 in 1957. Key milestones include the Apollo Moon landing in 1969 and the operations of the International Space Station. Future goals involve missions to Mars and beyond."
 }
-CORPUS_DOC_IDS = list(SAMPLE_CORPUS.keys())
-CORPUS_DOCUMENTS = list(SAMPLE_CORPUS.values())
 
 def preprocess_text_for_plagiarism(text):
-    tokens = nltk.word_tokenize(text.lower())
-    tokens = [token for token in tokens if token not in string.punctuation]
-    stop_words = nltk.corpus.stopwords.words('english')
-    tokens = [token for token in tokens if token not in stop_words]
-    return " ".join(tokens)
+    return normalize(text, tokenizer=PLAGIARISM_TOKENIZER)
+
+# --- Plagiarism Corpus Index ---
+# The corpus is preprocessed and vectorized once here; requests only transform their input.
+# Updates through /api/corpus/documents swap in new snapshots (see corpus_index.LiveCorpus),
+# in every worker process when CORPUS_JOURNAL_PATH is set.
+plagiarism_corpus = None
+
+def load_corpus_index():
+    global plagiarism_corpus
+    if PLAGIARISM_INDEX_PATH and os.path.exists(PLAGIARISM_INDEX_PATH):
+        app.logger.info(f"Loading plagiarism corpus index from {PLAGIARISM_INDEX_PATH}...")
+        corpus_index = CorpusIndex.load(PLAGIARISM_INDEX_PATH)
+    else:
+        corpus_index = CorpusIndex.build(SAMPLE_CORPUS, preprocess_text_for_plagiarism)
+        if PLAGIARISM_INDEX_PATH:
+            corpus_index.save(PLAGIARISM_INDEX_PATH)
+            app.logger.info(f"Saved plagiarism corpus index to {PLAGIARISM_INDEX_PATH}.")
+    app.logger.info(f"Plagiarism corpus index ready: {corpus_index.n_documents} documents, {len(corpus_index.terms)} terms.")
+    if CORPUS_JOURNAL_PATH:
+        plagiarism_corpus = JournaledCorpus(corpus_index, preprocess_text_for_plagiarism, CORPUS_JOURNAL_PATH,
+                                            reweight_threshold=CORPUS_REWEIGHT_THRESHOLD,
+                                            sync_interval_seconds=CORPUS_SYNC_INTERVAL_SECONDS,
+                                            checkpoint_bytes=CORPUS_JOURNAL_CHECKPOINT_BYTES)
+    else:
+        plagiarism_corpus = LiveCorpus(corpus_index, preprocess_text_for_plagiarism,
+                                       reweight_threshold=CORPUS_REWEIGHT_THRESHOLD)
+    start_corpus_reweighting()
+
+def start_corpus_reweighting():
+    if CORPUS_REWEIGHT_INTERVAL_SECONDS > 0:
+        plagiarism_corpus.start_periodic_reweighting(CORPUS_REWEIGHT_INTERVAL_SECONDS)
+
+def start_corpus_sync():
+    """Catch up with the corpus journal and follow it from this process; call before serving requests.
+
+    Not at import: a pre-fork master does not serve, so only its workers follow the journal.
+    """
+    if isinstance(plagiarism_corpus, JournaledCorpus):
+        try:
+            plagiarism_corpus.start_syncing()
+        except Exception as e:
+            app.logger.error(f"Could not catch up with the corpus journal: {str(e)}")
+
+with startup_status.loading("plagiarism_corpus"):
+    load_corpus_index()
+
+def languagetool_check(text, language):
+    with check_stage_seconds.time(check="grammar", stage="languagetool"):
+        return languagetool.check(text, language)
+
+def languagetool_check_all(texts, language):
+    with check_stage_seconds.time(check="grammar", stage="languagetool"):
+        return languagetool.check_all(texts, language)
+
+def grammar_cache_params(language):
+    """Everything besides the text that an /api/checkText result depends on."""
+    return {"language": language, "max_chunk_chars": LANGUAGETOOL_MAX_CHUNK_CHARS}
 
 @app.route('/api/checkText', methods=['POST'])
 def check_text():
@@ -81,10 +326,8 @@ def check_text():
         text_to_check = data.get('text')
         if not language or not text_to_check: return jsonify({"error": "Missing 'language' or 'text' field"}), 400
         
-        payload = {'language': language, 'text': text_to_check}
-        response = requests.post(LANGUAGETOOL_URL, data=payload)
-        response.raise_for_status()
-        return jsonify(response.json()), response.status_code
+        return cached_response("checkText", text_to_check, grammar_cache_params(language),
+                               lambda: (languagetool_check(text_to_check, language), 200))
     except requests.exceptions.RequestException as e:
         app.logger.error(f"Error connecting to LanguageTool server: {str(e)}")
         return jsonify({"error": f"Error connecting to LanguageTool server: {str(e)}"}), 502
@@ -92,6 +335,71 @@ def check_text():
         app.logger.error(f"Unexpected error in /api/checkText: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+def valid_top_k(top_k):
+    return isinstance(top_k, int) and not isinstance(top_k, bool) and 1 <= top_k <= PLAGIARISM_MAX_TOP_K
+
+def plagiarism_cache_params(top_k, index):
+    """Everything besides the text that an /api/checkPlagiarism result depends on."""
+    return {"top_k": top_k, "corpus": index.digest, "max_query_terms": PLAGIARISM_MAX_QUERY_TERMS,
+            "tokenizer": PLAGIARISM_TOKENIZER}
+
+def plagiarism_result(input_text, top_k, index, processed_input_text=None, top_matches=None, passages=None):
+    """Plagiarism check of one text against a corpus snapshot; returns (body, status).
+
+    Batch analysis passes in the preprocessed text and the matches it searched for a whole batch;
+    incremental analysis the preprocessed text and the passages it found segment by segment.
+    """
+    if processed_input_text is None:
+        with check_stage_seconds.time(check="plagiarism", stage="preprocess"):
+            processed_input_text = preprocess_text_for_plagiarism(input_text)
+    if not processed_input_text.strip():
+         return {"status": "input_empty_after_processing", "score": 0.0, "message": "Input text contains only stopwords or punctuation."}, 200
+    
+    if not index.n_documents:
+         return {"status": "corpus_empty_after_processing", "score": 0.0, "message": "Corpus documents are empty after preprocessing."}, 200
+    
+    # Candidate retrieval + exact cosine rerank; only documents sharing input terms are scored.
+    if top_matches is None:
+        with check_stage_seconds.time(check="plagiarism", stage="vectorize"):
+            query = index.transform(processed_input_text)
+        with check_stage_seconds.time(check="plagiarism", stage="similarity"):
+            top_matches = index.search_vector(query, top_k=top_k, max_query_terms=PLAGIARISM_MAX_QUERY_TERMS)
+    matches = [{"doc_id": index.doc_ids[row], "score": round(score, 3)} for row, score in top_matches]
+    
+    highest_score = 0.0
+    most_similar_doc_index = -1
+    if top_matches:
+        most_similar_doc_index, highest_score = top_matches[0]
+
+    # Passage-level check: copied spans inside a longer text (see fingerprint.py).
+    if passages is None:
+        with check_stage_seconds.time(check="plagiarism", stage="passages"):
+            passages = index.fingerprints.find_passages(input_text)[:PLAGIARISM_MAX_PASSAGES]
+
+    PLAGIARISM_THRESHOLD = 0.7
+    if highest_score >= PLAGIARISM_THRESHOLD:
+        most_similar_doc_id = index.doc_ids[most_similar_doc_index]
+        return {
+            "status": "potential_plagiarism", "score": round(highest_score, 2),
+            "details": f"High similarity with document: '{most_similar_doc_id}'.",
+            "corpus_document_preview": index.documents[most_similar_doc_id][:200] + "...",
+            "matches": matches, "passages": passages
+        }, 200
+    elif passages:
+        longest = passages[0]
+        return {
+            "status": "partial_plagiarism", "score": round(highest_score, 2),
+            "details": f"{len(passages)} copied passage(s) found; the longest ({longest['matched_tokens']} words) matches document '{longest['doc_id']}'.",
+            "corpus_document_preview": index.documents[longest['doc_id']][:200] + "...",
+            "matches": matches, "passages": passages
+        }, 200
+    else:
+        details_message = "No significant similarity found with corpus documents."
+        if most_similar_doc_index != -1:
+             most_similar_doc_id = index.doc_ids[most_similar_doc_index]
+             details_message = f"Highest similarity ({round(highest_score, 2)}) with document '{most_similar_doc_id}', but below threshold."
+        return {"status": "no_significant_similarity", "score": round(highest_score, 2), "details": details_message, "matches": matches, "passages": passages}, 200
+
 @app.route('/api/checkPlagiarism', methods=['POST'])
 def check_plagiarism():
     try:
@@ -99,57 +407,156 @@ def check_plagiarism():
         if not data or 'text' not in data:
             return jsonify({"error": "Invalid JSON payload, missing 'text' field"}), 400
         input_text = data['text']
+        top_k = data.get('top_k', PLAGIARISM_DEFAULT_TOP_K)
+        if not valid_top_k(top_k):
+            return jsonify({"error": f"'top_k' must be an integer between 1 and {PLAGIARISM_MAX_TOP_K}"}), 400
         if not input_text.strip():
             return jsonify({"status": "input_empty", "score": 0.0, "message": "Input text is empty."}), 200
 
-        processed_input_text = preprocess_text_for_plagiarism(input_text)
-        if not processed_input_text.strip():
-             return jsonify({"status": "input_empty_after_processing", "score": 0.0, "message": "Input text contains only stopwords or punctuation."}), 200
-        
-        processed_corpus = [preprocess_text_for_plagiarism(doc) for doc in CORPUS_DOCUMENTS]
-        valid_processed_corpus_indices = [i for i, doc in enumerate(processed_corpus) if doc.strip()]
-        if not valid_processed_corpus_indices:
-             return jsonify({"status": "corpus_empty_after_processing", "score": 0.0, "message": "Corpus documents are empty after preprocessing."}), 200
-        
-        vectorizer = TfidfVectorizer()
-        corpus_vectors = vectorizer.fit_transform([processed_corpus[i] for i in valid_processed_corpus_indices])
-        input_vector = vectorizer.transform([processed_input_text])
-        similarity_scores = cosine_similarity(input_vector, corpus_vectors)
-        
-        highest_score = 0.0
-        most_similar_doc_index = -1
-        if similarity_scores.size > 0:
-            highest_score = similarity_scores[0].max()
-            most_similar_doc_index_in_filtered_corpus = similarity_scores[0].argmax()
-            most_similar_doc_index = valid_processed_corpus_indices[most_similar_doc_index_in_filtered_corpus]
-
-        PLAGIARISM_THRESHOLD = 0.7
-        if highest_score >= PLAGIARISM_THRESHOLD:
-            most_similar_doc_id = CORPUS_DOC_IDS[most_similar_doc_index]
-            return jsonify({
-                "status": "potential_plagiarism", "score": round(highest_score, 2),
-                "details": f"High similarity with document: '{most_similar_doc_id}'.",
-                "corpus_document_preview": SAMPLE_CORPUS[most_similar_doc_id][:200] + "..."
-            }), 200
-        else:
-            details_message = "No significant similarity found with corpus documents."
-            if most_similar_doc_index != -1:
-                 most_similar_doc_id = CORPUS_DOC_IDS[most_similar_doc_index]
-                 details_message = f"Highest similarity ({round(highest_score, 2)}) with document '{most_similar_doc_id}', but below threshold."
-            return jsonify({"status": "no_significant_similarity", "score": round(highest_score, 2), "details": details_message}), 200
+        index = plagiarism_corpus.snapshot # Take one snapshot so the whole request sees the same index
+        return cached_response("checkPlagiarism", input_text, plagiarism_cache_params(top_k, index),
+                               lambda: plagiarism_result(input_text, top_k, index))
     except Exception as e:
         app.logger.error(f"Unexpected error in /api/checkPlagiarism: {str(e)}")
-        import traceback
         app.logger.error(traceback.format_exc())
         return jsonify({"error": "An unexpected error occurred during plagiarism check"}), 500
 
+# --- Plagiarism Corpus Ingestion Endpoints ---
+def parse_corpus_documents(body):
+    """Parse a JSONL body of {"id": ..., "text": ...} objects into a doc_id -> text dict."""
+    documents = {}
+    for line_number, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {line_number} is not valid JSON")
+        if not isinstance(record, dict) or not isinstance(record.get('id'), str) or not isinstance(record.get('text'), str):
+            raise ValueError(f"Line {line_number} must be an object with string 'id' and 'text' fields")
+        documents[record['id']] = record['text']
+    return documents
+
+def corpus_summary(index):
+    return {"documents": index.n_documents, "terms": len(index.terms), "version": index.version,
+            "pending_changes": index.pending_changes, "drift": round(index.drift, 3)}
+
+@app.route('/api/corpus', methods=['GET'])
+def get_corpus():
+    return jsonify(corpus_summary(plagiarism_corpus.snapshot)), 200
+
+@app.route('/api/corpus/documents', methods=['POST'])
+def upsert_corpus_documents():
+    try:
+        documents = parse_corpus_documents(request.get_data(as_text=True))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid JSONL payload: {str(e)}"}), 400
+    if not documents:
+        return jsonify({"error": "No documents in payload"}), 400
+    try:
+        result = plagiarism_corpus.upsert(documents)
+        result_cache.invalidate("checkPlagiarism") # Results for older snapshots are unreachable anyway; free them
+        result["corpus"] = corpus_summary(plagiarism_corpus.snapshot)
+        return jsonify(result), 200
+    except Exception as e:
+        app.logger.error(f"Unexpected error in /api/corpus/documents: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred while updating the corpus"}), 500
+
+@app.route('/api/corpus/documents', methods=['DELETE'])
+def delete_corpus_documents():
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('ids'), list) or not all(isinstance(doc_id, str) for doc_id in data['ids']):
+        return jsonify({"error": "Invalid JSON payload, expected a list of string 'ids'"}), 400
+    try:
+        result = plagiarism_corpus.delete(data['ids'])
+        result_cache.invalidate("checkPlagiarism")
+        result["corpus"] = corpus_summary(plagiarism_corpus.snapshot)
+        return jsonify(result), 200
+    except Exception as e:
+        app.logger.error(f"Unexpected error in /api/corpus/documents: {str(e)}")
+        return jsonify({"error": "An unexpected error occurred while updating the corpus"}), 500
+
 # --- AI Text Detection Endpoint ---
+def ai_detector_cache_params():
+    """Everything besides the text that an /api/checkAiText result depends on."""
+    return {"model": AI_DETECTOR_MODEL_NAME, "weights": ai_detector_fingerprint, "backend": AI_DETECTOR_BACKEND,
+            "max_text_length": MAX_TEXT_LENGTH, "long_document": ai_detector_model is not None,
+            "max_windows": AI_LONG_DOC_MAX_WINDOWS, "overlap_tokens": AI_LONG_DOC_OVERLAP_TOKENS}
+
+def ai_text_result(input_text):
+    """AI detection result for one non-empty text; returns (body, status)."""
+    # Long texts are scored window by window; the result already carries ai_score.
+    if len(input_text) > MAX_TEXT_LENGTH:
+        long_result = detect_ai_text_long(input_text)
+        if long_result is not None:
+            if long_result["truncated"]:
+                app.logger.warning(f"AI detection scored the first {long_result['scored_chars']} of "
+                                   f"{len(input_text)} characters (window cap {AI_LONG_DOC_MAX_WINDOWS}).")
+            return long_result, 200
+
+    # Otherwise truncate, as RoBERTa base has a 512 token limit.
+    # A simple character-based truncation might be okay for a PoC.
+    if len(input_text) > MAX_TEXT_LENGTH:
+        input_text = input_text[:MAX_TEXT_LENGTH]
+        app.logger.warning(f"Input text truncated to {MAX_TEXT_LENGTH} characters for AI detection.")
+
+    # Perform detection
+    # The pipeline returns one dict per input text, e.g., {'label': 'Real', 'score': 0.9} or {'label': 'Fake', 'score': 0.1}
+    # For roberta-base-openai-detector: 'Real' means human, 'Fake' means AI (GPT-2)
+    # The score indicates confidence in that label.
+    # Runs in the next batch of the micro-batching scheduler alongside concurrent requests.
+    return ai_prediction_result(ai_batcher(input_text))
+
+def ai_prediction_result(result):
+    """Response body and status for one pipeline prediction."""
+    if not result or not isinstance(result, dict):
+        return {"error": "Invalid output from AI detection model"}, 500
+
+    original_label = result.get('label')
+    original_score = result.get('score')
+
+    # Interpretation: If label is 'Fake' (or 'LABEL_1'), then ai_score is its confidence.
+    # If label is 'Real' (or 'LABEL_0'), then ai_score is (1 - its confidence).
+    from ai_detection import ai_score_from_prediction
+    ai_score = ai_score_from_prediction(original_label, original_score)
+    if ai_score is None: # Fallback if labels are unexpected
+        app.logger.warning(f"Unexpected label from AI model: {original_label}")
+        # Cannot reliably determine ai_score if label is unknown
+        return {
+            "ai_score": "N/A",
+            "prediction_label": original_label,
+            "model_score": round(original_score, 3) if original_score is not None else "N/A",
+            "message": "Model returned an unexpected label."
+        }, 200
+
+
+    return {
+        "ai_score": round(ai_score, 3), # Probability of being AI-generated
+        "prediction_label": original_label, # Original label from the model
+        "model_score": round(original_score, 3) # Original score for that label
+    }, 200
+
+def ai_result_cacheable(body):
+    # An unexpected-label answer is not cached, so a fixed model takes effect at once.
+    return body["ai_score"] != "N/A"
+
+def ai_detector_unavailable():
+    """None once the AI model is loaded (waiting for it in lazy mode), else the (body, status, headers) to answer with."""
+    if ai_text_detector is None and AI_DETECTOR_LOADING == "lazy":
+        start_ai_detector_loading().join()
+    if ai_text_detector is not None:
+        return None
+    if startup_status.state("ai_detector") in (PENDING, LOADING) and AI_DETECTOR_LOADING != "lazy":
+        return {"error": "AI text detection model is not available yet; it is still loading."}, 503, {"Retry-After": "10"}
+    app.logger.error("AI text detection model is not loaded. Cannot process request.")
+    return {"error": "AI text detection model is not available. Please check server logs."}, 503, {} # Service Unavailable
+
 @app.route('/api/checkAiText', methods=['POST'])
 def check_ai_text():
-    global ai_text_detector
-    if ai_text_detector is None:
-        app.logger.error("AI text detection model is not loaded. Cannot process request.")
-        return jsonify({"error": "AI text detection model is not available. Please check server logs."}), 503 # Service Unavailable
+    unavailable = ai_detector_unavailable()
+    if unavailable is not None:
+        body, status, headers = unavailable
+        return jsonify(body), status, headers
 
     try:
         data = request.get_json()
@@ -160,63 +567,453 @@ def check_ai_text():
         if not input_text.strip():
             return jsonify({"ai_score": 0.0, "prediction_label": "N/A", "model_score": 0.0, "message": "Input text is empty."}), 200
 
-        # Truncate text if too long, as these models have input length limits
-        # RoBERTa base typically has a 512 token limit.
-        # A simple character-based truncation might be okay for a PoC.
-        MAX_TEXT_LENGTH = 1000 # Heuristic character limit, actual token limit is different
-        if len(input_text) > MAX_TEXT_LENGTH:
-            input_text = input_text[:MAX_TEXT_LENGTH]
-            app.logger.warning(f"Input text truncated to {MAX_TEXT_LENGTH} characters for AI detection.")
-
-        # Perform detection
-        # The pipeline returns a list of dicts, e.g., [{'label': 'Real', 'score': 0.9}] or [{'label': 'Fake', 'score': 0.1}]
-        # For roberta-base-openai-detector: 'Real' means human, 'Fake' means AI (GPT-2)
-        # The score indicates confidence in that label.
-        model_output = ai_text_detector(input_text)
-        
-        if not model_output or not isinstance(model_output, list) or not model_output[0]:
-            return jsonify({"error": "Invalid output from AI detection model"}), 500
-
-        result = model_output[0]
-        original_label = result.get('label')
-        original_score = result.get('score')
-
-        ai_score = 0.0
-        # Interpretation: If label is 'Fake', then ai_score is its confidence.
-        # If label is 'Real', then ai_score is (1 - its confidence).
-        if original_label == 'Fake': # Or sometimes 'LABEL_1' for AI-generated
-            ai_score = original_score
-        elif original_label == 'LABEL_1': # Common Hugging Face convention for "positive" class (here, AI)
-            ai_score = original_score
-        elif original_label == 'Real': # Or sometimes 'LABEL_0' for human-written
-            ai_score = 1.0 - original_score
-        elif original_label == 'LABEL_0':
-             ai_score = 1.0 - original_score
-        else: # Fallback if labels are unexpected
-            app.logger.warning(f"Unexpected label from AI model: {original_label}")
-            # Cannot reliably determine ai_score if label is unknown
-            return jsonify({
-                "ai_score": "N/A",
-                "prediction_label": original_label,
-                "model_score": round(original_score, 3) if original_score is not None else "N/A",
-                "message": "Model returned an unexpected label."
-            }), 200
-
-
-        return jsonify({
-            "ai_score": round(ai_score, 3), # Probability of being AI-generated
-            "prediction_label": original_label, # Original label from the model
-            "model_score": round(original_score, 3) # Original score for that label
-        }), 200
+        return cached_response("checkAiText", input_text, ai_detector_cache_params(), lambda: ai_text_result(input_text),
+                               cacheable=ai_result_cacheable)
 
     except Exception as e:
         app.logger.error(f"Error during AI text detection: {str(e)}")
-        import traceback
         app.logger.error(traceback.format_exc())
         return jsonify({"error": "An unexpected error occurred during AI text detection"}), 500
 
+# --- Readability Endpoint ---
+# The scores the frontend computes with readability.js, for server-side and batch reporting.
+# readability.py reproduces readability.js exactly; see its docstring.
+READABILITY_MAX_TEXTS = int(os.environ.get("READABILITY_MAX_TEXTS", 1000))
+
+def readability_results(texts):
+    """Readability scores for a list of texts, one result dict per text."""
+    non_empty = [i for i, text in enumerate(texts) if text.strip()]
+    results = [{"scores": None, "message": "Input text is empty."} for _ in texts]
+    with check_stage_seconds.time(check="readability", stage="score"):
+        for i, scores in zip(non_empty, readability_score_batch([texts[i] for i in non_empty])):
+            results[i] = {"scores": scores}
+    return results
+
+@app.route('/api/readability', methods=['POST'])
+def check_readability():
+    """Scores for {"text": ...}, or {"results": [...]} for {"texts": [...]} (scored together)."""
+    try:
+        data = request.get_json()
+        if isinstance(data, dict) and isinstance(data.get('texts'), list):
+            texts = data['texts']
+            if not all(isinstance(text, str) for text in texts) or len(texts) > READABILITY_MAX_TEXTS:
+                return jsonify({"error": f"'texts' must be a list of at most {READABILITY_MAX_TEXTS} strings"}), 400
+            return jsonify({"results": readability_results(texts)}), 200
+        if not data or not isinstance(data.get('text'), str):
+            return jsonify({"error": "Invalid JSON payload, missing 'text' field"}), 400
+        return jsonify(readability_results([data['text']])[0]), 200
+    except Exception as e:
+        app.logger.error(f"Unexpected error in /api/readability: {str(e)}")
+        app.logger.error(traceback.format_exc())
+        return jsonify({"error": "An unexpected error occurred during readability scoring"}), 500
+
+# --- Incremental Analysis ---
+# /api/analyze with a "document_id" re-checks only the segments (paragraphs, or sentence groups
+# of long paragraphs) that are new since the last version of that document, and merges their
+# results with those of the unchanged segments (see incremental.py). Documents are kept per
+# process: under gunicorn an edit that reaches another worker is checked in full there.
+INCREMENTAL_MAX_DOCUMENTS = int(os.environ.get("INCREMENTAL_MAX_DOCUMENTS", 256))
+# Bounds the memory of the stored results too: characters of segment text over all documents and checks.
+INCREMENTAL_MAX_CHARS = int(os.environ.get("INCREMENTAL_MAX_CHARS", 16_000_000))
+INCREMENTAL_MAX_SEGMENT_CHARS = int(os.environ.get("INCREMENTAL_MAX_SEGMENT_CHARS", 2000))
+# The AI check keeps results per window of whole segments, as long as the single-pass limit, since
+# the model's score of a short paragraph says little about the document.
+INCREMENTAL_AI_WINDOW_CHARS = int(os.environ.get("INCREMENTAL_AI_WINDOW_CHARS", MAX_TEXT_LENGTH))
+incremental_documents = DocumentStore(INCREMENTAL_MAX_DOCUMENTS, INCREMENTAL_MAX_CHARS)
+
+def incremental_results(check, document_id, segments, params, check_segments_of, reusable=lambda result: True):
+    """Each segment's result for `check`, reusing the document's last version; returns (results, checked)."""
+    previous = incremental_documents.get(document_id, check, params)
+    results, checked = check_segments(segments, previous, check_segments_of)
+    incremental_documents.put(document_id, check, params, {segment: result for (_, segment), result
+                                                           in zip(segments, results) if reusable(result)})
+    incremental_segments.inc(len(segments) - checked, check=check, result="reused")
+    incremental_segments.inc(checked, check=check, result="checked")
+    return results, checked
+
+def incremental_grammar(document_id, segments, language):
+    """/api/checkText's result for the segments.
+
+    Each run of adjacent new segments goes to LanguageTool as the text it is, the runs concurrently.
+    Matches that cross from one segment into the next are dropped, so the rare rule that flags two
+    sentences across a paragraph or segment boundary is missed here.
+    """
+    def check_texts(missing):
+        runs = [[text for _, text in run] for run in contiguous_runs(missing)]
+        runs = [run for run in runs if "".join(run).strip()]
+        results = {}
+        for run, response in zip(runs, languagetool_check_all(["".join(run) for run in runs], language)):
+            envelope = {key: value for key, value in response.items() if key != "matches"}
+            for text, matches in zip(run, split_matches(response.get("matches", []), run)):
+                results[text] = dict(envelope, matches=matches)
+        return [results.get(text, {"matches": []}) for _, text in missing]
+
+    results, checked = incremental_results("grammar", document_id, segments, grammar_cache_params(language),
+                                           check_texts)
+    envelope = next(({key: value for key, value in result.items() if key != "matches"}
+                     for result in results if len(result) > 1), {})
+    return dict(envelope, matches=merge_matches(segments, [result["matches"] for result in results])), 200, checked
+
+def incremental_plagiarism(document_id, segments, text, top_k):
+    """/api/checkPlagiarism's result, from the preprocessed text and copied passages of each segment.
+
+    Similarity scores match a full check: the document's terms are the segments' terms. Passages
+    are found within segments, so one that crosses a segment boundary is reported in parts or,
+    if its parts are too short, not at all.
+    """
+    index = plagiarism_corpus.snapshot
+
+    def check_texts(missing):
+        texts = [text for _, text in missing]
+        with check_stage_seconds.time(check="plagiarism", stage="preprocess"):
+            processed = normalize_batch(texts, tokenizer=PLAGIARISM_TOKENIZER)
+        with check_stage_seconds.time(check="plagiarism", stage="passages"):
+            passages = [index.fingerprints.find_passages(text)[:PLAGIARISM_MAX_PASSAGES] for text in texts]
+        return [{"processed": p, "passages": q} for p, q in zip(processed, passages)]
+
+    params = {"corpus": index.digest, "tokenizer": PLAGIARISM_TOKENIZER}
+    results, checked = incremental_results("plagiarism", document_id, segments, params, check_texts)
+    processed = " ".join(result["processed"] for result in results if result["processed"])
+    passages = merge_passages(segments, [result["passages"] for result in results], PLAGIARISM_MAX_PASSAGES)
+    body, status = plagiarism_result(text, top_k, index, processed, passages=passages)
+    return body, status, checked
+
+def incremental_ai(document_id, segments, text):
+    """/api/checkAiText's result, from windows of whole segments of at least INCREMENTAL_AI_WINDOW_CHARS.
+
+    The first version of a document, or one where most windows changed, gets the whole-text
+    check (and its windows are scored for the next version). Otherwise only new windows are
+    classified, and the result is the length-weighted mean of the window scores, so it can differ
+    from one pass over the whole text; `windows` lists the character span and score of each.
+    """
+    windows = group_windows(segments, INCREMENTAL_AI_WINDOW_CHARS)
+    params = ai_detector_cache_params()
+    previous = incremental_documents.get(document_id, "ai", params)
+    whole = None
+    if 2 * sum(window not in previous for _, window in windows) > len(windows):
+        whole = cached_result("checkAiText", text, params, lambda: ai_text_result(text),
+                              cacheable=ai_result_cacheable)[:2]
+        if whole[1] != 200 or not ai_result_cacheable(whole[0]):
+            return whole[0], whole[1], 0
+
+    def check_texts(missing):
+        results = {text: whole} if whole is not None else {}
+        non_blank = [window for _, window in missing if window.strip() and window not in results]
+        results.update(zip(non_blank, ai_text_results(non_blank)) if non_blank else ())
+        return [results.get(window) for _, window in missing]
+
+    results, checked = incremental_results(
+        "ai", document_id, windows, params, check_texts,
+        reusable=lambda result: result is None or (result[1] == 200 and ai_result_cacheable(result[0])))
+    if whole is not None:
+        return whole[0], whole[1], checked
+    scored = []
+    for (start, window), result in zip(windows, results):
+        if result is None:
+            continue  # Blank
+        body, status = result
+        if status != 200 or not ai_result_cacheable(body):
+            return body, status, checked
+        scored.append((start, window, body))
+    weights = [len(window.strip()) for _, window, _ in scored]
+    ai_score = sum(weight * body["ai_score"] for weight, (_, _, body) in zip(weights, scored)) / sum(weights)
+    is_ai = ai_score >= 0.5
+    # The label of the longest window on the same side of 0.5 as the document.
+    weighted = [(weight, body) for weight, (_, _, body) in zip(weights, scored)]
+    _, label_body = max([item for item in weighted if (item[1]["ai_score"] >= 0.5) == is_ai] or weighted,
+                        key=lambda item: item[0])
+    return {
+        "ai_score": round(ai_score, 3),
+        "prediction_label": label_body["prediction_label"],
+        "model_score": round(ai_score if is_ai else 1.0 - ai_score, 3),
+        "windows": [{"start": start, "end": start + len(window), "ai_score": body["ai_score"]}
+                    for start, window, body in scored],
+    }, 200, checked
+
+# --- Combined Analysis Endpoint ---
+# /api/analyze takes a text once and runs the grammar, plagiarism and AI checks concurrently
+# on a thread pool: the LanguageTool call waits on the network while the plagiarism search
+# (NumPy/SciPy) and the model (PyTorch, fed by the micro-batcher) run, and both release the
+# GIL for their heavy parts. Each check goes through the same result cache as its own endpoint,
+# except in incremental mode (a "document_id" in the request; see Incremental Analysis above).
+ANALYZE_CHECKS = ("grammar", "plagiarism", "ai")
+ANALYZE_MAX_WORKERS = int(os.environ.get("ANALYZE_MAX_WORKERS", 12))
+ANALYZE_TIMEOUT_SECONDS = float(os.environ.get("ANALYZE_TIMEOUT_SECONDS", 60))
+_analyze_executor = None
+_analyze_executor_pid = None
+_analyze_executor_lock = threading.Lock()
+
+def analyze_executor():
+    global _analyze_executor, _analyze_executor_pid
+    # Worker threads do not survive fork(); each process builds its own pool.
+    with _analyze_executor_lock:
+        if _analyze_executor_pid != os.getpid():
+            _analyze_executor = ThreadPoolExecutor(max_workers=ANALYZE_MAX_WORKERS, thread_name_prefix="analyze")
+            _analyze_executor_pid = os.getpid()
+        return _analyze_executor
+
+def analysis_check(check, text, language, top_k, document_id=None, segments=None):
+    """Run one /api/analyze check; returns (body, status, cache status or None, segments checked or None, milliseconds).
+
+    With a document_id the check is incremental (bypassing the result cache) over the text's `segments`.
+    """
+    start = time.perf_counter()
+    checked = None
+    try:
+        if document_id is not None and check == "grammar":
+            body, status, checked = incremental_grammar(document_id, segments, language)
+            cache_status = None
+        elif document_id is not None and check == "plagiarism":
+            body, status, checked = incremental_plagiarism(document_id, segments, text, top_k)
+            cache_status = None
+        elif check == "grammar":
+            body, status, cache_status = cached_result("checkText", text, grammar_cache_params(language),
+                                                       lambda: (languagetool_check(text, language), 200))
+        elif check == "plagiarism":
+            index = plagiarism_corpus.snapshot
+            body, status, cache_status = cached_result("checkPlagiarism", text, plagiarism_cache_params(top_k, index),
+                                                       lambda: plagiarism_result(text, top_k, index))
+        else:
+            unavailable = ai_detector_unavailable()
+            if unavailable is not None:
+                body, status, cache_status = unavailable[0], unavailable[1], None
+            elif document_id is not None:
+                body, status, checked = incremental_ai(document_id, segments, text)
+                cache_status = None
+            else:
+                body, status, cache_status = cached_result("checkAiText", text, ai_detector_cache_params(),
+                                                           lambda: ai_text_result(text), cacheable=ai_result_cacheable)
+    except requests.exceptions.RequestException as e:
+        app.logger.error(f"Error connecting to LanguageTool server: {str(e)}")
+        body, status, cache_status = {"error": f"Error connecting to LanguageTool server: {str(e)}"}, 502, None
+    except Exception as e:
+        app.logger.error(f"Unexpected error in /api/analyze ({check} check): {str(e)}")
+        app.logger.error(traceback.format_exc())
+        body, status, cache_status = {"error": f"An unexpected error occurred during the {check} check"}, 500, None
+    return body, status, cache_status, checked, (time.perf_counter() - start) * 1000
+
+@app.route('/api/analyze', methods=['POST'])
+def analyze():
+    data = request.get_json(silent=True)
+    if not data: return jsonify({"error": "Invalid JSON payload"}), 400
+    text = data.get('text')
+    language = data.get('language')
+    checks = data.get('checks', list(ANALYZE_CHECKS))
+    top_k = data.get('top_k', PLAGIARISM_DEFAULT_TOP_K)
+    document_id = data.get('document_id')
+    if not isinstance(text, str) or not text.strip():
+        return jsonify({"error": "Missing or empty 'text' field"}), 400
+    if not isinstance(checks, list) or not checks or not set(checks) <= set(ANALYZE_CHECKS):
+        return jsonify({"error": f"'checks' must be a non-empty list of: {', '.join(ANALYZE_CHECKS)}"}), 400
+    if "grammar" in checks and not language:
+        return jsonify({"error": "Missing 'language' field (required by the grammar check)"}), 400
+    if not valid_top_k(top_k):
+        return jsonify({"error": f"'top_k' must be an integer between 1 and {PLAGIARISM_MAX_TOP_K}"}), 400
+    if document_id is not None and (not isinstance(document_id, str) or not 0 < len(document_id) <= 200):
+        return jsonify({"error": "'document_id' must be a string of 1 to 200 characters"}), 400
+
+    start = time.perf_counter()
+    segments = split_segments(text, INCREMENTAL_MAX_SEGMENT_CHARS) if document_id is not None else None
+    executor = analyze_executor()
+    futures = {check: executor.submit(analysis_check, check, text, language, top_k, document_id, segments)
+               for check in ANALYZE_CHECKS if check in checks}
+    done, _ = wait(futures.values(), timeout=ANALYZE_TIMEOUT_SECONDS)
+
+    # A failed or timed-out check is reported under "errors"; the others are still returned.
+    response = {"results": {}, "errors": {}, "cache": {}, "timings_ms": {}}
+    if segments is not None:
+        response["segments"] = {"total": len(segments), "checked": {}}
+    for check, future in futures.items():
+        if future not in done:
+            app.logger.error(f"/api/analyze: {check} check timed out after {ANALYZE_TIMEOUT_SECONDS:g}s.")
+            response["errors"][check] = {"error": f"The {check} check timed out", "status": 504}
+            response["timings_ms"][check] = round(ANALYZE_TIMEOUT_SECONDS * 1000, 1)
+            continue
+        body, status, cache_status, checked, elapsed_ms = future.result()
+        response["timings_ms"][check] = round(elapsed_ms, 1)
+        if checked is not None:
+            response["segments"]["checked"][check] = checked
+        if status == 200:
+            response["results"][check] = body
+            response["cache"][check] = cache_status
+        else:
+            response["errors"][check] = dict(body, status=status)
+    response["timings_ms"]["total"] = round((time.perf_counter() - start) * 1000, 1)
+    # Succeeds if any check did; otherwise answers with the first failed check's status.
+    status = 200 if response["results"] else next(iter(response["errors"].values()))["status"]
+    return jsonify(response), status
+
+# --- Batch Analysis ---
+# Many documents at once (see batch_pipeline.py for the CLI): each batch is preprocessed,
+# searched against the corpus as one sparse product and classified in one model call.
+BATCH_ANALYSIS_SIZE = int(os.environ.get("BATCH_ANALYSIS_SIZE", 32))
+
+def ai_text_results(texts):
+    """`ai_text_result` for many non-empty texts, classifying all single-pass texts in one model call."""
+    results = [None] * len(texts)
+    single_pass = []
+    for i, text in enumerate(texts):
+        long_result = detect_ai_text_long(text) if len(text) > MAX_TEXT_LENGTH else None
+        if long_result is not None:
+            results[i] = (long_result, 200)
+        else:
+            single_pass.append(i)
+    if single_pass:
+        predictions = run_ai_detector_batch([texts[i][:MAX_TEXT_LENGTH] for i in single_pass])
+        for i, prediction in zip(single_pass, predictions):
+            results[i] = ai_prediction_result(prediction)
+    return results
+
+def analyze_documents(documents, checks=BATCH_CHECKS, top_k=PLAGIARISM_DEFAULT_TOP_K):
+    """Plagiarism, AI and/or readability results for a batch of {"id", "text"} documents, one dict per document.
+
+    Results match /api/checkPlagiarism and /api/checkAiText, except that the plagiarism search
+    always scores every document sharing a term (PLAGIARISM_MAX_QUERY_TERMS does not apply).
+    The result cache is bypassed, so bulk runs do not evict interactive results.
+    """
+    if "ai" in checks and ai_text_detector is None:
+        raise RuntimeError("AI text detection model is not available")
+    results = [{"id": document["id"]} for document in documents]
+    texts = [document["text"] for document in documents]
+    non_empty = [i for i, text in enumerate(texts) if text.strip()]
+    for i in set(range(len(texts))) - set(non_empty):
+        if "plagiarism" in checks:
+            results[i]["plagiarism"] = {"status": "input_empty", "score": 0.0, "message": "Input text is empty."}
+        if "ai" in checks:
+            results[i]["ai"] = {"ai_score": 0.0, "prediction_label": "N/A", "model_score": 0.0, "message": "Input text is empty."}
+
+    if "plagiarism" in checks:
+        index = plagiarism_corpus.snapshot
+        processed = normalize_batch([texts[i] for i in non_empty], tokenizer=PLAGIARISM_TOKENIZER)
+        for i, processed_text, top_matches in zip(non_empty, processed, index.search_batch(processed, top_k=top_k)):
+            results[i]["plagiarism"], _ = plagiarism_result(texts[i], top_k, index, processed_text, top_matches)
+    if "ai" in checks:
+        for i, (body, _) in zip(non_empty, ai_text_results([texts[i] for i in non_empty])):
+            results[i]["ai"] = body
+    if "readability" in checks:
+        for result, readability in zip(results, readability_results(texts)):
+            result["readability"] = readability
+    return results
+
+@app.route('/api/batch', methods=['POST'])
+def batch_analyze():
+    """Stream one JSONL result line per JSONL input line ({"id": ..., "text": ...}), in order."""
+    checks = request.args.get('checks', ",".join(BATCH_CHECKS)).split(",")
+    top_k = request.args.get('top_k', PLAGIARISM_DEFAULT_TOP_K, type=int)
+    if not set(checks) <= set(BATCH_CHECKS):
+        return jsonify({"error": f"'checks' must be a comma-separated list of: {', '.join(BATCH_CHECKS)}"}), 400
+    if not valid_top_k(top_k):
+        return jsonify({"error": f"'top_k' must be an integer between 1 and {PLAGIARISM_MAX_TOP_K}"}), 400
+    if "ai" in checks:
+        unavailable = ai_detector_unavailable()
+        if unavailable is not None:
+            body, status, headers = unavailable
+            return jsonify(body), status, headers
+
+    def generate():
+        # The body is read line by line while results are written, so memory stays bounded.
+        batches = analyze_batches(request.stream, lambda batch: analyze_documents(batch, checks, top_k),
+                                  batch_size=BATCH_ANALYSIS_SIZE)
+        try:
+            for results in batches:
+                yield "".join(json.dumps(result) + "\n" for result in results)
+        except Exception as e:
+            # Headers are already sent; the last line tells the client where results stop.
+            app.logger.error(f"Unexpected error in /api/batch: {str(e)}")
+            app.logger.error(traceback.format_exc())
+            yield json.dumps({"error": "An unexpected error occurred during batch analysis; no further results"}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# --- Health and Readiness ---
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok", "uptime_seconds": round(process_uptime(), 3)}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: every required startup component has loaded (per-component state included)."""
+    ready = startup_status.is_ready()
+    return jsonify({"ready": ready, "uptime_seconds": round(process_uptime(), 3),
+                    "components": startup_status.snapshot()}), 200 if ready else 503
+
+_first_request_logged = False
+
+@app.before_request
+def log_first_request():
+    global _first_request_logged
+    if not _first_request_logged:
+        _first_request_logged = True
+        app.logger.info(f"Startup: first request ({request.path}) {process_uptime():.2f}s after process start.")
+
+# --- Pre-fork Serving ---
+# Under a pre-fork server (see gunicorn.conf.py) this module is imported once in the master
+# and the workers are forked from it, sharing the corpus index and the model weights
+# copy-on-write. Threads do not survive fork(): each worker restarts the ones started at
+# import (pools, batchers and connections are rebuilt per process on first use). A fork in
+# the middle of the background model load would leave the child with half-imported modules
+# and no model, so forking waits for it instead.
+def wait_for_background_loading():
+    loader = _ai_detector_loader
+    if loader is not None and loader.is_alive():
+        app.logger.info("Waiting for the AI detection model to finish loading before forking...")
+        loader.join()
+
+def restart_background_threads():
+    start_corpus_reweighting()
+    start_corpus_sync()  # Before the worker takes its first request
+
+os.register_at_fork(before=wait_for_background_loading, after_in_child=restart_background_threads)
+
+# --- Request Metrics and Profiling ---
+METRICS_TEXT_ENDPOINTS = ("/api/checkText", "/api/checkPlagiarism", "/api/checkAiText", "/api/analyze",
+                          "/api/readability")
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.profiler = profiler.start()
+
+@app.after_request
+def record_request_metrics(response):
+    # Routes, not raw paths, so unknown URLs cannot create unbounded label values.
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if response.status_code >= 400:
+        http_request_errors.inc(endpoint=endpoint, status=response.status_code)
+    if "request_start" in g:
+        # Streamed responses (/api/batch) are timed until their headers are ready.
+        http_request_seconds.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    if endpoint in METRICS_TEXT_ENDPOINTS:
+        data = request.get_json(silent=True)  # Already parsed (and cached) by the handler
+        if isinstance(data, dict) and isinstance(data.get("text"), str):
+            text_length.observe(len(data["text"]), endpoint=endpoint)
+    metrics.save()
+    return response
+
+@app.teardown_request
+def stop_request_profiler(exception):
+    if g.get("profiler") is not None:
+        path = profiler.stop(g.pop("profiler"), f"{request.method}-{request.path}")
+        app.logger.info(f"Profiled {request.method} {request.path}: {path}")
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- Runtime Statistics ---
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    return jsonify({"ai_batching": ai_batcher.stats(), "result_cache": result_cache.stats()}), 200
+
+app.logger.info(f"Startup: app imported {process_uptime():.2f}s after process start; "
+                f"AI detection model loading: {AI_DETECTOR_LOADING}.")
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
+    start_corpus_sync()
+    # Development server; see gunicorn.conf.py for production serving.
     # Important: Set use_reloader=False if model loading is expensive
     # to prevent it from loading twice in debug mode.
     app.run(debug=True, host='0.0.0.0', port=port, use_reloader=False)
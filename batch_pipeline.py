@@ -0,0 +1,188 @@
+"""Batch analysis of JSONL documents, as a CLI and as the pipeline behind /api/batch.
+
+Input is one `{"id": ..., "text": ...}` object per line (`id` defaults to the
+line number). Documents flow through a generator pipeline: lines are parsed
+and grouped into batches, each batch is analyzed in one call
+(`app.analyze_documents`: preprocessing, one sparse plagiarism product against
+the corpus, one batched model call and the readability formulas as NumPy
+array arithmetic), and one result per input line streams
+out as JSONL, in input order. At most `max_pending` batches are in flight, so
+memory stays bounded however long the input is.
+
+With `--workers N` batches are analyzed in a pool of N processes, each
+importing the app and loading its own corpus index and model, to use all cores.
+
+The CLI saves a checkpoint (input lines done, output bytes written) next to
+the output after every batch. Rerunning the same command after a crash
+truncates the output to the last checkpoint and skips the input lines already
+analyzed; the checkpoint is removed once the run completes.
+
+    python batch_pipeline.py submissions.jsonl results.jsonl --workers 4
+"""
+import argparse
+import functools
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+BATCH_CHECKS = ("plagiarism", "ai", "readability")
+DEFAULT_BATCH_SIZE = 32
+
+
+def parse_documents(lines, first_line=1):
+    """Yield (line number, document or error message) for each non-blank JSONL line (str or bytes)."""
+    for line_number, line in enumerate(lines, start=first_line):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, "Line is not valid JSON"
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get("text"), str):
+            yield line_number, "Line must be an object with a string 'text' field"
+            continue
+        yield line_number, {"id": record.get("id", line_number), "text": record["text"]}
+
+
+def _completed(func, *args):
+    future = Future()
+    future.set_result(func(*args))
+    return future
+
+
+def analyze_batches(lines, analyze_batch, batch_size=DEFAULT_BATCH_SIZE, executor=None, max_pending=2,
+                    first_line=1):
+    """Yield, per batch of input lines, the list of results (each with its "line" number) in input order.
+
+    `analyze_batch(documents) -> results` runs in `executor` if given (at most
+    `max_pending` batches submitted ahead of the one being yielded), otherwise inline,
+    one batch at a time. Lines that are not valid documents get an {"line", "error"}
+    result instead.
+    """
+    if executor is None:
+        submit, max_pending = _completed, 0
+    else:
+        submit = executor.submit
+    documents = parse_documents(lines, first_line)
+    pending = deque()
+    while True:
+        items = list(itertools.islice(documents, batch_size))
+        if items:
+            batch = [item for _, item in items if isinstance(item, dict)]
+            pending.append((items, submit(analyze_batch, batch) if batch else _completed(list)))
+        if pending and (not items or len(pending) > max_pending):
+            yield _merge(*pending.popleft())
+        if not items and not pending:
+            return
+
+
+def _merge(items, future):
+    results = iter(future.result())
+    return [{"line": line, **next(results)} if isinstance(item, dict) else {"line": line, "error": item}
+            for line, item in items]
+
+
+# --- CLI ---
+def app_analyze_batch(documents, checks, top_k):
+    import app  # Imported on first use: in pool workers this loads the corpus index and model
+    return app.analyze_documents(documents, checks, top_k)
+
+
+def _init_worker():
+    import app  # noqa: F401 - load before the first batch arrives
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as checkpoint:
+            return json.load(checkpoint)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    # Written to a temporary file and renamed, so a crash never leaves half a checkpoint.
+    with open(path + ".tmp", "w") as checkpoint:
+        json.dump(state, checkpoint)
+    os.replace(path + ".tmp", path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL documents, or - for stdin")
+    parser.add_argument("output", help="JSONL results, or - for stdout (both files are needed to resume)")
+    parser.add_argument("--checks", nargs="+", choices=BATCH_CHECKS, default=list(BATCH_CHECKS))
+    parser.add_argument("--top-k", type=int, default=5, help="Plagiarism matches per document")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="Analyze batches in this many processes")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and start over")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    resumable = args.input != "-" and args.output != "-"
+    checkpoint_path = (args.checkpoint or args.output + ".checkpoint") if resumable else None
+    run = {"input": os.path.abspath(args.input), "checks": sorted(args.checks), "top_k": args.top_k}
+    state = load_checkpoint(checkpoint_path) if resumable and not args.restart else None
+    if state is not None and state["run"] != run:
+        parser.error(f"{checkpoint_path} belongs to a different run; use --restart to start over")
+    lines_done, output_bytes = (state["lines_done"], state["output_bytes"]) if state else (0, 0)
+    if state:
+        logger.info(f"Resuming after input line {lines_done} ({output_bytes} bytes of output kept).")
+
+    # The model must be loaded before the first batch, in this process and in pool workers.
+    os.environ.setdefault("AI_DETECTOR_LOADING", "eager" if "ai" in args.checks else "lazy")
+    executor = None
+    if args.workers > 1:
+        # Share the cores between workers instead of every worker's PyTorch using all of them.
+        os.environ.setdefault("OMP_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // args.workers)))
+        executor = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker)
+    analyze = functools.partial(app_analyze_batch, checks=args.checks, top_k=args.top_k)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    if args.output == "-":
+        sink = sys.stdout.buffer
+    else:
+        sink = open(args.output, "r+b" if state else "wb")
+        sink.truncate(output_bytes)  # Drop results written after the last checkpoint
+        sink.seek(output_bytes)
+    start, lines, errors = time.monotonic(), 0, 0
+    try:
+        batches = analyze_batches(itertools.islice(source, lines_done, None), analyze, batch_size=args.batch_size,
+                                  executor=executor, max_pending=2 * args.workers, first_line=lines_done + 1)
+        for results in batches:
+            sink.write("".join(json.dumps(result) + "\n" for result in results).encode("utf-8"))
+            sink.flush()
+            lines += len(results)
+            errors += sum("error" in result for result in results)
+            if checkpoint_path:
+                os.fsync(sink.fileno())
+                save_checkpoint(checkpoint_path, {"run": run, "lines_done": results[-1]["line"],
+                                                  "output_bytes": sink.tell()})
+            elapsed = time.monotonic() - start
+            logger.info(f"{lines} lines ({errors} invalid) in {elapsed:.1f}s, {lines / max(elapsed, 1e-9):.1f} lines/s.")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if source is not sys.stdin:
+            source.close()
+        if args.output != "-":
+            sink.close()
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Request coalescing for batched model inference.
+
+Concurrent requests each submit one item; a single worker thread collects
+items for up to `max_wait_ms` or until `max_batch_size` are waiting, runs them
+through `process_batch` as one call (one padded forward pass for a
+transformers pipeline), and hands each waiting request its own result.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Coalesce single-item calls into batched calls of `process_batch(items) -> results`."""
+
+    def __init__(self, process_batch, max_batch_size=8, max_wait_ms=10, name="micro-batcher"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._items = 0
+        self._start_worker()
+
+    def _start_worker(self):
+        # Threads do not survive fork(), so a forked worker process starts its own.
+        self._pid = os.getpid()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Queue one item; returns a Future for its result."""
+        if self._pid != os.getpid():
+            self._start_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit one item and wait for its result (re-raises the batch's exception)."""
+        return self.submit(item).result(timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": batches,
+                "items": self._items,
+                "mean_batch_size": round(self._items / batches, 2) if batches else 0.0,
+                "batch_size_counts": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            }
+
+    # --- Worker ---
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    # Past the deadline, still take anything that is already waiting.
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process([entry for entry in batch if entry[1].set_running_or_notify_cancel()])
+
+    def _process(self, batch):
+        if not batch:
+            return
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+            self._items += len(batch)
+        items = [item for item, _ in batch]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(items):
+                raise ValueError(f"process_batch returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            if len(batch) > 1:
+                # Retry one by one so a single bad input does not fail the whole batch.
+                for entry in batch:
+                    self._process_single(entry)
+            else:
+                batch[0][1].set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _process_single(self, entry):
+        item, future = entry
+        try:
+            results = self.process_batch([item])
+            if len(results) != 1:
+                raise ValueError(f"process_batch returned {len(results)} results for 1 item")
+            future.set_result(results[0])
+        except Exception as e:
+            future.set_exception(e)
@@ -0,0 +1,138 @@
+"""AI detector backends: accuracy parity, latency and memory on a fixed text set.
+
+Each backend (see `ai_detection.load_detector`) is loaded in its own
+subprocess so resident memory is measured in isolation. For every backend the
+benchmark reports:
+
+* parity        - label agreement and max |ai_score difference| against the
+                  full-precision PyTorch backend on the same texts
+* latency       - p50/p95 of single-text calls and of one batch of all texts
+* memory        - resident set size after imports (torch alone is most of it),
+                  after the run (model weights are memory-mapped and only
+                  count once used), and the peak
+
+Run from the project root (the model is downloaded on first use):
+
+    python benchmarks/bench_ai_backends.py --backends pytorch pytorch_int8 onnx
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_detection import BACKENDS, ai_score_from_prediction, load_detector  # noqa: E402
+
+TEXTS = [
+    "The Roman Empire was founded by Augustus in 27 BC and spanned Europe, North Africa and the Middle East.",
+    "honestly i wasnt sure what to write so here goes, my weekend was mostly spent fixing the bike lol",
+    "Python is a versatile and widely-used programming language known for its readability and libraries.",
+    "In conclusion, it is important to note that technology has both advantages and disadvantages for society.",
+    "My grandmother's kitchen always smelled of cardamom and burnt sugar; she never measured anything.",
+    "Artificial intelligence is transforming industries by enabling machines to learn from data and make decisions.",
+    "We missed the 8:15 train, so we walked along the canal and argued about whether herons are dinosaurs.",
+    "Climate change refers to long-term shifts in temperatures and weather patterns, mainly caused by humans.",
+    "The committee will reconvene on Thursday; please bring the revised budget and the venue quotes.",
+    "Photosynthesis is the process by which green plants use sunlight to synthesize nutrients from carbon dioxide.",
+    "I tried the new ramen place downtown. Broth was great, noodles were soggy, service was weirdly intense.",
+    "There are many factors to consider when choosing a career, including passion, salary and work-life balance.",
+]
+
+
+def resident_mb():
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def run_backend(model_name, backend, repeats, onnx_path):
+    """Load one backend and measure it; returns a JSON-serialisable dict."""
+    rss_imports = resident_mb()
+    start = time.perf_counter()
+    classifier, _, _ = load_detector(model_name, backend, onnx_path=onnx_path)
+    load_seconds = time.perf_counter() - start
+    classifier(TEXTS[:2], batch_size=2)  # Warm up
+
+    single = []
+    for _ in range(repeats):
+        for text in TEXTS:
+            start = time.perf_counter()
+            classifier([text], batch_size=1)
+            single.append((time.perf_counter() - start) * 1000)
+    batched = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predictions = classifier(TEXTS, batch_size=len(TEXTS))
+        batched.append((time.perf_counter() - start) * 1000)
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "rss_imports_mb": round(rss_imports),
+        "rss_mb": round(resident_mb()),
+        "rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024),
+        "single_p50_ms": round(float(np.percentile(single, 50)), 2),
+        "single_p95_ms": round(float(np.percentile(single, 95)), 2),
+        "batch_p50_ms": round(float(np.percentile(batched, 50)), 2),
+        "predictions": predictions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="roberta-base-openai-detector")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--onnx-path", help="Exported graph to reuse (default: export to a temporary file)")
+    parser.add_argument("--json", help="Also write results to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)  # Internal: measure one backend and print JSON
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_backend(args.model, args.worker, args.repeats, args.onnx_path)))
+        return
+
+    onnx_path = args.onnx_path or os.path.join(tempfile.mkdtemp(prefix="bench-onnx-"), "model.onnx")
+    if "onnx" in args.backends and not os.path.exists(onnx_path):
+        # Export once up front (as a deployment would) so the onnx run measures only loading the graph.
+        subprocess.run([sys.executable, "-c", "import sys; from ai_detection import load_detector; "
+                        "load_detector(sys.argv[1], 'onnx', onnx_path=sys.argv[2])", args.model, onnx_path],
+                       check=True, capture_output=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    results = []
+    for backend in args.backends:
+        output = subprocess.run([sys.executable, __file__, "--model", args.model, "--repeats", str(args.repeats),
+                                 "--onnx-path", onnx_path, "--worker", backend],
+                                check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    predictions = {result["backend"]: result.pop("predictions") for result in results}
+    reference = "pytorch" if "pytorch" in predictions else results[0]["backend"]
+    header = (f"{'backend':>13} {'load s':>7} {'base MB':>8} {'RSS MB':>7} {'peak MB':>8} {'1-text p50':>11} {'1-text p95':>11} "
+              f"{'batch p50':>10} {'labels':>7} {'max |dAI|':>10}")
+    print(f"{args.model}, {len(TEXTS)} texts, parity against {reference}")
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        pairs = list(zip(predictions[result["backend"]], predictions[reference]))
+        agreement = np.mean([p["label"] == r["label"] for p, r in pairs])
+        difference = max(abs(ai_score_from_prediction(p["label"], p["score"]) -
+                             ai_score_from_prediction(r["label"], r["score"])) for p, r in pairs)
+        result.update(label_agreement=round(float(agreement), 3), max_ai_score_diff=round(float(difference), 4))
+        print(f"{result['backend']:>13} {result['load_seconds']:>7} {result['rss_imports_mb']:>8} {result['rss_mb']:>7} "
+              f"{result['rss_peak_mb']:>8} {result['single_p50_ms']:>11} {result['single_p95_ms']:>11} "
+              f"{result['batch_p50_ms']:>10} {result['label_agreement']:>7} {result['max_ai_score_diff']:>10}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
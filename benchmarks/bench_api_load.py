@@ -0,0 +1,400 @@
+"""Offline load test of the API endpoints, with a stored baseline to catch regressions.
+
+Everything runs locally, with no network access:
+
+* LanguageTool  - an in-process stub server that flags a fixed word and answers
+                  after `--languagetool-delay-ms` (an upstream's latency)
+* AI detection  - a tiny randomly initialized RoBERTa classifier built on the
+                  fly, or the real model if it is in the Hugging Face cache
+                  (`--model auto`, the default; `tiny`, `real` or a model path)
+* Plagiarism    - a synthetic corpus of `--corpus-docs` documents (Zipf-distributed
+                  vocabulary mixed with English stopwords) saved as a corpus index
+                  artifact and loaded through PLAGIARISM_INDEX_PATH
+
+The app is started as a real server (gunicorn with gunicorn.conf.py, or Flask's
+threaded server with `--server flask`) with the result cache disabled, and
+every request carries a fresh synthetic text (some with a passage copied from
+the corpus). For each endpoint and each `--concurrency` level, that many
+client threads send `--requests` requests back to back, `--repeat` times; the
+report gives the best p50/p95/p99 latency and throughput of the repeats (the
+least disturbed by other load on the machine, as with timeit), the errors of
+all of them, and the mean time per check stage taken from the server's /metrics.
+
+Results are written as JSON (`--output`). With `--baseline`, they are compared
+to a stored run: a p95 latency more than `--tolerance` above the baseline (and
+at least `--min-delta-ms` slower) or a throughput more than `--tolerance`
+below it is a regression, and the script exits with status 1. Baselines only
+compare runs on the same machine and settings; record one with
+`--write-baseline`. Run from the project root:
+
+    python benchmarks/bench_api_load.py --baseline benchmarks/baselines/bench_api_load.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ENDPOINTS = ("checkText", "checkPlagiarism", "checkAiText", "analyze")
+REAL_MODEL = "roberta-base-openai-detector"
+STOPWORDS = ("the a an of to and in is it that was for on are with as be at by this from or have not but "
+             "which they we their been has more when will would there can all its".split())
+FLAGGED_WORD = "tst"  # The LanguageTool stub reports every occurrence
+
+
+# --- Synthetic texts ---
+class TextGenerator:
+    """Deterministic English-like texts: Zipf-distributed made-up words mixed with stopwords."""
+
+    def __init__(self, vocabulary_size=20000, seed=0):
+        rng = random.Random(seed)
+        syllables = [consonant + vowel for consonant in "bcdfghjklmnprstvwz" for vowel in "aeiou"]
+        words = set()
+        while len(words) < vocabulary_size:
+            words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))))
+        self.words = sorted(words)
+        weights = 1.0 / np.arange(1, vocabulary_size + 1) ** 1.1
+        self.probabilities = weights / weights.sum()
+        self.rng = np.random.default_rng(seed)
+
+    def text(self, n_words):
+        content = self.rng.choice(len(self.words), size=n_words, p=self.probabilities)
+        sentences, sentence = [], []
+        for i, word_id in enumerate(content):
+            sentence.append(STOPWORDS[word_id % len(STOPWORDS)] if self.rng.random() < 0.4 else self.words[word_id])
+            if len(sentence) >= 8 + (word_id % 12) or i == n_words - 1:
+                sentences.append(" ".join(sentence).capitalize() + ".")
+                sentence = []
+        return " ".join(sentences)
+
+
+def query_texts(generator, corpus, count, n_words, copy_fraction, seed=1):
+    """Fresh texts (so no result is cached); `copy_fraction` of them embed a passage copied from the corpus."""
+    rng = random.Random(seed)
+    documents = list(corpus.values())
+    texts = []
+    for _ in range(count):
+        words = generator.text(n_words).split()
+        if rng.random() < copy_fraction:
+            source = rng.choice(documents).split()
+            start = rng.randrange(max(1, len(source) - 40))
+            position = rng.randrange(len(words))
+            words[position:position] = source[start:start + 40]
+        if rng.random() < 0.5:
+            words.insert(rng.randrange(len(words)), FLAGGED_WORD)
+        texts.append(" ".join(words))
+    return texts
+
+
+# --- Offline dependencies ---
+class StubLanguageTool(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes; don't add delayed-ACK stalls
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode(), keep_blank_values=True)
+        text = form["text"][0]
+        time.sleep(self.server.delay)
+        matches = [{"message": "Possible spelling mistake found.", "offset": len(text[:m.start()].encode("utf-16-le")) // 2,
+                    "length": len(FLAGGED_WORD), "rule": {"id": "MORFOLOGIK_RULE_EN_US"}}
+                   for m in re.finditer(FLAGGED_WORD, text)]
+        body = json.dumps({"language": {"code": form["language"][0]}, "matches": matches}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_languagetool_stub(delay_seconds):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubLanguageTool)
+    server.daemon_threads = True
+    server.delay = delay_seconds
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v2/check"
+
+
+def real_model_cached():
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return False
+    return isinstance(try_to_load_from_cache(REAL_MODEL, "config.json"), str)
+
+
+def build_tiny_model(path, words, seed=0):
+    """A word-level tokenizer over `words` and a 2-layer random RoBERTa classifier, saved to `path`."""
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaForSequenceClassification
+
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3}
+    vocab.update({word: i + 4 for i, word in enumerate(dict.fromkeys(words))})
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    backend.post_processor = processors.RobertaProcessing(("</s>", 2), ("<s>", 0))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, bos_token="<s>", eos_token="</s>", pad_token="<pad>",
+                                        unk_token="<unk>", cls_token="<s>", sep_token="</s>", model_max_length=512)
+    config = RobertaConfig(vocab_size=len(vocab), hidden_size=64, num_hidden_layers=2, num_attention_heads=2,
+                           intermediate_size=128, max_position_embeddings=514, pad_token_id=1,
+                           id2label={0: "Fake", 1: "Real"}, label2id={"Fake": 0, "Real": 1})
+    torch.manual_seed(seed)
+    RobertaForSequenceClassification(config).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return path
+
+
+def build_corpus_index(corpus, path):
+    from corpus_index import CorpusIndex
+    from text_normalization import normalize
+    CorpusIndex.build(corpus, normalize).save(path)
+    return path
+
+
+# --- Server ---
+def start_server(mode, port, workers, env, log_path):
+    """The app as a subprocess; its log goes to `log_path` (a pipe nobody reads would block it once full)."""
+    if mode == "gunicorn":
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+                   "--workers", str(workers), "app:app"]
+    else:
+        command = [sys.executable, "-c", "import app; app.app.run(host='127.0.0.1', port=%d, threaded=True)" % port]
+    with open(log_path, "w") as log:
+        return subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url, process, log_path, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(log_path) as log:
+                raise RuntimeError(f"Server exited during startup:\n{log.read()[-3000:]}")
+        try:
+            components = requests.get(f"{base_url}/readyz", timeout=5).json()["components"]
+            if all(component["state"] == "ready" for component in components.values()):
+                return
+        except (requests.exceptions.RequestException, ValueError, KeyError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time")
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# --- Load generation ---
+def payload(endpoint, text):
+    if endpoint == "checkText":
+        return {"language": "en-US", "text": text}
+    if endpoint == "analyze":
+        return {"language": "en-US", "text": text, "checks": ["grammar", "plagiarism", "ai"]}
+    return {"text": text}
+
+
+def run_level(base_url, endpoint, texts, concurrency):
+    """Send one request per text from `concurrency` threads; returns latency percentiles and throughput."""
+    pending = iter(texts)
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def client():
+        with requests.Session() as session:
+            while True:
+                with lock:
+                    text = next(pending, None)
+                if text is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = session.post(f"{base_url}/api/{endpoint}", json=payload(endpoint, text), timeout=120)
+                    status = response.status_code
+                except requests.exceptions.RequestException:
+                    status = "error"
+                elapsed = time.perf_counter() - start
+                with lock:
+                    (latencies if status == 200 else errors).append(elapsed if status == 200 else status)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    milliseconds = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {
+        "requests": len(texts),
+        "errors": len(errors),
+        "error_statuses": sorted({str(status) for status in errors}),
+        "p50_ms": round(float(np.percentile(milliseconds, 50)), 2),
+        "p95_ms": round(float(np.percentile(milliseconds, 95)), 2),
+        "p99_ms": round(float(np.percentile(milliseconds, 99)), 2),
+        "throughput_rps": round(len(latencies) / wall, 2),
+    }
+
+
+def best_of(runs):
+    """The best latencies and throughput of repeated runs, with the errors of all of them."""
+    return {
+        "requests": sum(run["requests"] for run in runs),
+        "errors": sum(run["errors"] for run in runs),
+        "error_statuses": sorted({status for run in runs for status in run["error_statuses"]}),
+        **{key: min(run[key] for run in runs) for key in ("p50_ms", "p95_ms", "p99_ms")},
+        "throughput_rps": max(run["throughput_rps"] for run in runs),
+    }
+
+
+def stage_means(metrics_text):
+    """Mean milliseconds per check stage, from the server's /metrics."""
+    sums, counts = {}, {}
+    for line in metrics_text.splitlines():
+        match = re.match(r'check_stage_duration_seconds_(sum|count)\{check="([^"]+)",stage="([^"]+)"\} (\S+)', line)
+        if match:
+            kind, check, stage, value = match.groups()
+            (sums if kind == "sum" else counts)[f"{check}.{stage}"] = float(value)
+    return {stage: round(sums[stage] / counts[stage] * 1000, 3) for stage in sorted(sums) if counts.get(stage)}
+
+
+# --- Baseline comparison ---
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Regressions of `results` against `baseline` (both as written by this script), as messages."""
+    regressions = []
+    for endpoint, levels in results["endpoints"].items():
+        for level, result in levels.items():
+            reference = baseline.get("endpoints", {}).get(endpoint, {}).get(level)
+            if reference is None:
+                continue
+            name = f"{endpoint} at concurrency {level}"
+            if result["errors"] > reference["errors"]:
+                regressions.append(f"{name}: {result['errors']} errors (baseline {reference['errors']})")
+            if (result["p95_ms"] > reference["p95_ms"] * (1 + tolerance)
+                    and result["p95_ms"] - reference["p95_ms"] >= min_delta_ms):
+                regressions.append(f"{name}: p95 {result['p95_ms']} ms (baseline {reference['p95_ms']} ms)")
+            if result["throughput_rps"] < reference["throughput_rps"] * (1 - tolerance):
+                regressions.append(f"{name}: {result['throughput_rps']} req/s "
+                                   f"(baseline {reference['throughput_rps']} req/s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint, concurrency level and repeat")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per endpoint first")
+    parser.add_argument("--text-words", type=int, default=150)
+    parser.add_argument("--copy-fraction", type=float, default=0.3, help="Texts with a passage copied from the corpus")
+    parser.add_argument("--corpus-docs", type=int, default=2000)
+    parser.add_argument("--doc-words", type=int, default=300)
+    parser.add_argument("--model", default="auto", help="auto, tiny, real, or a model id/path")
+    parser.add_argument("--languagetool-delay-ms", type=float, default=20)
+    parser.add_argument("--server", choices=("gunicorn", "flask"), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_api_load_results.json")
+    parser.add_argument("--baseline", help="Compare against this results file; exit 1 on regressions")
+    parser.add_argument("--write-baseline", help="Also save the results as a baseline here")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative p95/throughput change")
+    parser.add_argument("--min-delta-ms", type=float, default=5, help="Ignore p95 increases smaller than this")
+    args = parser.parse_args()
+
+    model = args.model
+    if model == "auto":
+        model = "real" if real_model_cached() else "tiny"
+    workdir = tempfile.mkdtemp(prefix="bench-api-load-")
+    generator = TextGenerator(seed=args.seed)
+    corpus = {f"doc{i:06d}": generator.text(args.doc_words) for i in range(args.corpus_docs)}
+    env = dict(os.environ, RESULT_CACHE_MAX_ENTRIES="0", AI_DETECTOR_LOADING="eager",
+               PLAGIARISM_INDEX_PATH=build_corpus_index(corpus, os.path.join(workdir, "corpus.npz")))
+    if model == "tiny":
+        env["AI_DETECTOR_MODEL"] = build_tiny_model(os.path.join(workdir, "model"), generator.words + STOPWORDS)
+    elif model == "real":
+        env.update(AI_DETECTOR_MODEL=REAL_MODEL, HF_HUB_OFFLINE="1")
+    else:
+        env["AI_DETECTOR_MODEL"] = model
+    stub, env["LANGUAGETOOL_URL"] = start_languagetool_stub(args.languagetool_delay_ms / 1000)
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    texts_needed = args.warmup + args.requests * len(args.concurrency) * args.repeat
+    texts = query_texts(generator, corpus, texts_needed, args.text_words, args.copy_fraction, seed=args.seed + 1)
+    server_log = os.path.join(workdir, "server.log")
+    server = start_server(args.server, args.port, args.workers, env, server_log)
+    results = {
+        "settings": {name: getattr(args, name) for name in ("concurrency", "requests", "repeat", "text_words",
+                                                             "copy_fraction", "corpus_docs", "doc_words",
+                                                             "languagetool_delay_ms", "server", "workers", "seed")}
+                    | {"model": model},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpus": os.cpu_count()},
+        "endpoints": {},
+    }
+    try:
+        wait_until_ready(base_url, server, server_log, timeout=600)
+        print(f"{args.server} ({args.workers} workers), model {model}, {args.corpus_docs} corpus documents, "
+              f"{args.text_words}-word texts, LanguageTool stub delay {args.languagetool_delay_ms} ms")
+        print(f"{'endpoint':>16} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>7}")
+        for endpoint in args.endpoints:
+            run_level(base_url, endpoint, texts[:args.warmup], max(args.concurrency))
+            levels = results["endpoints"][endpoint] = {}
+            for i, concurrency in enumerate(args.concurrency):
+                runs = []
+                for repeat in range(args.repeat):
+                    start = args.warmup + (i * args.repeat + repeat) * args.requests
+                    runs.append(run_level(base_url, endpoint, texts[start:start + args.requests], concurrency))
+                result = levels[str(concurrency)] = best_of(runs)
+                print(f"{endpoint:>16} {concurrency:>5} {result['p50_ms']:>9} {result['p95_ms']:>9} "
+                      f"{result['p99_ms']:>9} {result['throughput_rps']:>8} {result['errors']:>7}")
+        time.sleep(1.5)  # Let every worker save its metrics (see metrics.py)
+        results["stage_mean_ms"] = stage_means(requests.get(f"{base_url}/metrics", timeout=30).text)
+    finally:
+        stop_server(server)
+        stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print("Mean ms per check stage: " + ", ".join(f"{stage} {ms}" for stage, ms in results["stage_mean_ms"].items()))
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    if args.write_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.write_baseline)), exist_ok=True)
+        shutil.copyfile(args.output, args.write_baseline)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("settings") != results["settings"]:
+            print("Warning: the baseline was recorded with different settings.")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
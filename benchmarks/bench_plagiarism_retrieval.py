@@ -0,0 +1,129 @@
+"""Plagiarism retrieval latency against corpus size.
+
+Builds synthetic corpora (Zipf-distributed vocabulary, fixed document length)
+from 1k up to 1M documents and times three ways of finding the top-k matches
+for near-duplicate queries:
+
+* brute force   - `CorpusIndex.query` against every row, then a top-k selection
+* search        - `CorpusIndex.search` over the postings of all query terms (exact)
+* search (N)    - `CorpusIndex.search(max_query_terms=N)`, the recall/latency knob
+
+Recall is measured against the exact top-k. Run from the project root:
+
+    python benchmarks/bench_plagiarism_retrieval.py --sizes 1000 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from corpus_index import CorpusIndex, smoothed_idf  # noqa: E402
+
+
+def synthetic_index(n_documents, vocabulary_size, document_length, rng, chunk_size=100_000):
+    """Build a CorpusIndex directly from sampled term ids (no text tokenization)."""
+    probabilities = 1.0 / np.arange(1, vocabulary_size + 1) ** 1.1
+    probabilities /= probabilities.sum()
+    chunks = []
+    for start in range(0, n_documents, chunk_size):
+        rows = min(chunk_size, n_documents - start)
+        term_ids = rng.choice(vocabulary_size, size=(rows, document_length), p=probabilities)
+        chunk = sp.csr_matrix((np.ones(term_ids.size), (np.repeat(np.arange(rows), document_length), term_ids.ravel())),
+                              shape=(rows, vocabulary_size))
+        chunk.sum_duplicates()
+        chunks.append(chunk)
+    counts = sp.vstack(chunks, format="csr")
+    document_frequency = np.bincount(counts.indices, minlength=vocabulary_size)
+    idf = np.where(document_frequency > 0, smoothed_idf(document_frequency, n_documents), 0.0)
+    doc_ids = [f"doc{i}" for i in range(n_documents)]
+    terms = [f"t{i}" for i in range(vocabulary_size)]
+    return CorpusIndex(doc_ids, {}, terms, counts, idf, normalize(sp.csr_matrix(counts.multiply(idf))))
+
+
+def near_duplicate_queries(index, n_queries, keep_fraction, rng):
+    """Queries built from a random document with part of its tokens replaced."""
+    queries = []
+    for row in rng.choice(index.n_documents, size=n_queries, replace=False):
+        counts = index.counts[row]
+        tokens = np.repeat(counts.indices, counts.data.astype(int))
+        rng.shuffle(tokens)
+        kept = tokens[:int(len(tokens) * keep_fraction)]
+        noise = rng.integers(0, len(index.terms), size=len(tokens) - len(kept))
+        queries.append((int(row), " ".join(index.terms[t] for t in np.concatenate([kept, noise]))))
+    return queries
+
+
+def brute_force_top_k(index, processed_text, top_k):
+    scores = index.query(processed_text)
+    best = np.argpartition(-scores, top_k - 1)[:top_k]
+    return sorted(best, key=lambda row: -scores[row])
+
+
+def time_queries(function, queries):
+    latencies, results = [], []
+    for _, text in queries:
+        start = time.perf_counter()
+        results.append(function(text))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--vocabulary-size", type=int, default=50_000)
+    parser.add_argument("--document-length", type=int, default=80)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--max-query-terms", type=int, nargs="+", default=[16, 64])
+    parser.add_argument("--keep-fraction", type=float, default=0.6, help="Share of a document's tokens kept in its query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    report = []
+    header = f"{'docs':>9} {'build s':>8} {'method':>16} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9} {'top-1 hit':>9}"
+    print(header)
+    print("-" * len(header))
+    for n_documents in args.sizes:
+        start = time.perf_counter()
+        index = synthetic_index(n_documents, args.vocabulary_size, args.document_length, rng)
+        index.postings  # Built once per snapshot; keep it out of query timings.
+        build_seconds = time.perf_counter() - start
+        queries = near_duplicate_queries(index, min(args.queries, n_documents), args.keep_fraction, rng)
+
+        methods = {"brute force": lambda text: brute_force_top_k(index, text, args.top_k),
+                   "search": lambda text: [row for row, _ in index.search(text, top_k=args.top_k)]}
+        for limit in args.max_query_terms:
+            methods[f"search ({limit})"] = (
+                lambda text, limit=limit: [row for row, _ in index.search(text, top_k=args.top_k, max_query_terms=limit)])
+
+        exact = None
+        for name, function in methods.items():
+            latencies, results = time_queries(function, queries)
+            if exact is None:
+                exact = results
+            recall = np.mean([len(set(r) & set(e)) / max(len(e), 1) for r, e in zip(results, exact)])
+            hits = np.mean([bool(r) and r[0] == source for r, (source, _) in zip(results, queries)])
+            row = {"documents": n_documents, "build_seconds": round(build_seconds, 2), "method": name,
+                   "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                   "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+                   "recall_at_k": round(float(recall), 3), "top1_hit_rate": round(float(hits), 3)}
+            report.append(row)
+            print(f"{n_documents:>9} {row['build_seconds']:>8} {name:>16} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                  f"{row['recall_at_k']:>9} {row['top1_hit_rate']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Plagiarism preprocessing: per-document cost of the original function and of text_normalization.
+
+Compares, on the sample corpus documents and on longer synthetic essays:
+
+* original     - nltk.word_tokenize, string.punctuation and the stopword list
+                 re-read on every call (app.py before text_normalization.py)
+* nltk         - text_normalization with tokenizer="nltk" (frozen sets)
+* regex        - text_normalization with the default regex tokenizer
+* regex batch  - normalize_batch over all documents at once
+
+and checks that every variant yields the same index terms as the original.
+
+Run from the project root:
+
+    python benchmarks/bench_text_normalization.py
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+import nltk
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from corpus_index import _analyze  # noqa: E402
+from text_normalization import normalize, normalize_batch  # noqa: E402
+
+SAMPLE_DOCUMENTS = [
+    "The Roman Empire was founded by Augustus in 27 BC. It spanned across Europe, North Africa, and the Middle East. Its fall in 476 AD marked the beginning of the Middle Ages in Western Europe. Rome's legacy includes its language, laws, architecture, and political institutions.",
+    "Python is a versatile and widely-used programming language. Known for its readability and extensive libraries, it's popular in web development, data science, and artificial intelligence. Guido van Rossum began working on Python in the late 1980s.",
+    "Cooking involves applying heat to food to transform its chemical and physical properties. Common methods include baking, frying, boiling, and grilling. Understanding basic techniques and ingredient combinations is key to successful cooking.",
+    "Space exploration began with the launch of Sputnik 1 in 1957. Key milestones include the Apollo Moon landing in 1969 and the operations of the International Space Station. Future goals involve missions to Mars and beyond.",
+]
+
+
+def original_preprocess(text):
+    tokens = nltk.word_tokenize(text.lower())
+    tokens = [token for token in tokens if token not in string.punctuation]
+    stop_words = nltk.corpus.stopwords.words('english')
+    tokens = [token for token in tokens if token not in stop_words]
+    return " ".join(tokens)
+
+
+def essays(count, sentences, seed=0):
+    """Synthetic essays of shuffled sample-corpus sentences."""
+    pool = [sentence.strip() + "." for document in SAMPLE_DOCUMENTS for sentence in document.split(".") if sentence.strip()]
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(pool) for _ in range(sentences)) for _ in range(count)]
+
+
+def per_document_us(function, documents, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(documents)
+        timings.append((time.perf_counter() - start) / len(documents) * 1e6)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    variants = {
+        "original": lambda documents: [original_preprocess(text) for text in documents],
+        "nltk": lambda documents: [normalize(text, tokenizer="nltk") for text in documents],
+        "regex": lambda documents: [normalize(text) for text in documents],
+        "regex batch": normalize_batch,
+    }
+    normalize(SAMPLE_DOCUMENTS[0], tokenizer="nltk")  # Load NLTK data and stopwords up front
+    for name, documents in [("sample corpus documents", SAMPLE_DOCUMENTS * 25),
+                            ("20-sentence essays", essays(100, 20))]:
+        reference = [_analyze(text) for text in variants["original"](documents)]
+        baseline = None
+        print(f"{name} ({len(documents)} documents, {np.mean([len(d) for d in documents]):.0f} chars on average)")
+        print(f"{'variant':>12} {'us/doc':>9} {'speedup':>8} {'same terms':>11}")
+        for variant, function in variants.items():
+            microseconds = per_document_us(function, documents, args.repeats)
+            baseline = baseline or microseconds
+            same = [_analyze(text) for text in function(documents)] == reference
+            print(f"{variant:>12} {microseconds:>9.1f} {baseline / microseconds:>7.1f}x {str(same):>11}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Per-worker memory of gunicorn serving the app, with and without gunicorn.conf.py.
+
+Starts gunicorn twice with the same number of workers:
+
+* naive    - `gunicorn -w N app:app` without the config: every worker
+             imports the app and loads its own corpus index and model
+* preload  - `gunicorn -c gunicorn.conf.py app:app`: loaded once in the master,
+             workers forked from it
+
+warms every worker up with plagiarism and AI detection requests, and reads
+/proc/<pid>/smaps_rollup of the master and each worker:
+
+* RSS - resident pages, shared ones included (what `ps` and `top` show)
+* PSS - resident pages with each shared page split between its sharers
+* USS - pages private to the process, i.e. what one more worker costs
+
+The sum of PSS is the memory the whole server actually uses.
+
+Run from the project root (Linux only; the model is downloaded on first use,
+or set AI_DETECTOR_MODEL to a local model directory):
+
+    python benchmarks/bench_worker_memory.py --workers 4
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEXTS = [
+    "Python is a versatile and widely-used programming language known for its readability and libraries.",
+    "We missed the 8:15 train, so we walked along the canal and argued about whether herons are dinosaurs.",
+    "In conclusion, it is important to note that technology has both advantages and disadvantages for society.",
+]
+
+
+def memory_mb(pid):
+    """RSS, PSS and USS of one process in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss": fields["Rss"], "pss": fields["Pss"],
+            "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as listing:
+        return [int(child) for child in listing.read().split()]
+
+
+def post(port, path, payload):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return json.load(response)
+
+
+def wait_until_ready(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/readyz", timeout=5) as response:
+                if json.load(response)["components"]["ai_detector"]["state"] == "ready":
+                    return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("gunicorn did not become ready in time")
+
+
+def measure(mode, workers, port, requests_per_worker, startup_timeout):
+    command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+    # gunicorn reads ./gunicorn.conf.py unless told otherwise, so the naive run gets an empty config.
+    command += ["-c", "gunicorn.conf.py"] if mode == "preload" else ["-c", os.devnull, "--threads", "8",
+                                                                      "--timeout", "120"]
+    env = dict(os.environ, AI_DETECTOR_LOADING="eager", RESULT_CACHE_MAX_ENTRIES="0")
+    process = subprocess.Popen(command + ["app:app"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready(port, process, startup_timeout)
+        # Each worker must have loaded its model, in naive mode, before it counts as ready.
+        while len(children(process.pid)) < workers:
+            time.sleep(0.5)
+        for i in range(requests_per_worker * workers):
+            text = TEXTS[i % len(TEXTS)]
+            post(port, "/api/checkPlagiarism", {"text": text})
+            post(port, "/api/checkAiText", {"text": text})
+        time.sleep(1)
+        master = memory_mb(process.pid)
+        worker_memory = [memory_mb(pid) for pid in children(process.pid)]
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=60)
+    return master, worker_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests-per-worker", type=int, default=20)
+    parser.add_argument("--port", type=int, default=5099)
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers, model {os.environ.get('AI_DETECTOR_MODEL', 'roberta-base-openai-detector')}")
+    print(f"{'mode':>8} {'process':>8} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+    for mode in ("naive", "preload"):
+        master, worker_memory = measure(mode, args.workers, args.port, args.requests_per_worker,
+                                        args.startup_timeout)
+        for name, memory in [("master", master)] + [(f"worker {i}", m) for i, m in enumerate(worker_memory, 1)]:
+            print(f"{mode:>8} {name:>8} {memory['rss']:>8.0f} {memory['pss']:>8.0f} {memory['uss']:>8.0f}")
+        total = master["pss"] + sum(memory["pss"] for memory in worker_memory)
+        print(f"{mode:>8} {'total':>8} {'':>8} {total:>8.0f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,711 @@
+"""Pre-vectorized TF-IDF index over the plagiarism reference corpus.
+
+The corpus is preprocessed and vectorized once (or loaded from a saved
+artifact), so a plagiarism check only has to transform the input text and run
+a single sparse matrix-vector product against the stored doc-term matrix.
+
+Weighting mirrors scikit-learn's ``TfidfVectorizer`` defaults (smoothed IDF,
+raw term counts, L2-normalized rows), so scores are identical to refitting a
+vectorizer on the same corpus.
+
+Indexes are immutable snapshots. ``LiveCorpus`` applies document updates
+copy-on-write: new rows are weighted with the current IDF and appended, and the
+IDF drift this causes is corrected by a background re-weighting pass once
+enough of the corpus has changed. ``JournaledCorpus`` keeps the same updates in
+step across processes (e.g. pre-fork server workers) through a shared journal.
+
+``CorpusIndex.search`` avoids a brute-force pass over every row: the postings
+(the CSC view of the matrix) of the query's terms give the candidate documents,
+which are then reranked by exact cosine similarity. ``search_batch`` scores a
+batch of texts with a single sparse matrix product.
+
+Each snapshot also carries a ``FingerprintIndex`` (see fingerprint.py) over the
+original document texts for passage-level copy detection, and a ``digest``
+identifying its content: a hash of the documents, chained through every update
+and re-weighting, so two snapshots with the same digest score identically
+(e.g. for keying cached results across restarts).
+"""
+import contextlib
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+
+from fingerprint import FingerprintIndex, FingerprintTable
+
+logger = logging.getLogger(__name__)
+
+# Same tokenization TfidfVectorizer applies to already-preprocessed text.
+_analyze = CountVectorizer().build_analyzer()
+
+
+def smoothed_idf(document_frequency, n_documents):
+    """IDF weights as computed by TfidfVectorizer(smooth_idf=True)."""
+    df = np.asarray(document_frequency, dtype=np.float64) + 1
+    return np.log((n_documents + 1) / df) + 1
+
+
+def _chain_digest(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _documents_digest(documents):
+    return _chain_digest("documents", *(item for doc_id, text in documents.items() for item in (doc_id, text)))
+
+
+# Sum postings by row (sorting the row ids) when they hold fewer than 1/16 as many
+# entries as the corpus has documents; past that a dense accumulator is faster.
+_SPARSE_ACCUMULATION_RATIO = 16
+# Journal size at which the leading JournaledCorpus folds it into a checkpoint.
+DEFAULT_CHECKPOINT_BYTES = 16 * 1024 * 1024
+
+
+def _best(candidates, scores, top_k):
+    """Top-k (row, score) pairs with a positive score, best first."""
+    if len(candidates) > top_k:
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates, scores = candidates[best], scores[best]
+    order = np.lexsort((candidates, -scores))  # Ties keep corpus order, like argmax
+    return [(int(candidates[i]), float(scores[i])) for i in order if scores[i] > 0]
+
+
+def _weigh(counts, idf):
+    """TF-IDF weight raw counts and L2-normalize each row."""
+    if not counts.shape[0] or not counts.shape[1]:
+        return sp.csr_matrix(counts.shape, dtype=np.float64)  # normalize() rejects empty matrices
+    return normalize(sp.csr_matrix(counts.multiply(idf), dtype=np.float64))
+
+
+class CorpusIndex:
+    """Read-only TF-IDF index: vocabulary, IDF weights and a CSR doc-term matrix."""
+
+    def __init__(self, doc_ids, documents, terms, counts, idf, matrix,
+                 version=0, pending_changes=0, weighted_n_documents=None, fingerprints=None, digest=None):
+        self.doc_ids = list(doc_ids)  # Row order of `matrix`; only docs non-empty after preprocessing
+        self.documents = dict(documents)  # doc_id -> original text, used for previews
+        self.terms = list(terms)
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.counts = sp.csr_matrix(counts, dtype=np.float64)  # Raw term counts, kept for re-weighting
+        self.document_frequency = np.bincount(self.counts.indices, minlength=len(self.terms))
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.matrix = sp.csr_matrix(matrix, dtype=np.float64)
+        self.version = version
+        # Documents added or removed since `idf` was last computed from the full corpus.
+        self.pending_changes = pending_changes
+        self.weighted_n_documents = len(self.doc_ids) if weighted_n_documents is None else weighted_n_documents
+        self.fingerprints = FingerprintIndex.build(self.documents) if fingerprints is None else fingerprints
+        self.digest = digest or _chain_digest(_documents_digest(self.documents), version, pending_changes)
+
+    @property
+    def n_documents(self):
+        return len(self.doc_ids)
+
+    @property
+    def drift(self):
+        """Fraction of the corpus that changed since the IDF weights were computed."""
+        return self.pending_changes / max(self.weighted_n_documents, 1)
+
+    @classmethod
+    def build(cls, documents, preprocess):
+        """Preprocess and vectorize `documents` (a doc_id -> text mapping) once."""
+        processed = {doc_id: preprocess(text) for doc_id, text in documents.items()}
+        doc_ids = [doc_id for doc_id, text in processed.items() if text.strip()]
+        if not doc_ids:
+            empty = sp.csr_matrix((0, 0))
+            return cls([], documents, [], empty, np.zeros(0), empty)
+
+        counter = CountVectorizer()
+        counts = counter.fit_transform([processed[doc_id] for doc_id in doc_ids])
+        document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+        idf = smoothed_idf(document_frequency, len(doc_ids))
+        return cls(doc_ids, documents, counter.get_feature_names_out(), counts, idf, _weigh(counts, idf))
+
+    def transform(self, processed_text):
+        """Vectorize one preprocessed text into a 1 x n_terms L2-normalized row."""
+        columns = self._term_counts(processed_text)
+        indices = np.fromiter(columns.keys(), dtype=np.int32, count=len(columns))
+        counts = np.fromiter(columns.values(), dtype=np.float64, count=len(columns))
+        vector = sp.csr_matrix((counts * self.idf[indices], indices, [0, len(indices)]),
+                               shape=(1, len(self.terms)))
+        return normalize(vector)
+
+    def transform_batch(self, processed_texts):
+        """Vectorize preprocessed texts into an n_texts x n_terms matrix of L2-normalized rows."""
+        indptr, indices, counts = [0], [], []
+        for processed_text in processed_texts:
+            columns = self._term_counts(processed_text)
+            indices.extend(columns.keys())
+            counts.extend(columns.values())
+            indptr.append(len(indices))
+        matrix = sp.csr_matrix((np.asarray(counts, dtype=np.float64), np.asarray(indices, dtype=np.int32), indptr),
+                               shape=(len(processed_texts), len(self.terms)))
+        return _weigh(matrix, self.idf)
+
+    def _term_counts(self, processed_text):
+        columns = {}
+        for token in _analyze(processed_text):
+            column = self.vocabulary.get(token)
+            if column is not None:
+                columns[column] = columns.get(column, 0) + 1
+        return columns
+
+    def query(self, processed_text):
+        """Cosine similarity of a preprocessed text against every indexed document."""
+        if not self.n_documents:
+            return np.zeros(0)
+        # Rows are unit length, so the dot product is the cosine similarity.
+        return (self.matrix @ self.transform(processed_text).T).toarray().ravel()
+
+    @functools.cached_property
+    def postings(self):
+        """Inverted index: column j lists the rows containing term j."""
+        return self.matrix.tocsc()
+
+    def search(self, processed_text, top_k=5, max_query_terms=None, rerank_depth=100):
+        """Top-k (row, cosine similarity) pairs, best first, for a preprocessed text (see `search_vector`)."""
+        return self.search_vector(self.transform(processed_text), top_k, max_query_terms, rerank_depth)
+
+    def search_vector(self, query, top_k=5, max_query_terms=None, rerank_depth=100):
+        """Top-k (row, cosine similarity) pairs, best first, for documents sharing a term with a `transform`ed query.
+
+        Only the postings of the query's terms are touched. With `max_query_terms`
+        set, candidates come from that many of the rarest (highest IDF) query terms
+        only, ranked by their partial score; the best `rerank_depth` of them are
+        then scored against the full query. This bounds the work for long queries
+        at the cost of missing documents that share none of the rare terms.
+        Returned scores are always exact cosine similarities.
+        """
+        if not self.n_documents or top_k < 1:
+            return []
+        terms, weights = query.indices, query.data
+        if max_query_terms and len(terms) > max_query_terms:
+            rarest = np.argsort(-self.idf[terms], kind="stable")[:max_query_terms]
+            candidates, partial_scores = self._accumulate(terms[rarest], weights[rarest])
+            depth = max(rerank_depth, top_k)
+            if len(candidates) > depth:
+                candidates = candidates[np.argpartition(-partial_scores, depth - 1)[:depth]]
+            scores = (self.matrix[candidates] @ query.T).toarray().ravel()
+        else:
+            candidates, scores = self._accumulate(terms, weights)
+        return _best(candidates, scores, top_k)
+
+    def _accumulate(self, terms, weights):
+        """(rows, scores) of the documents containing any of `terms`, scoring each by the sum of weight x tf-idf.
+
+        Postings much shorter than the corpus are summed by row without a
+        per-document array, so rare-term queries cost time and memory in
+        proportion to their postings. Longer ones (queries with common terms)
+        are summed into a dense array instead, which beats sorting that many
+        row ids.
+        """
+        postings = self.postings[:, terms]
+        if postings.nnz * _SPARSE_ACCUMULATION_RATIO < self.n_documents:
+            values = postings.data * np.repeat(weights, np.diff(postings.indptr))
+            rows, inverse = np.unique(postings.indices, return_inverse=True)
+            return rows, np.bincount(inverse, weights=values, minlength=len(rows))
+        scores = postings @ weights
+        rows = np.flatnonzero(scores)
+        return rows, scores[rows]
+
+    def search_batch(self, processed_texts, top_k=5):
+        """`search` (without `max_query_terms`) for many texts, as one sparse product.
+
+        The (texts x terms) query matrix times the transposed doc-term matrix
+        gives every text's cosine similarities at once; only documents sharing a
+        term with a text get an entry in its row.
+        """
+        if not self.n_documents or top_k < 1:
+            return [[] for _ in processed_texts]
+        scores = (self.transform_batch(processed_texts) @ self.matrix.T).tocsr()
+        return [_best(scores.indices[start:end], scores.data[start:end], top_k)
+                for start, end in zip(scores.indptr[:-1], scores.indptr[1:])]
+
+    # --- Incremental updates ---
+    def updated(self, upserts=None, deletions=()):
+        """Return a new snapshot with documents added, replaced or removed.
+
+        `upserts` maps doc_id -> (text, preprocessed_text). Only the changed rows
+        are vectorized; existing rows keep their weights until `reweighted()`.
+        """
+        upserts = upserts or {}
+        documents = dict(self.documents)
+        for doc_id in deletions:
+            documents.pop(doc_id, None)
+        dropped = set(deletions) | set(upserts)
+        keep = [row for row, doc_id in enumerate(self.doc_ids) if doc_id not in dropped]
+        n_dropped = self.n_documents - len(keep)
+
+        vocabulary = dict(self.vocabulary)
+        terms = list(self.terms)
+        doc_ids = [self.doc_ids[row] for row in keep]
+        data, indices, indptr = [], [], [0]
+        for doc_id, (text, processed_text) in upserts.items():
+            documents[doc_id] = text
+            if not processed_text.strip():
+                continue
+            columns = {}
+            for token in _analyze(processed_text):
+                column = vocabulary.get(token)
+                if column is None:
+                    column = vocabulary[token] = len(terms)
+                    terms.append(token)
+                columns[column] = columns.get(column, 0) + 1
+            indices.extend(columns.keys())
+            data.extend(columns.values())
+            indptr.append(len(indices))
+            doc_ids.append(doc_id)
+
+        n_terms = len(terms)
+        new_counts = sp.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), indptr),
+                                   shape=(len(indptr) - 1, n_terms))
+        kept_counts = self.counts[keep]
+        kept_counts.resize((len(keep), n_terms))
+        kept_matrix = self.matrix[keep]
+        kept_matrix.resize((len(keep), n_terms))
+        counts = sp.vstack([kept_counts, new_counts], format="csr")
+
+        # Terms that were absent and now occur get a fresh weight; terms that no longer
+        # occur anywhere are zeroed so queries are normalized as if they were never seen.
+        document_frequency = np.bincount(counts.indices, minlength=n_terms)
+        idf = np.zeros(n_terms)
+        idf[:len(self.idf)] = self.idf
+        fresh = (document_frequency > 0) & (idf == 0)
+        idf[fresh] = smoothed_idf(document_frequency[fresh], len(doc_ids))
+        idf[document_frequency == 0] = 0
+
+        matrix = sp.vstack([kept_matrix, _weigh(new_counts, idf)], format="csr")
+        fingerprints = self.fingerprints.updated({doc_id: text for doc_id, (text, _) in upserts.items()}, deletions)
+        digest = _chain_digest(self.digest, "update", *(item for doc_id in sorted(upserts)
+                                                         for item in (doc_id, upserts[doc_id][0])),
+                               "delete", *sorted(deletions))
+        return CorpusIndex(doc_ids, documents, terms, counts, idf, matrix,
+                           version=self.version + 1,
+                           pending_changes=self.pending_changes + n_dropped + new_counts.shape[0],
+                           weighted_n_documents=self.weighted_n_documents,
+                           fingerprints=fingerprints, digest=digest)
+
+    def reweighted(self):
+        """Return a snapshot with IDF recomputed over the whole corpus and unused terms dropped.
+
+        Re-weights the stored counts without re-tokenizing; the result scores
+        exactly like an index built from scratch on the same documents. The
+        fingerprint segments added by updates are merged at the same time.
+        """
+        live = self.document_frequency > 0
+        terms = [term for term, is_live in zip(self.terms, live) if is_live]
+        counts = self.counts[:, live]
+        idf = smoothed_idf(self.document_frequency[live], self.n_documents)
+        return CorpusIndex(self.doc_ids, self.documents, terms, counts, idf, _weigh(counts, idf),
+                           version=self.version + 1, fingerprints=self.fingerprints.compacted(),
+                           digest=_chain_digest(self.digest, "reweight"))
+
+    # --- On-disk artifact ---
+    def save(self, path):
+        doc_ids = list(self.documents)
+        fingerprints = self.fingerprints.compacted()
+        table = fingerprints.segments[0]
+        # Write through a file object so numpy does not append ".npz" to `path`.
+        with open(path, "wb") as artifact:
+            np.savez_compressed(
+                artifact,
+                indexed_doc_ids=np.array(self.doc_ids, dtype=str),
+                doc_ids=np.array(doc_ids, dtype=str),
+                doc_texts=np.array([self.documents[doc_id] for doc_id in doc_ids], dtype=str),
+                terms=np.array(self.terms, dtype=str),
+                idf=self.idf,
+                counts_data=self.counts.data,
+                counts_indices=self.counts.indices,
+                counts_indptr=self.counts.indptr,
+                data=self.matrix.data,
+                indices=self.matrix.indices,
+                indptr=self.matrix.indptr,
+                shape=np.array(self.matrix.shape),
+                state=np.array([self.version, self.pending_changes, self.weighted_n_documents]),
+                digest=np.array(self.digest),
+                fingerprint_doc_ids=np.array(fingerprints.doc_ids, dtype=str),
+                fingerprint_hashes=table.hashes,
+                fingerprint_docs=table.docs,
+                fingerprint_tokens=table.tokens,
+                fingerprint_starts=table.starts,
+                fingerprint_ends=table.ends,
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as artifact:
+            shape = tuple(artifact["shape"])
+            counts = sp.csr_matrix(
+                (artifact["counts_data"], artifact["counts_indices"], artifact["counts_indptr"]), shape=shape)
+            matrix = sp.csr_matrix((artifact["data"], artifact["indices"], artifact["indptr"]), shape=shape)
+            documents = dict(zip(artifact["doc_ids"].tolist(), artifact["doc_texts"].tolist()))
+            version, pending_changes, weighted_n_documents = artifact["state"].tolist()
+            table = FingerprintTable(*(artifact[f"fingerprint_{name}"]
+                                       for name in ("hashes", "docs", "tokens", "starts", "ends")))
+            fingerprints = FingerprintIndex(artifact["fingerprint_doc_ids"].tolist(), [table])
+            digest = artifact["digest"].item() if "digest" in artifact.files else None  # Older artifacts
+            return cls(artifact["indexed_doc_ids"].tolist(), documents, artifact["terms"].tolist(),
+                       counts, artifact["idf"], matrix, version=version,
+                       pending_changes=pending_changes, weighted_n_documents=weighted_n_documents,
+                       fingerprints=fingerprints, digest=digest)
+
+
+class LiveCorpus:
+    """Holds the current CorpusIndex snapshot and applies document updates to it.
+
+    Readers take `snapshot` once per request and never block: every update
+    builds a new snapshot and swaps it in with a single assignment. Writers are
+    serialized by a lock, and preprocessing happens before the lock is taken.
+    Updates that land while a re-weighting pass runs are logged and replayed
+    onto its result, so the pass is never wasted.
+    """
+
+    def __init__(self, index, preprocess, reweight_threshold=0.1):
+        self._index = index
+        self._preprocess = preprocess
+        self.reweight_threshold = reweight_threshold
+        self._write_lock = threading.Lock()
+        self._reweight_lock = threading.Lock()
+        self._replay_log = None  # (upserts, deletions) applied since the running re-weighting pass started
+
+    @property
+    def snapshot(self):
+        return self._index
+
+    def upsert(self, documents):
+        """Add or replace documents (doc_id -> text). Returns a summary of the change."""
+        upserts = {doc_id: (text, self._preprocess(text)) for doc_id, text in documents.items()}
+        current = self._update(upserts=upserts)
+        replaced = [doc_id for doc_id in upserts if doc_id in current.documents]
+        return {
+            "added": len(upserts) - len(replaced),
+            "replaced": len(replaced),
+            "skipped": [doc_id for doc_id, (_, processed) in upserts.items() if not processed.strip()],
+        }
+
+    def delete(self, doc_ids):
+        """Remove documents by id. Returns a summary of the change."""
+        current = self._update(deletions=doc_ids)
+        present = [doc_id for doc_id in doc_ids if doc_id in current.documents]
+        return {"deleted": len(present), "missing": [doc_id for doc_id in doc_ids if doc_id not in present]}
+
+    def _update(self, upserts=None, deletions=()):
+        """Apply one update (see `CorpusIndex.updated`); returns the snapshot it was applied to."""
+        with self._write_lock:
+            current = self._index
+            deletions = [doc_id for doc_id in deletions if doc_id in current.documents]
+            if upserts or deletions:
+                self._index = current.updated(upserts=upserts, deletions=deletions)
+                if self._replay_log is not None:
+                    self._replay_log.append((upserts, deletions))
+        self._maybe_reweight()
+        return current
+
+    def reweight(self):
+        """Recompute IDF for the current snapshot. Returns True if a new snapshot was swapped in.
+
+        Updates applied while the new weights are computed are replayed onto
+        the re-weighted snapshot before it is swapped in; they count towards
+        its drift as usual.
+        """
+        with self._reweight_lock:
+            with self._write_lock:
+                snapshot = self._index
+                if not snapshot.pending_changes:
+                    return False
+                self._replay_log = []
+            try:
+                reweighted = snapshot.reweighted()
+            except BaseException:
+                with self._write_lock:
+                    self._replay_log = None
+                raise
+            with self._write_lock:
+                replay, self._replay_log = self._replay_log, None
+                for upserts, deletions in replay:
+                    reweighted = reweighted.updated(upserts=upserts, deletions=deletions)
+                self._index = reweighted
+            logger.info(f"Re-weighted corpus index: {reweighted.n_documents} documents, {len(reweighted.terms)} terms"
+                        f" ({len(replay)} update(s) replayed).")
+            return True
+
+    def _maybe_reweight(self):
+        if self._index.drift >= self.reweight_threshold and not self._reweight_lock.locked():
+            threading.Thread(target=self._reweight_safely, daemon=True).start()
+
+    def _reweight_safely(self):
+        try:
+            self.reweight()
+        except Exception:
+            logger.exception("Background corpus re-weighting failed")
+
+    def start_periodic_reweighting(self, interval_seconds):
+        """Re-weight every `interval_seconds` if anything changed, on a daemon thread."""
+        def run():
+            while True:
+                time.sleep(interval_seconds)
+                self._reweight_safely()
+        thread = threading.Thread(target=run, name="corpus-reweight", daemon=True)
+        thread.start()
+        return thread
+
+
+class JournaledCorpus(LiveCorpus):
+    """A LiveCorpus kept identical across processes, such as the workers of a pre-fork server.
+
+    Every process starts from the same snapshot and shares a journal of updates
+    (JSON lines with the original texts). A process records an update under an
+    exclusive lock on the journal, after the records it has not applied yet,
+    and then applies both. The other processes apply it from their sync thread
+    (see `start_syncing`) within `sync_interval_seconds`; reading `snapshot`
+    never touches the journal. Applying a record costs as much as the update
+    itself.
+
+    Every process applies the same records in the same order, and re-weighting
+    is part of that order: a pass triggered by drift runs in line with the
+    update that crossed the threshold, and periodic passes are journaled as
+    records of their own. Once caught up, every process therefore has the same
+    documents, weights, version and digest.
+
+    One syncing process at a time leads (it holds a lock on `<journal>.leader`).
+    Only the leader journals periodic re-weighting passes. Once the journal
+    reaches `checkpoint_bytes`, the leader also saves its snapshot as a
+    checkpoint and replaces the journal with a new generation: a header naming
+    the checkpoint and the offset of the old journal it was taken at, followed
+    by the records appended after that offset. A process that had not read that
+    far (e.g. a worker forked from the startup snapshot) loads the checkpoint
+    instead of replaying the records before it.
+    """
+
+    def __init__(self, index, preprocess, journal_path, reweight_threshold=0.1, sync_interval_seconds=1.0,
+                 checkpoint_bytes=DEFAULT_CHECKPOINT_BYTES):
+        super().__init__(index, preprocess, reweight_threshold)
+        self.journal_path = journal_path
+        self.sync_interval_seconds = sync_interval_seconds
+        self.checkpoint_bytes = checkpoint_bytes
+        self.reweight_interval_seconds = None
+        self._generation = 0  # Journal generation being read, and the bytes of it read so far
+        self._journal_offset = 0
+        self._journal_inode = None
+        self._sync_lock = threading.Lock()  # Held while reading and applying records
+        self._syncer_lock = threading.Lock()
+        self._syncer_pid = None
+        self._leader = None  # (pid, locked file) once this process leads
+
+    def start_syncing(self):
+        """Catch up with the journal, then follow it from a daemon thread of this process.
+
+        Call it in every process that serves the corpus, before it serves
+        requests; threads do not survive fork, so again in each forked worker.
+        Returns False if this process already follows the journal.
+        """
+        with self._syncer_lock:
+            if self._syncer_pid == os.getpid():
+                return False
+            self._syncer_pid = os.getpid()
+        self.sync()
+        if self.sync_interval_seconds:
+            threading.Thread(target=self._run_syncer, name="corpus-journal-sync", daemon=True).start()
+        return True
+
+    def start_periodic_reweighting(self, interval_seconds):
+        """Journal a re-weighting pass every `interval_seconds` if anything changed, from the leader's sync thread."""
+        self.reweight_interval_seconds = interval_seconds
+
+    def sync(self):
+        """Apply the records other processes appended to the journal since the last call."""
+        with self._sync_lock:
+            self._catch_up()
+
+    def checkpoint(self):
+        """Save the snapshot as a checkpoint and start a new journal generation after it.
+
+        Updates in this process wait while the checkpoint is saved; reads and
+        other processes do not. Returns False if another process started a new
+        generation meanwhile.
+        """
+        with self._sync_lock:
+            self._catch_up()
+            generation, offset = self._generation, self._journal_offset
+            directory = os.path.dirname(self.journal_path)
+            name = f"{os.path.basename(self.journal_path)}.checkpoint-{generation + 1}"
+            saved = os.path.join(directory, f"{name}.{os.getpid()}.tmp")
+            self._index.save(saved)
+            with self._locked_journal() as journal:
+                header = self._read_header(journal)
+                if header["generation"] != generation:
+                    os.remove(saved)
+                    return False
+                journal.seek(offset)
+                records = journal.read()
+                line = json.dumps({"generation": generation + 1, "checkpoint": name, "offset": offset}).encode() + b"\n"
+                replacement = f"{self.journal_path}.{os.getpid()}.tmp"
+                with open(replacement, "wb") as new_journal:
+                    new_journal.write(line + records)
+                os.replace(saved, os.path.join(directory, name))
+                os.replace(replacement, self.journal_path)
+                if header["checkpoint"]:
+                    # Processes loading it opened it under the journal lock, so they can still read it.
+                    os.remove(os.path.join(directory, header["checkpoint"]))
+                self._generation, self._journal_offset = generation + 1, len(line)
+                self._journal_inode = os.stat(self.journal_path).st_ino
+            logger.info(f"Checkpointed the corpus journal: generation {generation + 1}, {offset} bytes folded in.")
+            return True
+
+    def _update(self, upserts=None, deletions=()):
+        if upserts:
+            record = {"upsert": {doc_id: text for doc_id, (text, _) in upserts.items()}}
+        else:
+            record = {"delete": list(deletions)}
+        with self._sync_lock:
+            with self._locked_journal() as journal:
+                pending = self._read_journal(journal)
+                self._append(journal, record)
+            self._apply(*pending)
+            return super()._update(upserts, deletions)
+
+    def reweight(self):
+        """Journal a re-weighting pass, so that every process runs it at the same point, and run it here."""
+        with self._sync_lock:
+            with self._locked_journal() as journal:
+                checkpoint, records = self._read_journal(journal)
+                if checkpoint is None and not records and not self._index.pending_changes:
+                    return False
+                self._append(journal, {"reweight": True})
+            self._apply(checkpoint, records)
+            return super().reweight()
+
+    def _maybe_reweight(self):
+        # In line rather than in the background, so that it happens after the same record everywhere.
+        if self._index.drift >= self.reweight_threshold:
+            super().reweight()
+
+    # --- Journal (callers hold the sync lock) ---
+    @contextlib.contextmanager
+    def _locked_journal(self):
+        import fcntl  # Unix only, like the pre-fork servers this is for
+        while True:
+            journal = open(self.journal_path, "a+b")
+            fcntl.flock(journal, fcntl.LOCK_EX)  # Released when the file is closed
+            try:
+                current = os.stat(self.journal_path).st_ino == os.fstat(journal.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                break
+            journal.close()  # Replaced by a new generation while waiting for the lock
+        with journal:
+            yield journal
+
+    def _journal_changed(self):
+        try:
+            stat = os.stat(self.journal_path)
+        except OSError:
+            return False
+        return stat.st_ino != self._journal_inode or stat.st_size > self._journal_offset
+
+    @staticmethod
+    def _read_header(journal):
+        """The generation header of the journal; generation 0 has none."""
+        journal.seek(0)
+        line = journal.readline()
+        header = json.loads(line) if line.endswith(b"\n") else {}
+        if "generation" not in header:
+            return {"generation": 0, "checkpoint": None, "offset": 0, "size": 0}
+        return dict(header, size=len(line))
+
+    def _read_journal(self, journal):
+        """The checkpoint to load first (an open file, or None) and the records after those applied here.
+
+        The caller holds the journal lock.
+        """
+        header = self._read_header(journal)
+        checkpoint = None
+        if header["generation"] != self._generation:
+            if header["generation"] == self._generation + 1 and self._journal_offset >= header["offset"]:
+                # Already read past the checkpoint: the records since are copied at the top of the new journal.
+                self._journal_offset = header["size"] + self._journal_offset - header["offset"]
+            else:
+                checkpoint = open(os.path.join(os.path.dirname(self.journal_path), header["checkpoint"]), "rb")
+                self._journal_offset = header["size"]
+            self._generation = header["generation"]
+        journal.seek(self._journal_offset)
+        data = journal.read()
+        end = data.rfind(b"\n") + 1  # Complete lines only
+        self._journal_offset += end
+        self._journal_inode = os.fstat(journal.fileno()).st_ino
+        return checkpoint, [json.loads(line) for line in data[:end].splitlines()]
+
+    def _append(self, journal, record):
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        journal.write(line)
+        journal.flush()
+        self._journal_offset += len(line)
+
+    def _catch_up(self):
+        with self._locked_journal() as journal:
+            pending = self._read_journal(journal)
+        self._apply(*pending)
+
+    def _apply(self, checkpoint, records):
+        # The journal lock is released by now: loading a checkpoint or re-weighting must not block other processes.
+        if checkpoint is not None:
+            with checkpoint:
+                index = CorpusIndex.load(checkpoint)
+            with self._write_lock:
+                self._index = index
+        for record in records:
+            if "upsert" in record:
+                super()._update(upserts={doc_id: (text, self._preprocess(text))
+                                         for doc_id, text in record["upsert"].items()})
+            elif "delete" in record:
+                super()._update(deletions=record["delete"])
+            else:
+                super().reweight()
+
+    # --- Sync thread ---
+    def _lead(self):
+        """Whether this process leads, taking the lead if no other process holds it."""
+        import fcntl
+        if self._leader is not None:
+            pid, lock_file = self._leader
+            if pid == os.getpid():
+                return True
+            lock_file.close()  # Inherited through fork; the lock stays with the parent
+            self._leader = None
+        lock_file = open(self.journal_path + ".leader", "a+b")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)  # Held until this process exits
+        except OSError:
+            lock_file.close()
+            return False
+        self._leader = (os.getpid(), lock_file)
+        return True
+
+    def _run_syncer(self):
+        last_reweight = time.monotonic()
+        while True:
+            time.sleep(self.sync_interval_seconds)
+            try:
+                if self._journal_changed():
+                    self.sync()
+                if not self._lead():
+                    continue
+                if self.reweight_interval_seconds and time.monotonic() - last_reweight >= self.reweight_interval_seconds:
+                    last_reweight = time.monotonic()
+                    self.reweight()
+                if self.checkpoint_bytes and os.path.getsize(self.journal_path) >= self.checkpoint_bytes:
+                    self.checkpoint()
+            except Exception:
+                logger.exception("Following the corpus journal failed")
@@ -0,0 +1,268 @@
+"""Passage-level copy detection with winnowed k-gram fingerprints.
+
+Whole-document TF-IDF similarity dilutes a copied paragraph inside a long
+essay. Here every text is reduced to fingerprints instead: hashes of
+overlapping k-word shingles, thinned by winnowing (the minimum hash of every
+window of `w` consecutive shingles is kept). Any run of at least `k + w - 1`
+shared words is guaranteed to share a fingerprint, and matching fingerprints
+are merged into spans with character offsets in both texts. Span boundaries
+are those of the first and last shared fingerprint, so a span can begin or end
+up to `w - 1` words inside the actually copied run.
+
+Inputs are consumed as a stream of text chunks and only `w` shingles are held
+at a time. Their fingerprints are looked up in batches as they are produced,
+and only the spans that can still grow are kept open, so apart from the
+passages found, long inputs are searched in bounded memory. The corpus side
+is stored as sorted NumPy arrays (hash, document, token position, character
+span) rather than dicts of strings, and lookups are binary searches.
+"""
+import re
+import zlib
+from array import array
+from collections import deque
+
+import numpy as np
+
+DEFAULT_K = 5  # Words per shingle
+DEFAULT_WINDOW = 4  # Shingles per winnowing window; runs of k + w - 1 words always match
+MAX_HASH_OCCURRENCES = 200  # Shingles seen more often than this are boilerplate and ignored
+LOOKUP_BATCH_SIZE = 256  # Input fingerprints looked up in the corpus at a time
+
+_TOKEN_RE = re.compile(r"\w+")
+_HASH_BASE = 1000003
+_HASH_MASK = (1 << 64) - 1
+
+
+def iter_tokens(chunks):
+    """Yield (lowercased word, start, end) from a string or an iterable of text chunks."""
+    if isinstance(chunks, str):
+        chunks = (chunks,)
+    carry, carry_start = "", 0
+    for chunk in chunks:
+        buffer = carry + chunk
+        last_end = 0
+        for match in _TOKEN_RE.finditer(buffer):
+            if match.end() == len(buffer):
+                break  # May continue in the next chunk
+            yield match.group().lower(), carry_start + match.start(), carry_start + match.end()
+            last_end = match.end()
+        else:
+            last_end = len(buffer)
+        carry_start += last_end
+        carry = buffer[last_end:]
+    for match in _TOKEN_RE.finditer(carry):
+        yield match.group().lower(), carry_start + match.start(), carry_start + match.end()
+
+
+def iter_shingles(chunks, k=DEFAULT_K):
+    """Yield (hash, token position, start, end) for every k-word shingle, via a rolling hash."""
+    high_power = pow(_HASH_BASE, k - 1, 1 << 64)
+    window = deque()  # (token hash, start, end) of the current k tokens
+    rolling = 0
+    for position, (token, start, end) in enumerate(iter_tokens(chunks)):
+        token_hash = zlib.crc32(token.encode("utf-8"))
+        if len(window) == k:
+            rolling = (rolling - window.popleft()[0] * high_power) & _HASH_MASK
+        rolling = (rolling * _HASH_BASE + token_hash) & _HASH_MASK
+        window.append((token_hash, start, end))
+        if len(window) == k:
+            yield rolling, position - k + 1, window[0][1], end
+
+
+def winnow(shingles, window_size=DEFAULT_WINDOW):
+    """Robust winnowing: the rightmost minimal hash of each window, each selection emitted once."""
+    candidates = deque()  # Monotonic queue of (index, shingle) with increasing hashes
+    last_emitted = -1
+    for index, shingle in enumerate(shingles):
+        while candidates and candidates[-1][1][0] >= shingle[0]:
+            candidates.pop()
+        candidates.append((index, shingle))
+        if candidates[0][0] <= index - window_size:
+            candidates.popleft()
+        if index >= window_size - 1 and candidates[0][0] != last_emitted:
+            last_emitted = candidates[0][0]
+            yield candidates[0][1]
+    if last_emitted == -1 and candidates:
+        yield candidates[0][1]  # Text shorter than one window: keep its minimum
+
+
+def fingerprint(chunks, k=DEFAULT_K, window_size=DEFAULT_WINDOW):
+    """Winnowed fingerprints of a text as (hash, token position, start, end) tuples."""
+    return winnow(iter_shingles(chunks, k), window_size)
+
+
+class FingerprintTable:
+    """Fingerprints of a batch of documents, as parallel arrays sorted by hash."""
+
+    def __init__(self, hashes, docs, tokens, starts, ends):
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.docs = np.asarray(docs, dtype=np.int32)
+        self.tokens = np.asarray(tokens, dtype=np.int32)
+        self.starts = np.asarray(starts, dtype=np.int32)
+        self.ends = np.asarray(ends, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.hashes)
+
+    @classmethod
+    def build(cls, texts, k=DEFAULT_K, window_size=DEFAULT_WINDOW):
+        """Fingerprint (doc number, text) pairs into one sorted table."""
+        dtypes = (np.uint64, np.int32, np.int32, np.int32, np.int32)
+        columns = [array("Q"), array("i"), array("i"), array("i"), array("i")]
+        for doc, text in texts:
+            for hash_value, token, start, end in fingerprint(text, k, window_size):
+                for column, value in zip(columns, (hash_value, doc, token, start, end)):
+                    column.append(value)
+        arrays = [np.frombuffer(column, dtype=dtype) if len(column) else np.zeros(0, dtype=dtype)
+                  for column, dtype in zip(columns, dtypes)]
+        order = np.argsort(arrays[0], kind="stable")
+        return cls(*(values[order] for values in arrays))
+
+    @classmethod
+    def concatenate(cls, tables):
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls([], [], [], [], [])
+        hashes = np.concatenate([table.hashes for table in tables])
+        order = np.argsort(hashes, kind="stable")
+        return cls(hashes[order], *(np.concatenate([getattr(table, name) for table in tables])[order]
+                                    for name in ("docs", "tokens", "starts", "ends")))
+
+
+class FingerprintIndex:
+    """Immutable fingerprint index over a corpus, updated by adding segments.
+
+    Each update appends one sorted segment for the new documents and marks
+    replaced or deleted documents as dead; `compacted()` merges the segments
+    and drops dead rows.
+    """
+
+    def __init__(self, doc_ids, segments, dead=frozenset(), k=DEFAULT_K, window_size=DEFAULT_WINDOW):
+        self.doc_ids = list(doc_ids)  # Document number -> doc_id; dead numbers are kept until compaction
+        self.segments = list(segments)
+        self.dead = frozenset(dead)
+        self.k = k
+        self.window_size = window_size
+        self._live_numbers = {doc_id: number for number, doc_id in enumerate(self.doc_ids) if number not in self.dead}
+
+    @property
+    def n_fingerprints(self):
+        return sum(len(segment) for segment in self.segments)
+
+    @classmethod
+    def build(cls, documents, k=DEFAULT_K, window_size=DEFAULT_WINDOW):
+        """Fingerprint every document in a doc_id -> text mapping."""
+        doc_ids = list(documents)
+        table = FingerprintTable.build(((number, documents[doc_id]) for number, doc_id in enumerate(doc_ids)),
+                                       k, window_size)
+        return cls(doc_ids, [table], k=k, window_size=window_size)
+
+    def updated(self, upserts=None, deletions=()):
+        """Return a new index with documents (doc_id -> text) added or replaced and others removed."""
+        upserts = upserts or {}
+        dead = set(self.dead)
+        for doc_id in list(deletions) + list(upserts):
+            if doc_id in self._live_numbers:
+                dead.add(self._live_numbers[doc_id])
+        doc_ids = list(self.doc_ids)
+        texts = []
+        for doc_id, text in upserts.items():
+            texts.append((len(doc_ids), text))
+            doc_ids.append(doc_id)
+        segments = list(self.segments)
+        if texts:
+            segments.append(FingerprintTable.build(texts, self.k, self.window_size))
+        return FingerprintIndex(doc_ids, segments, dead, self.k, self.window_size)
+
+    def compacted(self):
+        """Merge all segments into one and drop rows of dead documents."""
+        live_numbers = sorted(self._live_numbers.values())
+        renumber = np.full(max(len(self.doc_ids), 1), -1, dtype=np.int32)
+        renumber[live_numbers] = np.arange(len(live_numbers), dtype=np.int32)
+        merged = FingerprintTable.concatenate(self.segments)
+        keep = renumber[merged.docs] >= 0 if len(merged) else np.zeros(0, dtype=bool)
+        table = FingerprintTable(merged.hashes[keep], renumber[merged.docs[keep]], merged.tokens[keep],
+                                 merged.starts[keep], merged.ends[keep])
+        return FingerprintIndex([self.doc_ids[number] for number in live_numbers], [table],
+                                k=self.k, window_size=self.window_size)
+
+    def find_passages(self, chunks, min_match_tokens=None, max_gap=None):
+        """Copied passages in a text (or iterable of chunks), longest first.
+
+        Returns dicts with the matched doc_id, character offsets in the input
+        (`input_start`/`input_end`) and in the document (`doc_start`/`doc_end`),
+        and the approximate number of matched words.
+
+        Fingerprints are looked up `LOOKUP_BATCH_SIZE` at a time as they are
+        produced. Spans are merged as the input advances: a document keeps one
+        open span, which is closed (and kept only if long enough) once the input
+        has moved more than `max_gap` tokens past it.
+        """
+        min_match_tokens = self.k + self.window_size - 1 if min_match_tokens is None else min_match_tokens
+        max_gap = self.window_size if max_gap is None else max_gap
+        dead = np.fromiter(self.dead, dtype=np.int32, count=len(self.dead))
+        open_spans = {}  # doc number -> span that later fingerprints may still extend
+        passages = []
+        batch = []
+        for fingerprint_tuple in fingerprint(chunks, self.k, self.window_size):
+            batch.append(fingerprint_tuple)
+            if len(batch) == LOOKUP_BATCH_SIZE:
+                self._extend_spans(batch, dead, open_spans, passages, min_match_tokens, max_gap)
+                batch = []
+        if batch:
+            self._extend_spans(batch, dead, open_spans, passages, min_match_tokens, max_gap)
+        for span in open_spans.values():
+            self._close_span(span, passages, min_match_tokens)
+        passages.sort(key=lambda passage: (-passage["matched_tokens"], passage["input_start"]))
+        return passages
+
+    def _lookup(self, batch, dead):
+        """(doc, input token, doc token, batch row, doc start, doc end) for every live corpus match of `batch`."""
+        query_hashes = np.fromiter((fp[0] for fp in batch), dtype=np.uint64, count=len(batch))
+        pairs = []
+        for segment in self.segments:
+            if not len(segment):
+                continue
+            left = np.searchsorted(segment.hashes, query_hashes, side="left")
+            right = np.searchsorted(segment.hashes, query_hashes, side="right")
+            counts = right - left
+            counts[counts > MAX_HASH_OCCURRENCES] = 0
+            total = int(counts.sum())
+            if not total:
+                continue
+            query_rows = np.repeat(np.arange(len(batch)), counts)
+            rows = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(left, counts)
+            alive = ~np.isin(segment.docs[rows], dead)
+            query_rows, rows = query_rows[alive], rows[alive]
+            pairs.extend(zip(segment.docs[rows].tolist(), [batch[row][1] for row in query_rows.tolist()],
+                             segment.tokens[rows].tolist(), query_rows.tolist(),
+                             segment.starts[rows].tolist(), segment.ends[rows].tolist()))
+        return pairs
+
+    def _extend_spans(self, batch, dead, open_spans, passages, min_match_tokens, max_gap):
+        for doc, input_token, doc_token, batch_row, doc_start, doc_end in sorted(self._lookup(batch, dead),
+                                                                                key=lambda p: p[:3]):
+            _, _, input_start, input_end = batch[batch_row]
+            current = open_spans.get(doc)
+            if (current and 0 <= input_token - current["last_input_token"] <= max_gap
+                    and 0 <= doc_token - current["last_doc_token"] <= max_gap):
+                current["last_input_token"], current["last_doc_token"] = input_token, doc_token
+                current["input_end"] = max(current["input_end"], input_end)
+                current["doc_end"] = max(current["doc_end"], doc_end)
+                continue
+            if current:
+                self._close_span(current, passages, min_match_tokens)
+            open_spans[doc] = {"doc": doc, "first_input_token": input_token, "last_input_token": input_token,
+                               "last_doc_token": doc_token, "input_start": input_start, "input_end": input_end,
+                               "doc_start": doc_start, "doc_end": doc_end}
+        # Later fingerprints start after this batch's last token, too far from these spans to extend them.
+        last_token = batch[-1][1]
+        for doc in [doc for doc, span in open_spans.items() if last_token - span["last_input_token"] >= max_gap]:
+            self._close_span(open_spans.pop(doc), passages, min_match_tokens)
+
+    def _close_span(self, span, passages, min_match_tokens):
+        matched_tokens = span["last_input_token"] - span["first_input_token"] + self.k
+        if matched_tokens >= min_match_tokens:
+            passages.append({"doc_id": self.doc_ids[span["doc"]], "input_start": span["input_start"],
+                             "input_end": span["input_end"], "doc_start": span["doc_start"],
+                             "doc_end": span["doc_end"], "matched_tokens": matched_tokens})
@@ -0,0 +1,81 @@
+"""Gunicorn configuration for production serving.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (`preload_app`): NLTK data, the
+plagiarism corpus index and the AI detection model are loaded before any
+worker exists (the model eagerly, unless AI_DETECTOR_LOADING says otherwise).
+Workers are then forked from the master and share those pages copy-on-write,
+so adding a worker costs its own interpreter state and request buffers, not
+another copy of the model. To keep the shared pages shared:
+
+* the cyclic garbage collector is disabled while the app loads and every
+  object is moved to the permanent generation (`gc.freeze`) before forking,
+  so collections in the workers never write to objects from the master;
+* each worker limits PyTorch to its share of the cores.
+
+Settings (environment variables):
+
+    WEB_CONCURRENCY          worker processes (default: number of cores, at least 2)
+    GUNICORN_THREADS         request threads per worker (default 8)
+    GUNICORN_TIMEOUT         seconds before a silent worker is restarted (default 120)
+    TORCH_THREADS_PER_WORKER PyTorch intra-op threads per worker (default: cores / workers)
+    METRICS_DIR              where workers share their metrics (default: a new temporary directory)
+    CORPUS_JOURNAL_PATH      where workers share corpus updates (default: in a new temporary directory)
+    PORT                     listen port (default 5000)
+"""
+import gc
+import glob
+import os
+import sys
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", max(2, os.cpu_count() or 1)))
+# Threads let one worker coalesce concurrent /api/checkAiText requests into one batch and
+# wait on LanguageTool without blocking other requests.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = True
+torch_threads = int(os.environ.get("TORCH_THREADS_PER_WORKER", max(1, (os.cpu_count() or 1) // workers)))
+
+# Workers save their metrics here and /metrics sums them (see metrics.py).
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="text-checker-metrics-"))
+
+# Workers record corpus updates here and apply each other's (see corpus_index.JournaledCorpus).
+# Every worker starts from the corpus loaded in the master, so the journal starts empty too; each
+# catches up with it as it is forked, before serving, which is quick once it has been checkpointed.
+os.environ.setdefault("CORPUS_JOURNAL_PATH",
+                      os.path.join(tempfile.mkdtemp(prefix="text-checker-corpus-"), "journal.jsonl"))
+
+# Load the model in the master so the workers share it ("lazy" would load one copy per worker).
+os.environ.setdefault("AI_DETECTOR_LOADING", "eager")
+
+# Objects freed while the app loads would leave holes in pages the workers share; collect
+# once the app is loaded instead (see pre_fork).
+gc.disable()
+
+
+def on_starting(server):
+    # Counters start from zero with every server start.
+    for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "metrics-*.json")):
+        os.remove(path)
+    # Like ingested documents without it, journaled updates (and their checkpoints) last until
+    # the server stops.
+    journal = os.environ["CORPUS_JOURNAL_PATH"]
+    for path in [journal] + glob.glob(glob.escape(journal) + ".*"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def pre_fork(server, worker):
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    torch = sys.modules.get("torch")  # Only loaded with the model
+    if torch is not None:
+        torch.set_num_threads(torch_threads)
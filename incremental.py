@@ -0,0 +1,188 @@
+"""Incremental re-checking of edited documents, segment by segment.
+
+A document is split into segments: its paragraphs, with paragraphs longer
+than `max_chars` packed into groups of whole sentences. Joining the segments
+gives back the text. `DocumentStore` keeps, per document id and check, the
+result of every segment of the last version checked. On the next check only
+segments whose text is not among them are checked again. Segments are matched
+by content, so a paragraph that moved or was duplicated is reused too. The
+results are then merged back with offsets relative to the new text.
+
+A segment's result must depend only on its own text (and the check's
+parameters, stored alongside so that a change of language, corpus or model
+discards them). Checks that read across segment boundaries therefore see one
+segment at a time, like LanguageTool chunks do (see languagetool_client.py),
+or a run of adjacent segments whose results crossing a boundary are dropped.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+from languagetool_client import utf16_length
+
+DEFAULT_MAX_SEGMENT_CHARS = 2000
+DEFAULT_MAX_DOCUMENTS = 256
+DEFAULT_MAX_CHARS = 16_000_000
+
+_PARAGRAPH_END_RE = re.compile(r"\n\s*\n|\n")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_segments(text, max_chars=DEFAULT_MAX_SEGMENT_CHARS):
+    """Split text into (start, segment) pieces: paragraphs, and sentence groups of long ones.
+
+    Each segment keeps the line breaks (or spaces) that follow it. A long
+    paragraph is packed greedily from its first sentence, so an edit only moves
+    the boundaries after it within that paragraph. A single sentence longer than
+    `max_chars` stays whole.
+    """
+    segments = []
+    start = 0
+    for end in [match.end() for match in _PARAGRAPH_END_RE.finditer(text)] + [len(text)]:
+        if end <= start:
+            continue
+        if end - start <= max_chars:
+            segments.append((start, text[start:end]))
+        else:
+            piece_start = last = start
+            for boundary in [match.end() for match in _SENTENCE_END_RE.finditer(text, start, end)] + [end]:
+                if boundary - piece_start > max_chars and last > piece_start:
+                    segments.append((piece_start, text[piece_start:last]))
+                    piece_start = last
+                last = boundary
+            segments.append((piece_start, text[piece_start:end]))
+        start = end
+    return segments
+
+
+class DocumentStore:
+    """Per-segment results of the last checked version of documents, least recently used out first.
+
+    At most `max_documents` documents are kept, holding at most `max_chars`
+    characters of segment text between them (results are counted by the text
+    they belong to). A document bigger than `max_chars` on its own is not kept.
+    """
+
+    def __init__(self, max_documents=DEFAULT_MAX_DOCUMENTS, max_chars=DEFAULT_MAX_CHARS):
+        self.max_documents = max_documents
+        self.max_chars = max_chars
+        self._documents = OrderedDict()  # document id -> {check: (params, {segment text: result}, chars)}
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, document_id, check, params):
+        """segment text -> result from the last version, or {} if it was checked with other params."""
+        with self._lock:
+            document = self._documents.get(document_id)
+            if document is None:
+                return {}
+            self._documents.move_to_end(document_id)
+            stored = document.get(check)
+        if stored is None or stored[0] != params:
+            return {}
+        return stored[1]
+
+    def put(self, document_id, check, params, results):
+        """Replace the stored results of `check` for the document with `results` (segment text -> result)."""
+        chars = sum(len(segment) for segment in results)
+        with self._lock:
+            document = self._documents.setdefault(document_id, {})
+            if check in document:
+                self._chars -= document[check][2]
+            document[check] = (params, results, chars)
+            self._chars += chars
+            self._documents.move_to_end(document_id)
+            while self._documents and (len(self._documents) > self.max_documents or self._chars > self.max_chars):
+                _, evicted = self._documents.popitem(last=False)
+                self._chars -= sum(stored[2] for stored in evicted.values())
+
+    @property
+    def chars(self):
+        """Characters of segment text held."""
+        return self._chars
+
+    def __len__(self):
+        return len(self._documents)
+
+
+def group_windows(segments, min_chars):
+    """Join consecutive (start, segment) pieces into (start, window) pieces of at least `min_chars`.
+
+    Windows are packed greedily from the first segment; a short remainder is
+    added to the last window. An edit keeps the windows before it, and those
+    after it as long as the edited window still ends on the same segment.
+    """
+    windows = []
+    for start, segment in segments:
+        if windows and len(windows[-1][1]) < min_chars:
+            windows[-1] = (windows[-1][0], windows[-1][1] + segment)
+        else:
+            windows.append((start, segment))
+    if len(windows) > 1 and len(windows[-1][1]) < min_chars:
+        last = windows.pop()
+        windows[-1] = (windows[-1][0], windows[-1][1] + last[1])
+    return windows
+
+
+def check_segments(segments, previous, check):
+    """Each segment's result, from `previous` (segment text -> result) or `check(segments) -> results`.
+
+    Segments missing from `previous` are checked in one call, given the first
+    (start, segment) of each distinct text, in document order. Returns
+    (results, number of texts checked).
+    """
+    missing = {}
+    for start, segment in segments:
+        if segment not in previous:
+            missing.setdefault(segment, (start, segment))
+    fresh = dict(zip(missing, check(list(missing.values())))) if missing else {}
+    return [previous[segment] if segment in previous else fresh[segment] for _, segment in segments], len(missing)
+
+
+def contiguous_runs(segments):
+    """Group (start, segment) pieces into runs of segments that follow each other in the text."""
+    runs = []
+    for start, segment in segments:
+        if runs and runs[-1][-1][0] + len(runs[-1][-1][1]) == start:
+            runs[-1].append((start, segment))
+        else:
+            runs.append([(start, segment)])
+    return runs
+
+
+def split_matches(matches, texts):
+    """Assign LanguageTool matches of `"".join(texts)` to each text, with offsets relative to it.
+
+    A match that crosses from one text into the next is dropped: it depends on
+    both, so it could not be reused when only one of them is unchanged.
+    """
+    ends, position = [], 0
+    for text in texts:
+        position += utf16_length(text)
+        ends.append(position)
+    parts = [[] for _ in texts]
+    part = 0
+    for match in sorted(matches, key=lambda match: match["offset"]):
+        while part + 1 < len(ends) and match["offset"] >= ends[part]:
+            part += 1
+        if match["offset"] + match["length"] <= ends[part]:
+            start = ends[part] - utf16_length(texts[part])
+            parts[part].append(dict(match, offset=match["offset"] - start))
+    return parts
+
+
+def merge_matches(segments, segment_matches):
+    """LanguageTool matches of every segment, with offsets (UTF-16) relative to the whole text."""
+    merged, offset = [], 0
+    for (_, segment), matches in zip(segments, segment_matches):
+        merged.extend(dict(match, offset=match["offset"] + offset) for match in matches)
+        offset += utf16_length(segment)
+    return merged
+
+
+def merge_passages(segments, segment_passages, limit):
+    """Copied passages of every segment, with input offsets relative to the whole text, longest first."""
+    merged = [dict(passage, input_start=passage["input_start"] + start, input_end=passage["input_end"] + start)
+              for (start, _), passages in zip(segments, segment_passages) for passage in passages]
+    merged.sort(key=lambda passage: (-passage["matched_tokens"], passage["input_start"]))
+    return merged[:limit]
@@ -0,0 +1,171 @@
+"""Pooled, chunking client for the LanguageTool HTTP API.
+
+One `requests.Session` per process keeps connections to every LanguageTool
+backend alive between requests (up to `pool_size` per backend, enough for
+every thread that may call the client at once plus the chunk fan-out), with
+connect/read timeouts and retries of transient failures (connection errors
+and 502/503/504, not read timeouts).
+Long texts are split on paragraph boundaries into chunks of at most
+`max_chunk_chars`, the chunks are checked concurrently (spread round-robin
+over the backends, failing over to the next backend on error), and the
+`matches` are merged back with offsets relative to the whole text.
+
+LanguageTool reports offsets in UTF-16 code units (Java strings, the same as
+JavaScript in the frontend), so chunk positions are converted the same way.
+Rules that look across paragraphs (e.g. repeated paragraph openings) only see
+one chunk at a time.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_TIMEOUT = (3.05, 30)  # (connect, read) seconds
+DEFAULT_RETRIES = 2
+DEFAULT_MAX_CHUNK_CHARS = 4000
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_POOL_SIZE = 32  # Keep-alive connections per backend: 8 caller threads x 4 chunk workers
+
+_PARAGRAPH_BREAK_RE = re.compile(r"\n\s*\n|\n")
+
+
+def split_paragraph_chunks(text, max_chars=DEFAULT_MAX_CHUNK_CHARS):
+    """Split text into (start, chunk) pieces of at most `max_chars`, on paragraph boundaries where possible.
+
+    Consecutive paragraphs are packed into one chunk while they fit; a single
+    paragraph longer than `max_chars` is cut at the last whitespace before the
+    limit (or hard at the limit). Joining the chunks gives back the text.
+    """
+    if len(text) <= max_chars:
+        return [(0, text)]
+    boundaries = [match.end() for match in _PARAGRAPH_BREAK_RE.finditer(text)] + [len(text)]
+    chunks = []
+    start = end = 0
+    for boundary in boundaries:
+        if boundary - start <= max_chars:
+            end = boundary
+            continue
+        if end > start:
+            chunks.append((start, text[start:end]))
+            start = end
+        while boundary - start > max_chars:
+            cut = text.rfind(" ", start + 1, start + max_chars) + 1 or start + max_chars
+            chunks.append((start, text[start:cut]))
+            start = cut
+        end = boundary
+    if end > start:
+        chunks.append((start, text[start:end]))
+    return chunks
+
+
+def utf16_length(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+class LanguageToolClient:
+    """Check texts against one or more LanguageTool `/v2/check` URLs.
+
+    `check()` raises `requests.exceptions.RequestException` (including
+    `HTTPError` for error statuses and `Timeout`) if a chunk fails on every
+    backend. `observe(url, status, seconds)`, if given, is called after every
+    request to a backend (status "error" if no response arrived; retries of
+    transient failures are included in the request's time).
+    """
+
+    def __init__(self, urls, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff_factor=0.3,
+                 max_chunk_chars=DEFAULT_MAX_CHUNK_CHARS, max_workers=DEFAULT_MAX_WORKERS,
+                 pool_size=DEFAULT_POOL_SIZE, observe=None):
+        self.urls = [urls] if isinstance(urls, str) else list(urls)
+        if not self.urls:
+            raise ValueError("At least one LanguageTool URL is required")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_chunk_chars = max_chunk_chars
+        self.max_workers = max_workers
+        self.pool_size = pool_size
+        self.observe = observe
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _resources(self):
+        # Pooled sockets and threads must not be shared across fork(); each process builds its own.
+        with self._lock:
+            if self._pid != os.getpid():
+                # Read timeouts are not retried: a chunk that timed out would likely time out again,
+                # and read=False makes them surface as requests' Timeout rather than ConnectionError.
+                retry = Retry(total=self.retries, connect=self.retries, read=False,
+                              status=self.retries, backoff_factor=self.backoff_factor,
+                              status_forcelist=(502, 503, 504), allowed_methods=frozenset({"POST"}),
+                              raise_on_status=False)
+                # Single-chunk checks run on the caller's thread, so the pool is sized for every
+                # concurrent caller rather than the fan-out. It does not block: past `pool_size`,
+                # an extra connection is opened and closed after use instead of stalling a request.
+                adapter = HTTPAdapter(pool_connections=len(self.urls), pool_maxsize=self.pool_size,
+                                      pool_block=False, max_retries=retry)
+                self._session = requests.Session()
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="languagetool")
+                self._pid = os.getpid()
+            return self._session, self._executor
+
+    def _post(self, session, url, data):
+        start, status = time.perf_counter(), "error"
+        try:
+            response = session.post(url, data=data, timeout=self.timeout)
+            status = str(response.status_code)
+            response.raise_for_status()
+            return response.json()
+        finally:
+            if self.observe is not None:
+                self.observe(url, status, time.perf_counter() - start)
+
+    def _check_chunk(self, session, index, data):
+        # Round-robin the first backend per chunk; fail over to the others in turn.
+        error = None
+        for attempt in range(len(self.urls)):
+            url = self.urls[(index + attempt) % len(self.urls)]
+            try:
+                return self._post(session, url, data)
+            except requests.exceptions.RequestException as e:
+                error = e
+        raise error
+
+    def check(self, text, language, **params):
+        """LanguageTool's JSON response for `text`, with matches from all chunks merged in order."""
+        return self.check_all([text], language, **params)[0]
+
+    def check_all(self, texts, language, **params):
+        """LanguageTool's JSON response for each of `texts`, their chunks all checked concurrently."""
+        session, executor = self._resources()
+        chunked = [split_paragraph_chunks(text, self.max_chunk_chars) for text in texts]
+        requests_data = [dict(params, language=language, text=chunk) for chunks in chunked for _, chunk in chunks]
+        if len(requests_data) == 1:
+            responses = iter([self._check_chunk(session, 0, requests_data[0])])
+        else:
+            futures = [executor.submit(self._check_chunk, session, index, data)
+                       for index, data in enumerate(requests_data)]
+            responses = iter([future.result() for future in futures])
+        return [self._merge(text, chunks, [next(responses) for _ in chunks]) for text, chunks in zip(texts, chunked)]
+
+    @staticmethod
+    def _merge(text, chunks, responses):
+        if len(responses) == 1:
+            return responses[0]
+        merged = {key: value for key, value in responses[0].items() if key != "matches"}
+        merged["matches"] = []
+        offset = 0
+        previous_start = 0
+        for (start, _), response in zip(chunks, responses):
+            offset += utf16_length(text[previous_start:start])
+            previous_start = start
+            for match in response.get("matches", []):
+                merged["matches"].append(dict(match, offset=match["offset"] + offset))
+        return merged
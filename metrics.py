@@ -0,0 +1,280 @@
+"""Prometheus metrics and sampled request profiling.
+
+A small, dependency-free registry of counters and histograms rendered in the
+Prometheus text exposition format (served by the app on `/metrics`). Updates
+take one lock per metric and touch a dict and a list, so instrumenting a hot
+path costs a few microseconds.
+
+Under a pre-fork server every worker process has its own registry. With a
+`directory` set, each process saves a snapshot of its registry there (from
+`save()`, at most once per `write_interval` seconds), and `render()` sums the
+snapshots of all processes, its own live values included, so a scrape that
+lands on any worker reports the whole server. Snapshots of exited workers are
+kept, so counters never go backwards. Files are named by process id and the
+time the process first used the registry, so a restarted worker that gets a
+recycled process id starts a file of its own instead of overwriting one.
+
+`RequestProfiler` runs a random sample of requests under cProfile and dumps
+each profile to a `.prof` file (`python -m pstats`, snakeviz, flameprof, ...).
+"""
+import cProfile
+import glob
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TEXT_LENGTH_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() and abs(value) < 1e15 else repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values tuple -> value
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return {"type": self.kind, "help": self.documentation, "labelnames": list(self.labelnames),
+                    "samples": [[list(key), self._copy(value)] for key, value in self._values.items()]}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    """Observations counted in cumulative `le` buckets, with their sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum of the observations.
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self):
+        return dict(super().snapshot(), buckets=list(self.buckets))
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+
+class Registry:
+    """The metrics of one process, optionally merged with other processes' snapshots in `directory`."""
+
+    def __init__(self, directory=None, write_interval=1.0):
+        self.directory = directory
+        self.write_interval = write_interval
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        self._save_scheduled = False
+        self._process = None  # (pid, first use in that process in ns); set again after fork
+
+    def _register(self, metric):
+        if not re.fullmatch(r"[a-zA-Z_:][a-zA-Z0-9_:]*", metric.name):
+            raise ValueError(f"Invalid metric name {metric.name!r}")
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+    # --- Multi-process snapshots ---
+    def _path(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._process is None or self._process[0] != pid:
+                self._process = (pid, time.time_ns())
+            return os.path.join(self.directory, f"metrics-{pid}-{self._process[1]}.json")
+
+    def save(self, force=False):
+        """Write this process's snapshot to `directory`, at most once per `write_interval` unless forced.
+
+        A throttled call schedules a save for the end of the interval, so the
+        last updates before a quiet period are not left unsaved.
+        """
+        if self.directory is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            wait = self.write_interval - (now - self._saved_at)
+            if not force and wait > 0:
+                if not self._save_scheduled:
+                    self._save_scheduled = True
+                    timer = threading.Timer(wait, self.save, kwargs={"force": True})
+                    timer.daemon = True
+                    timer.start()
+                return
+            self._saved_at = now
+            self._save_scheduled = False
+        path = self._path()
+        try:
+            # Written to a temporary file and renamed, so readers never see half a snapshot.
+            with open(path + ".tmp", "w") as snapshot_file:
+                json.dump(self.snapshot(), snapshot_file)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.warning(f"Could not save metrics snapshot to {path}: {e}")
+
+    def _snapshots(self):
+        snapshots = [self.snapshot()]
+        if self.directory is not None:
+            for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+                if path == self._path():
+                    continue  # This process's live values are newer than its file
+                try:
+                    with open(path) as snapshot_file:
+                        snapshots.append(json.load(snapshot_file))
+                except (OSError, ValueError):
+                    continue  # Replaced or removed while listing
+        return snapshots
+
+    # --- Exposition ---
+    def render(self):
+        """All metrics, summed over processes, in the Prometheus text format."""
+        merged = {}
+        for snapshot in self._snapshots():
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, dict(metric, samples={}))
+                for key, value in metric["samples"]:
+                    key = tuple(key)
+                    if key not in target["samples"]:
+                        target["samples"][key] = value
+                    elif metric["type"] == "histogram":
+                        target["samples"][key] = [a + b for a, b in zip(target["samples"][key], value)]
+                    else:
+                        target["samples"][key] += value
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            labelnames = metric["labelnames"]
+            for key, value in sorted(metric["samples"].items()):
+                if metric["type"] == "counter":
+                    lines.append(f"{name}{_labels(labelnames, key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(metric["buckets"]) + [float("inf")], value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labelnames, key, [('le', _format_value(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labelnames, key)} {_format_value(value[-1])}")
+                lines.append(f"{name}_count{_labels(labelnames, key)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestProfiler:
+    """Profile a random `sample_rate` fraction of requests with cProfile, one at a time.
+
+    cProfile only sees the thread that enabled it, so work handed to other
+    threads (the model's micro-batcher, the /api/analyze pool) shows up as
+    time spent waiting on it.
+    """
+
+    def __init__(self, sample_rate=0.0, directory="profiles"):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self._busy = threading.Lock()  # Only one profiler may be active at a time
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0
+
+    def start(self):
+        """A running profiler if this request is sampled, else None."""
+        if not self.enabled or random.random() >= self.sample_rate or not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # Another profiler (a debugger, say) is active
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler, name):
+        """Stop a profiler from `start` and dump its stats; returns the file path."""
+        profiler.disable()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', name)}-"
+                                                f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{id(profiler):x}.prof")
+            profiler.dump_stats(path)
+            return path
+        finally:
+            self._busy.release()
@@ -0,0 +1,170 @@
+"""Readability scores, computed exactly as the frontend's readability.js (TextStatistics.js).
+
+readability.js cleans the text in the constructor, and every metric then
+cleans its input again each time it calls a helper. Most of its cleaning
+rules replace only the first match (no ``/g``), so each pass changes a little
+more: the second pass replaces the second comma or hyphen, the third the
+third, and so on. The counts a metric sees therefore depend on how deeply its
+helpers are nested:
+
+* Flesch reading ease and Flesch-Kincaid grade take words and sentences from
+  the third pass and syllables from the second.
+* Gunning fog takes everything from the third pass.
+* SMOG, Coleman-Liau and ARI take everything from the second pass.
+
+To give the same numbers, ``text_statistics`` runs the cleaning rules three
+times per text (readability.js runs them about 25 times), tokenizes the second
+and third passes once each, and derives every count from those two token
+lists. Syllables are counted once per distinct word (``syllable_count`` is
+memoized). ``score_batch`` then computes all six formulas for many documents
+at once with NumPy, in the same floating-point operation order as the
+JavaScript, and rounds like ``Math.round`` (halves up).
+
+The regular expressions spell out JavaScript's ``\\s`` and ASCII-only
+``[a-z]`` with the ``i`` flag, which differ from Python's. One deliberate
+difference: readability.js looks syllable exceptions up in a plain object,
+so the word "constructor" finds ``Object.prototype.constructor`` and turns
+the Flesch scores into NaN. Here it is an ordinary word.
+"""
+import functools
+import re
+
+import numpy as np
+
+SCORES = ("flesch_reading_ease", "flesch_kincaid_grade", "gunning_fog", "smog_index", "coleman_liau_index",
+          "automated_readability_index")
+
+# JavaScript's \s, for use inside a character class (Python's \s differs slightly).
+_JS_SPACE = r"\t\n\v\f\r \u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000\ufeff"
+
+# --- Cleaning (cleanText) ---
+_FULL_STOP_TAGS = ("li", "p", "h1", "h2", "h3", "h4", "h5", "h6", "dd")
+_TAG_RE = re.compile(r"<[^>]+>")
+# (pattern, replacement) applied to the first match only, in order.
+_FIRST_MATCH_RULES = tuple((re.compile(pattern), replacement) for pattern, replacement in (
+    (r"[,:;()\-]", " "),                    # Commas, hyphens etc. count as spaces
+    (r"[.!?]", "."),                        # Unify terminators
+    (rf"^[{_JS_SPACE}]+", ""),              # Strip leading whitespace
+    (r"[ ]*(\n|\r\n|\r)[ ]*", " "),         # Replace new lines with spaces
+    (r"([.])[. ]+", "."),                   # Duplicated terminators
+    (r"[ ]*([.])", ". "),                   # Pad sentence terminators
+    (rf"[{_JS_SPACE}]+", " "),              # Multiple spaces
+    (rf"[{_JS_SPACE}]+\Z", ""),             # Strip trailing whitespace
+))
+
+
+def clean_text(text):
+    """One pass of readability.js's cleanText."""
+    for tag in _FULL_STOP_TAGS:
+        text = text.replace(f"</{tag}>", ".", 1)
+    text = _TAG_RE.sub("", text)
+    for pattern, replacement in _FIRST_MATCH_RULES:
+        text = pattern.sub(replacement, text, count=1)
+    return text + "."
+
+
+# --- Syllables (syllableCount) ---
+_PROBLEM_WORDS = {"simile": 3, "forever": 3, "shoreline": 2}
+# Counted as two syllables but should be one.
+_SUB_SYLLABLES = tuple(re.compile(pattern) for pattern in (
+    r"cial", r"tia", r"cius", r"cious", r"giu", r"ion", r"iou", r"sia$", r"[^aeiuoyt]{2,}ed$", r".ely$",
+    r"[cg]h?e[rsd]?$", r"rved?$", r"[aeiouy][dt]es?$", r"[aeiouy][^aeiouydt]e[rsd]?$", r"^[dr]e[aeiou][^aeiou]+$",
+    r"[aeiouy]rse$"))
+# Counted as one syllable but should be two.
+_ADD_SYLLABLES = tuple(re.compile(pattern) for pattern in (
+    r"ia", r"riet", r"dien", r"iu", r"io", r"ii", r"[aeiouym]bl$", r"[aeiou]{3}", r"^mc", r"ism$",
+    r"([^aeiouy])\1l$", r"[^l]lien", r"^coa[dglx].", r"[^gq]ua[^auieo]", r"dnt$", r"uity$", r"ie(r|st)$"))
+# Single-syllable prefixes and suffixes, removed in order.
+_PREFIX_SUFFIX = tuple(re.compile(pattern) for pattern in (r"^un", r"^fore", r"ly$", r"less$", r"ful$", r"ers?$",
+                                                           r"ings?$"))
+_NON_LETTERS_RE = re.compile(r"[^a-z]")
+_VOWEL_GROUPS_RE = re.compile(r"[aeiouy]+")
+
+
+@functools.lru_cache(maxsize=65536)
+def syllable_count(word):
+    """Syllables in a whitespace-delimited token, by readability.js's rules (at least 1, or negative)."""
+    word = _NON_LETTERS_RE.sub("", word.lower())
+    if word in _PROBLEM_WORDS:
+        return _PROBLEM_WORDS[word]
+    prefix_suffix_count = 0
+    for pattern in _PREFIX_SUFFIX:
+        if pattern.search(word):
+            word = pattern.sub("", word, count=1)
+            prefix_suffix_count += 1
+    count = len(_VOWEL_GROUPS_RE.findall(word)) + prefix_suffix_count
+    count -= sum(1 for pattern in _SUB_SYLLABLES if pattern.search(word))
+    count += sum(1 for pattern in _ADD_SYLLABLES if pattern.search(word))
+    return count or 1
+
+
+# --- Counting ---
+_WORD_SEPARATOR_RE = re.compile(r"[^a-zA-Z0-9]+")
+_WHITESPACE_RE = re.compile(rf"[{_JS_SPACE}]+")
+_LETTER_RE = re.compile(r"[a-zA-Z]")
+_TERMINATOR_RE = re.compile(r"[.!?]")
+_CAPITALIZED_RE = re.compile(r"[A-Z]")
+
+# The counts text_statistics returns, in order (see the module docstring for the passes).
+STATISTICS = ("letters", "words", "sentences", "syllables", "long_words", "words_3", "sentences_3",
+              "long_common_words_3")
+
+
+def text_statistics(text):
+    """The counts behind the scores of one non-empty text, as a tuple ordered like STATISTICS.
+
+    Counts come from the second cleaning pass, except the `_3` ones from the third. Long words
+    have three syllables or more; "common" ones do not start with a capital letter.
+    """
+    second = clean_text(clean_text(text))
+    third = clean_text(second)
+    second_tokens = _WHITESPACE_RE.split(second)
+    third_tokens = _WHITESPACE_RE.split(third)
+    second_syllables = [syllable_count(token) for token in second_tokens]
+    return (
+        len(_LETTER_RE.findall(second)),
+        len(_WORD_SEPARATOR_RE.split(second)),
+        len(_TERMINATOR_RE.findall(second)) or 1,
+        sum(second_syllables),
+        sum(1 for syllables in second_syllables if syllables > 2),
+        len(_WORD_SEPARATOR_RE.split(third)),
+        len(_TERMINATOR_RE.findall(third)) or 1,
+        sum(1 for token in third_tokens if not _CAPITALIZED_RE.match(token) and syllable_count(token) > 2),
+    )
+
+
+# --- Scores ---
+def _js_round_1(values):
+    """Math.round(value * 10) / 10, element-wise: halves round up, not to even."""
+    scaled = values * 10
+    floor = np.floor(scaled)
+    return np.where(scaled - floor >= 0.5, floor + 1, floor) / 10
+
+
+def score_statistics(statistics):
+    """The six scores for an (n, len(STATISTICS)) array of counts, as a dict of length-n arrays."""
+    letters, words, sentences, syllables, long_words, words_3, sentences_3, long_common_3 = (
+        np.asarray(statistics, dtype=np.float64).reshape(-1, len(STATISTICS)).T)
+    words_per_sentence = words_3 / sentences_3
+    syllables_per_word = np.where(syllables != 0, syllables, 1) / words_3
+    return {
+        "flesch_reading_ease": _js_round_1(206.835 - (1.015 * words_per_sentence) - (84.6 * syllables_per_word)),
+        "flesch_kincaid_grade": _js_round_1((0.39 * words_per_sentence) + (11.8 * syllables_per_word) - 15.59),
+        "gunning_fog": _js_round_1((words_per_sentence + (long_common_3 / words_3) * 100) * 0.4),
+        "smog_index": _js_round_1(1.043 * np.sqrt((long_words * (30 / sentences)) + 3.1291)),
+        "coleman_liau_index": _js_round_1((5.89 * (letters / words)) - (0.3 * (sentences / words)) - 15.8),
+        "automated_readability_index": _js_round_1((4.71 * (letters / words)) + (0.5 * (words / sentences)) - 21.43),
+    }
+
+
+def score_batch(texts):
+    """Readability scores for each non-empty text, as one dict per text (keys in SCORES)."""
+    if not texts:
+        return []
+    columns = score_statistics([text_statistics(text) for text in texts])
+    return [{name: float(columns[name][i]) for name in SCORES} for i in range(len(texts))]
+
+
+def score(text):
+    return score_batch([text])[0]
+
@@ -0,0 +1,194 @@
+"""Shared cache of check results, keyed on the input text and everything the result depends on.
+
+Keys are SHA-256 hashes of the endpoint namespace, the text and a dict of
+parameters (language, model name, corpus digest, ...), so a new corpus
+snapshot or a different model simply produces different keys. The text is
+hashed verbatim: responses carry character offsets into it, so two texts
+that only differ in whitespace or line endings cannot share a result.
+
+Values are stored as encoded JSON. The memory tier is an LRU with a per-entry
+TTL, bounded both by entry count and by total encoded size. The optional disk
+tier (SQLite) is written through and consulted on a memory miss, so results
+survive restarts; it shares the TTL and has its own entry bound. `invalidate(namespace)`
+drops one endpoint's entries from both tiers. The tiers have separate locks, so
+memory hits never wait behind SQLite reads or commits of other threads.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_DISK_ENTRIES = 100_000
+
+
+def cache_key(namespace, text, params=None):
+    payload = json.dumps([namespace, params or {}, text], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe two-tier (memory LRU + optional SQLite) cache of JSON-serialisable results.
+
+    `max_entries=0` disables caching: every `get` misses and `put` stores nothing.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 disk_path=None, max_disk_entries=DEFAULT_MAX_DISK_ENTRIES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.max_disk_entries = max_disk_entries
+        self._lock = threading.Lock()  # Memory tier and counters
+        self._disk_lock = threading.Lock()  # SQLite connection
+        self._entries = OrderedDict()  # key -> (namespace, expires_at, encoded value)
+        self._bytes = 0
+        self._counters = Counter()
+        self._namespace_counters = {}
+        self._disk = None
+        self._disk_pid = None
+        self._disk_writes = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    # --- Public API ---
+    def get(self, key, namespace="default"):
+        """The cached value for `key` (a fresh copy), or None on a miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._remove(key)
+                self._count(namespace, "expirations")
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._count(namespace, "hits", "memory_hits")
+                return json.loads(entry[2])
+        row = self._disk_get(key, now)
+        with self._lock:
+            if row is None:
+                self._count(namespace, "misses")
+                return None
+            expires_at, encoded = row
+            if key not in self._entries:  # Unless a put stored a newer value meanwhile
+                self._store(key, namespace, expires_at, encoded)
+            self._count(namespace, "hits", "disk_hits")
+        return json.loads(encoded)
+
+    def put(self, key, value, namespace="default"):
+        if not self.enabled:
+            return
+        encoded = json.dumps(value, separators=(",", ":")).encode("utf-8")
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, namespace, expires_at, encoded)
+        self._disk_put(key, namespace, expires_at, encoded)
+
+    def invalidate(self, namespace):
+        """Drop every entry of one namespace from memory and disk."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0] == namespace]:
+                self._remove(key)
+            self._count(namespace, "invalidations")
+        self._disk_execute("DELETE FROM results WHERE namespace = ?", (namespace,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self._disk_execute("DELETE FROM results")
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self._counters["hits"], self._counters["misses"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "disk": self.disk_path is not None,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                **{name: self._counters[name] for name in ("hits", "misses", "memory_hits", "disk_hits",
+                                                           "evictions", "expirations", "invalidations")},
+                "namespaces": {namespace: dict(counters) for namespace, counters in self._namespace_counters.items()},
+            }
+
+    # --- Memory tier (callers hold the lock) ---
+    def _store(self, key, namespace, expires_at, encoded):
+        if len(encoded) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (namespace, expires_at, encoded)
+        self._bytes += len(encoded)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            evicted_key, (evicted_namespace, _, _) = next(iter(self._entries.items()))
+            self._remove(evicted_key)
+            self._count(evicted_namespace, "evictions")
+
+    def _remove(self, key):
+        _, _, encoded = self._entries.pop(key)
+        self._bytes -= len(encoded)
+
+    def _count(self, namespace, *names):
+        counters = self._namespace_counters.setdefault(namespace, Counter())
+        for name in names:
+            self._counters[name] += 1
+            counters[name] += 1
+
+    # --- Disk tier (takes the disk lock, never the memory lock) ---
+    def _connection(self):
+        """The process's SQLite connection; callers hold the disk lock."""
+        # SQLite connections must not be used across fork(); each process opens its own.
+        if self._disk_pid != os.getpid():
+            self._disk = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=5)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode this syncs at checkpoints only; a crash may lose the latest results, never corrupt the file.
+            self._disk.execute("PRAGMA synchronous=NORMAL")
+            self._disk.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, namespace TEXT, "
+                               "expires_at REAL, value BLOB)")
+            self._disk.execute("CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)")
+            self._disk_pid = os.getpid()
+        return self._disk
+
+    def _disk_get(self, key, now):
+        if self.disk_path is None:
+            return None
+        with self._disk_lock:
+            return self._connection().execute("SELECT expires_at, value FROM results WHERE key = ? AND expires_at > ?",
+                                              (key, now)).fetchone()
+
+    def _disk_put(self, key, namespace, expires_at, encoded):
+        if self.disk_path is None:
+            return
+        with self._disk_lock:
+            disk = self._connection()
+            disk.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)", (key, namespace, expires_at, encoded))
+            self._disk_writes += 1
+            if self._disk_writes % 100 == 0:
+                # Prune expired rows, then the soonest-expiring (oldest) rows beyond the bound.
+                disk.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),))
+                disk.execute("DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY expires_at DESC "
+                             "LIMIT -1 OFFSET ?)", (self.max_disk_entries,))
+            disk.commit()
+
+    def _disk_execute(self, statement, parameters=()):
+        if self.disk_path is None:
+            return
+        with self._disk_lock:
+            disk = self._connection()
+            disk.execute(statement, parameters)
+            disk.commit()
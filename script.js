@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const checkTextButton = document.getElementById('check-text-button');
     const checkPlagiarismButton = document.getElementById('check-plagiarism-button');
     const checkAiTextButton = document.getElementById('check-ai-text-button'); 
+    const checkAllButton = document.getElementById('check-all-button');
     
     const resultsContent = document.getElementById('results-content');
     const readabilityResultsDiv = document.getElementById('readability-results');
@@ -11,6 +12,9 @@ document.addEventListener('DOMContentLoaded', () => {
     
     const languageSelect = document.getElementById('language-select');
 
+    // Identifies this editor's text to the server, which then re-checks only edited paragraphs (AI: windows of them).
+    const documentId = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `doc-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
     // Combined Grammar, Readability, and Style Check
     checkTextButton.addEventListener('click', async () => {
         const textToCheck = textInput.value;
@@ -77,7 +81,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 plagiarismResultsDiv.innerHTML = `<p class="error-message">Failed to check plagiarism. Server responded with: ${errorMsg}</p>`;
             } else {
                 const data = await response.json();
-                displayPlagiarismResults(data);
+                displayPlagiarismResults(data, textToCheck);
             }
         } catch (error) {
             console.error('Plagiarism check error:', error);
@@ -116,6 +120,65 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // All Checks in one request (the server runs grammar, plagiarism and AI detection concurrently)
+    checkAllButton.addEventListener('click', async () => {
+        const textToCheck = textInput.value;
+        const selectedLanguage = languageSelect.value;
+
+        resultsContent.innerHTML = '';
+        readabilityResultsDiv.innerHTML = '';
+        plagiarismResultsDiv.innerHTML = '';
+        aiTextResultsDiv.innerHTML = '';
+
+        if (textToCheck.trim() === '') {
+            resultsContent.innerHTML = '<p class="error-message">Please enter some text to check.</p>';
+            return;
+        }
+
+        resultsContent.innerHTML = '<p class="loading-message spinner">Checking grammar & spelling...</p>';
+        readabilityResultsDiv.innerHTML = '<p class="loading-message spinner">Analyzing readability & style...</p>';
+        plagiarismResultsDiv.innerHTML = '<p class="loading-message spinner">Checking for plagiarism...</p>';
+        aiTextResultsDiv.innerHTML = '<p class="loading-message spinner">Detecting AI-generated text...</p>';
+
+        try {
+            const response = await fetch('http://localhost:5000/api/analyze', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ language: selectedLanguage, text: textToCheck, document_id: documentId }),
+            });
+            let data = null;
+            try { data = await response.json(); } catch (e) { /* Ignore */ }
+
+            if (!data || !data.results) {
+                const errorMsg = (data && data.error) || `Error: ${response.status} ${response.statusText}`;
+                [resultsContent, plagiarismResultsDiv, aiTextResultsDiv].forEach(resultDiv => {
+                    resultDiv.innerHTML = `<p class="error-message">Failed to run checks. Server responded with: ${errorMsg}</p>`;
+                });
+            } else {
+                // A failed check is reported in its own box; the others still show their results.
+                displayAnalysisCheck(data, 'grammar', resultsContent, 'Failed to check grammar', displayGrammarResults);
+                displayAnalysisCheck(data, 'plagiarism', plagiarismResultsDiv, 'Failed to check plagiarism', result => displayPlagiarismResults(result, textToCheck));
+                displayAnalysisCheck(data, 'ai', aiTextResultsDiv, 'Failed to detect AI text', displayAiTextResults);
+                console.info('Analysis timings (ms):', data.timings_ms);
+            }
+        } catch (error) {
+            console.error('Analysis error:', error);
+            [resultsContent, plagiarismResultsDiv, aiTextResultsDiv].forEach(resultDiv => {
+                resultDiv.innerHTML = '<p class="error-message">Network error or unable to connect for analysis.</p>';
+            });
+        }
+
+        analyzeReadabilityAndStyle(textToCheck);
+    });
+
+    function displayAnalysisCheck(data, check, resultDiv, failureMessage, display) {
+        if (data.results[check]) {
+            display(data.results[check]);
+            return;
+        }
+        const errorMsg = data.errors && data.errors[check] ? data.errors[check].error : 'No result returned';
+        resultDiv.innerHTML = `<p class="error-message">${failureMessage}. Server responded with: ${errorMsg}</p>`;
+    }
 
     function displayGrammarResults(data) {
         resultsContent.innerHTML = ''; 
@@ -280,7 +343,7 @@ document.addEventListener('DOMContentLoaded', () => {
         readabilityResultsDiv.appendChild(styleSection);
     }
 
-    function displayPlagiarismResults(data) {
+    function displayPlagiarismResults(data, checkedText) {
         plagiarismResultsDiv.innerHTML = ''; 
         // Ensure this section has an H3 title if content is added
         plagiarismResultsDiv.innerHTML = '<h3>Plagiarism Check:</h3>';
@@ -306,7 +369,22 @@ document.addEventListener('DOMContentLoaded', () => {
             previewContent.textContent = data.corpus_document_preview;
             resultContainer.appendChild(previewContent);
         }
-        if (data.status === "potential_plagiarism") {
+        if (data.passages && data.passages.length > 0) {
+            const passagesTitle = document.createElement('p');
+            passagesTitle.innerHTML = `<strong>Copied Passages (${data.passages.length}):</strong>`;
+            resultContainer.appendChild(passagesTitle);
+            const passagesList = document.createElement('ul');
+            passagesList.className = 'plagiarism-passage-list';
+            data.passages.forEach(passage => {
+                const item = document.createElement('li');
+                item.className = 'plagiarism-passage-item';
+                const excerpt = checkedText ? checkedText.substring(passage.input_start, passage.input_end) : '';
+                item.textContent = `"${excerpt.substring(0, 150)}${excerpt.length > 150 ? '...' : ''}" (${passage.matched_tokens} words, matches '${passage.doc_id}')`;
+                passagesList.appendChild(item);
+            });
+            resultContainer.appendChild(passagesList);
+        }
+        if (data.status === "potential_plagiarism" || data.status === "partial_plagiarism") {
             resultContainer.classList.add("plagiarism-warning");
         } else if (data.status === "no_significant_similarity" || data.status === "input_empty" || data.status === "input_empty_after_processing") {
              resultContainer.classList.add("plagiarism-ok");
@@ -362,6 +440,26 @@ document.addEventListener('DOMContentLoaded', () => {
             modelDetails.innerHTML = `(Model classified as: '${data.prediction_label}' with confidence: ${(data.model_score * 100).toFixed(1)}%)`;
             resultContainer.appendChild(modelDetails);
         }
+
+        if (data.windows && data.windows.length > 1) {
+            const windowsTitle = document.createElement('p');
+            windowsTitle.innerHTML = `<strong>Scored in ${data.windows.length} sections:</strong>`;
+            resultContainer.appendChild(windowsTitle);
+            const windowsList = document.createElement('ul');
+            windowsList.className = 'ai-window-list';
+            data.windows.forEach(section => {
+                const item = document.createElement('li');
+                item.textContent = `Characters ${section.start}-${section.end}: ${(section.ai_score * 100).toFixed(1)}%`;
+                windowsList.appendChild(item);
+            });
+            resultContainer.appendChild(windowsList);
+        }
+        if (data.truncated) {
+            const truncatedNote = document.createElement('p');
+            truncatedNote.className = 'model-raw-details';
+            truncatedNote.textContent = `Only the first ${data.scored_chars} characters were scored.`;
+            resultContainer.appendChild(truncatedNote);
+        }
         
         const disclaimer = document.createElement('p');
         disclaimer.className = 'ai-disclaimer';
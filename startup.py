@@ -0,0 +1,93 @@
+"""Load state of the app's startup components, for health and readiness checks.
+
+Startup is split into components (NLTK data, the plagiarism corpus index, the
+AI detection model, ...) that load at different times: some while the app
+module is imported, the model in a background thread or on first use. Each
+component moves through pending -> loading -> ready / failed, and its load
+time is recorded so cold-start cost is visible in `/readyz` and in the logs.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+
+def process_uptime():
+    """Seconds since this process started (since this module was imported where /proc is unavailable)."""
+    try:
+        with open("/proc/self/stat") as stat:
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            return float(uptime.read().split()[0]) - start_ticks / _CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORTED_AT
+
+
+_IMPORTED_AT = time.monotonic()
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class ComponentStatus:
+    """Thread-safe registry of component states.
+
+    The app is ready once every component registered with `required=True`
+    is ready; optional components are reported but do not gate readiness.
+    """
+
+    def __init__(self, log=None):
+        self.log = log or logger
+        self._lock = threading.Lock()
+        self._components = {}
+
+    def register(self, name, required=True):
+        with self._lock:
+            self._components.setdefault(name, {"state": PENDING, "required": required, "load_seconds": None,
+                                               "ready_after_seconds": None, "error": None})
+
+    def state(self, name):
+        with self._lock:
+            return self._components[name]["state"]
+
+    def _update(self, name, **fields):
+        with self._lock:
+            self._components[name].update(fields)
+
+    @contextmanager
+    def loading(self, name):
+        """Mark a component loading for the duration of the block; ready afterwards, failed if it raises."""
+        self.register(name)
+        self._update(name, state=LOADING, error=None)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.mark_failed(name, e, time.monotonic() - start)
+            raise
+        self.mark_ready(name, time.monotonic() - start)
+
+    def mark_ready(self, name, load_seconds=None):
+        ready_after = process_uptime()
+        self._update(name, state=READY, error=None, load_seconds=_round(load_seconds),
+                     ready_after_seconds=_round(ready_after))
+        self.log.info(f"Startup: {name} ready in {load_seconds or 0:.2f}s ({ready_after:.2f}s after process start).")
+
+    def mark_failed(self, name, error, load_seconds=None):
+        self._update(name, state=FAILED, error=str(error), load_seconds=_round(load_seconds))
+        self.log.error(f"Startup: {name} failed after {load_seconds or 0:.2f}s: {error}")
+
+    def is_ready(self):
+        with self._lock:
+            return all(c["state"] == READY for c in self._components.values() if c["required"])
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(component) for name, component in self._components.items()}
+
+
+def _round(seconds):
+    return None if seconds is None else round(seconds, 3)
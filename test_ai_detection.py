@@ -0,0 +1,123 @@
+import pytest
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+from transformers import PreTrainedTokenizerFast, RobertaConfig, RobertaForSequenceClassification
+from ai_detection import (ai_label_index, ai_score_from_prediction, instrument_stages, load_detector,
+                          model_fingerprint, score_long_document, window_spans)
+
+WORDS = "the quick brown fox jumps over a lazy dog while cats sleep".split()
+
+@pytest.fixture(scope="module")
+def tiny_detector():
+    """A word-level fast tokenizer and a small random RoBERTa classifier, built offline."""
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3}
+    vocab.update({word: i + 4 for i, word in enumerate(WORDS)})
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    backend.post_processor = processors.RobertaProcessing(("</s>", 2), ("<s>", 0))
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, bos_token="<s>", eos_token="</s>", pad_token="<pad>",
+                                        unk_token="<unk>", cls_token="<s>", sep_token="</s>", model_max_length=512)
+    config = RobertaConfig(vocab_size=len(vocab), hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+                           intermediate_size=32, max_position_embeddings=514, pad_token_id=1,
+                           id2label={0: "Fake", 1: "Real"}, label2id={"Fake": 0, "Real": 1})
+    torch.manual_seed(0)
+    return tokenizer, RobertaForSequenceClassification(config).eval()
+
+def test_window_spans_overlap_and_cap():
+    assert window_spans(100, 510, 128) == ([(0, 100)], False)
+    spans, truncated = window_spans(1200, 510, 128)
+    assert spans == [(0, 510), (382, 892), (690, 1200)] and not truncated
+    spans, truncated = window_spans(5000, 510, 128, max_windows=4)
+    assert len(spans) == 4 and truncated
+    with pytest.raises(ValueError):
+        window_spans(10, 8, 8)
+
+def test_ai_label_index():
+    assert ai_label_index({0: "Fake", 1: "Real"}) == 0
+    assert ai_label_index({0: "LABEL_0", 1: "LABEL_1"}) == 1
+    assert ai_label_index({0: "Real", 1: "Other"}) == 1
+    assert ai_label_index({0: "positive", 1: "negative"}) is None
+
+def test_score_long_document_windows_match_single_passes(tiny_detector):
+    """Each window scores as its own forward pass would, with character offsets into the text."""
+    tokenizer, model = tiny_detector
+    text = " ".join(WORDS[i % len(WORDS)] for i in range(1300))
+    result = score_long_document(text, tokenizer, model, overlap_tokens=64)
+    assert result["n_tokens"] == 1300 and not result["truncated"]
+    assert result["scored_chars"] == len(text)
+    assert [window["tokens"] for window in result["windows"]] == [510, 510, 510]
+    for window in result["windows"]:
+        chunk = text[window["start"]:window["end"]]
+        encoded = tokenizer(chunk, return_tensors="pt")
+        assert encoded["input_ids"].shape[1] == window["tokens"] + 2
+        with torch.no_grad():
+            expected = torch.softmax(model(**encoded).logits, dim=-1)[0, 0].item()
+        assert window["ai_score"] == pytest.approx(expected, abs=2e-3)
+    scores = [window["ai_score"] for window in result["windows"]]
+    assert min(scores) - 1e-3 <= result["ai_score"] <= max(scores) + 1e-3
+    assert result["prediction_label"] in ("Fake", "Real")
+
+def test_score_long_document_respects_window_cap(tiny_detector):
+    tokenizer, model = tiny_detector
+    text = " ".join(WORDS[i % len(WORDS)] for i in range(5000))
+    result = score_long_document(text, tokenizer, model, max_windows=2)
+    assert len(result["windows"]) == 2 and result["truncated"]
+    assert result["scored_chars"] == result["windows"][-1]["end"] < len(text)
+
+@pytest.fixture(scope="module")
+def tiny_detector_dir(tiny_detector, tmp_path_factory):
+    tokenizer, model = tiny_detector
+    path = tmp_path_factory.mktemp("tiny-detector")
+    tokenizer.save_pretrained(path)
+    model.save_pretrained(path)
+    return str(path)
+
+PARITY_TEXTS = ["the quick brown fox jumps over a lazy dog", "cats sleep", "the dog while the cats sleep " * 20]
+
+@pytest.mark.parametrize("backend", ["pytorch_int8", "onnx"])
+def test_backends_match_pytorch(tiny_detector_dir, backend, tmp_path):
+    """Every backend returns the PyTorch pipeline's prediction shape, with near-identical AI scores."""
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    reference, _, _ = load_detector(tiny_detector_dir, "pytorch")
+    classifier, tokenizer, model = load_detector(tiny_detector_dir, backend, onnx_path=str(tmp_path / "model.onnx"))
+    expected = reference(PARITY_TEXTS, batch_size=len(PARITY_TEXTS))
+    predictions = classifier(PARITY_TEXTS, batch_size=len(PARITY_TEXTS))
+    assert [set(prediction) for prediction in predictions] == [{"label", "score"}] * len(PARITY_TEXTS)
+    for prediction, reference_prediction in zip(predictions, expected):
+        assert ai_score_from_prediction(prediction["label"], prediction["score"]) == pytest.approx(
+            ai_score_from_prediction(reference_prediction["label"], reference_prediction["score"]), abs=0.02)
+    long_text = " ".join(WORDS[i % len(WORDS)] for i in range(700))
+    assert score_long_document(long_text, tokenizer, model)["windows"]
+
+def test_model_fingerprint_follows_the_weights_not_the_load(tiny_detector_dir, tmp_path):
+    """Reloading the same weights gives the same fingerprint; new weights under the same path change it."""
+    import os
+    import shutil
+    path = str(tmp_path / "detector")
+    shutil.copytree(tiny_detector_dir, path)
+    _, _, model = load_detector(path, "pytorch")
+    fingerprint = model_fingerprint(model)
+    assert model_fingerprint(load_detector(path, "pytorch")[2]) == fingerprint
+    assert model_fingerprint(load_detector(path, "pytorch_int8")[2]) == fingerprint
+    weights = [name for name in os.listdir(path) if name.startswith("model.")][0]
+    model.save_pretrained(path)  # Rewritten, as when fine-tuned weights replace the old ones
+    os.utime(os.path.join(path, weights), ns=(0, 0))
+    assert model_fingerprint(load_detector(path, "pytorch")[2]) != fingerprint
+    assert model_fingerprint(model, [os.path.join(path, weights)]) != model_fingerprint(model)
+
+def test_load_detector_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        load_detector("unused", "tensorrt")
+
+@pytest.mark.parametrize("backend", ["pytorch", "onnx"])
+def test_instrument_stages_times_tokenizer_and_forward_pass(tiny_detector_dir, backend, tmp_path):
+    if backend == "onnx":
+        pytest.importorskip("onnxruntime")
+    classifier, _, _ = load_detector(tiny_detector_dir, backend, onnx_path=str(tmp_path / "model.onnx"))
+    expected = classifier(PARITY_TEXTS, batch_size=len(PARITY_TEXTS))
+    observed = []
+    instrument_stages(classifier, lambda stage, seconds: observed.append((stage, seconds)))
+    assert classifier(PARITY_TEXTS, batch_size=len(PARITY_TEXTS)) == expected
+    assert {stage for stage, _ in observed} == {"tokenize", "forward", "postprocess"}
+    assert all(seconds >= 0 for _, seconds in observed)
@@ -1,6 +1,9 @@
 import pytest
 import json
+import requests
+import app as app_module
 from app import app as flask_app # Import the Flask app instance
+from startup import ComponentStatus
 from unittest.mock import MagicMock
 
 # --- Fixtures ---
@@ -20,6 +23,11 @@ def client(app_instance):
     """A test client for the app."""
     return app_instance.test_client()
 
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    """Tests mock the backends differently for the same texts, so none may see another's cached results."""
+    app_module.result_cache.clear()
+
 # --- Tests for /api/checkText ---
 
 def test_check_text_success(client, mocker):
@@ -27,7 +35,7 @@ def test_check_text_success(client, mocker):
     mock_lt_response = MagicMock()
     mock_lt_response.status_code = 200
     mock_lt_response.json.return_value = {"matches": [{"message": "Test error"}]}
-    mocker.patch("requests.post", return_value=mock_lt_response)
+    mocker.patch("requests.Session.post", return_value=mock_lt_response)
 
     response = client.post('/api/checkText', json={"language": "en-US", "text": "This is a tst."})
     assert response.status_code == 200
@@ -35,6 +43,22 @@ def test_check_text_success(client, mocker):
     assert "matches" in data
     assert data["matches"][0]["message"] == "Test error"
 
+def test_check_text_resubmission_is_cached(client, mocker):
+    """Test an identical resubmission is served from the result cache; a new language is not."""
+    mock_lt_response = MagicMock()
+    mock_lt_response.json.return_value = {"matches": [{"message": "Test error", "offset": 10, "length": 3}]}
+    post = mocker.patch("requests.Session.post", return_value=mock_lt_response)
+    payload = {"language": "en-US", "text": "This is a tst."}
+    first = client.post('/api/checkText', json=payload)
+    second = client.post('/api/checkText', json=payload)
+    assert (first.headers["X-Cache"], second.headers["X-Cache"]) == ("MISS", "HIT")
+    assert json.loads(second.data) == json.loads(first.data)
+    assert post.call_count == 1
+    client.post('/api/checkText', json={"language": "en-GB", "text": "This is a tst."})
+    assert post.call_count == 2
+    stats = json.loads(client.get('/api/stats').data)["result_cache"]
+    assert stats["namespaces"]["checkText"]["hits"] >= 1
+
 def test_check_text_missing_fields(client):
     """Test /api/checkText with missing 'text' or 'language' fields."""
     response = client.post('/api/checkText', json={"language": "en-US"}) # Missing text
@@ -54,7 +78,7 @@ def test_check_text_missing_fields(client):
 
 def test_check_text_languagetool_service_unavailable(client, mocker):
     """Test /api/checkText when LanguageTool service is unavailable."""
-    mocker.patch("requests.post", side_effect=requests.exceptions.RequestException("Service down"))
+    mocker.patch("requests.Session.post", side_effect=requests.exceptions.RequestException("Service down"))
     response = client.post('/api/checkText', json={"language": "en-US", "text": "Test"})
     assert response.status_code == 502 # Bad Gateway
     data = json.loads(response.data)
@@ -70,7 +94,7 @@ def test_check_text_languagetool_returns_error(client, mocker):
     # Let's assume it still tries to get JSON if error is structured
     mock_lt_response.json.return_value = {"error": "LT internal error"}
     
-    mocker.patch("requests.post", return_value=mock_lt_response)
+    mocker.patch("requests.Session.post", return_value=mock_lt_response)
     
     response = client.post('/api/checkText', json={"language": "en-US", "text": "Test"})
     # This should be caught by response.raise_for_status() in app.py
@@ -100,6 +124,37 @@ def test_check_plagiarism_no_similarity(client):
     assert data["status"] == "no_significant_similarity"
     assert data["score"] < 0.5 # Expect low score
 
+def test_check_plagiarism_copied_passage_in_long_text(client):
+    """Test /api/checkPlagiarism flags a copied passage that whole-document similarity dilutes."""
+    test_text = ("Last summer I visited my grandparents and spent most afternoons reading in their garden. "
+                 "Its fall in 476 AD marked the beginning of the Middle Ages in Western Europe. "
+                 "We also cooked dinner together, played cards every evening and watched old films on television.")
+    response = client.post('/api/checkPlagiarism', json={"text": test_text})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["status"] == "partial_plagiarism"
+    assert data["score"] < 0.7
+    passage = data["passages"][0]
+    assert passage["doc_id"] == "doc1_histor_rome"
+    assert "476 AD marked the beginning of the Middle Ages" in test_text[passage["input_start"]:passage["input_end"]]
+
+def test_check_plagiarism_returns_top_k_matches(client):
+    """Test /api/checkPlagiarism returns ranked matches, limited by 'top_k'."""
+    test_text = "Python programming language and the Apollo Moon landing."
+    response = client.post('/api/checkPlagiarism', json={"text": test_text, "top_k": 1})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert len(data["matches"]) == 1
+    assert data["matches"][0]["doc_id"] in data["details"]
+
+    response = client.post('/api/checkPlagiarism', json={"text": test_text})
+    scores = [match["score"] for match in json.loads(response.data)["matches"]]
+    assert len(scores) >= 2
+    assert scores == sorted(scores, reverse=True)
+
+    response = client.post('/api/checkPlagiarism', json={"text": test_text, "top_k": 0})
+    assert response.status_code == 400
+
 def test_check_plagiarism_empty_input(client):
     """Test /api/checkPlagiarism with empty text."""
     response = client.post('/api/checkPlagiarism', json={"text": "  "})
@@ -130,6 +185,9 @@ def mock_ai_detector(mocker):
     mock_pipeline = MagicMock()
     # Patch the global ai_text_detector in the app module
     mocker.patch("app.ai_text_detector", mock_pipeline)
+    # Without a real tokenizer/model, long texts take the truncation path
+    mocker.patch("app.ai_detector_tokenizer", None)
+    mocker.patch("app.ai_detector_model", None)
     return mock_pipeline
 
 def test_check_ai_text_detected_as_fake(client, mock_ai_detector):
@@ -222,6 +280,364 @@ def test_check_ai_text_model_unexpected_output(client, mock_ai_detector):
     data = json.loads(response.data)
     assert "Invalid output from AI detection model" in data["error"]
 
+def test_check_ai_text_batches_requests_and_reports_stats(client, mock_ai_detector):
+    """Test /api/checkAiText goes through the micro-batcher and /api/stats reports it."""
+    mock_ai_detector.return_value = [{'label': 'Fake', 'score': 0.9}]
+    before = json.loads(client.get('/api/stats').data)["ai_batching"]["items"]
+    response = client.post('/api/checkAiText', json={"text": "Batched text."})
+    assert response.status_code == 200
+    mock_ai_detector.assert_called_once_with(["Batched text."], batch_size=1)
+    stats = json.loads(client.get('/api/stats').data)["ai_batching"]
+    assert stats["items"] == before + 1
+    assert stats["queue_depth"] == 0
+
+def test_check_ai_text_long_document_uses_windows(client, mock_ai_detector, mocker):
+    """Test texts over the length limit are scored in windows instead of truncated."""
+    mocker.patch("app.ai_detector_tokenizer", MagicMock())
+    mocker.patch("app.ai_detector_model", MagicMock())
+    windowed = {"ai_score": 0.8, "prediction_label": "Fake", "model_score": 0.8, "n_tokens": 900,
+                "scored_chars": 3000, "truncated": False,
+                "windows": [{"start": 0, "end": 2000, "tokens": 510, "ai_score": 0.9},
+                            {"start": 1400, "end": 3000, "tokens": 510, "ai_score": 0.7}]}
+    mock_score = mocker.patch("ai_detection.score_long_document", return_value=windowed)
+    long_text = "word " * 600
+    response = client.post('/api/checkAiText', json={"text": long_text})
+    assert response.status_code == 200
+    assert json.loads(response.data) == windowed
+    assert mock_score.call_args[0][0] == long_text
+    mock_ai_detector.assert_not_called()
+
+def test_check_ai_text_long_document_falls_back_to_truncation(client, mock_ai_detector):
+    """Test long texts are truncated when no tokenizer/model is available for windowing."""
+    mock_ai_detector.return_value = [{'label': 'Real', 'score': 0.9}]
+    response = client.post('/api/checkAiText', json={"text": "word " * 600})
+    assert response.status_code == 200
+    assert "windows" not in json.loads(response.data)
+    assert len(mock_ai_detector.call_args[0][0][0]) == 1000
+
+def test_check_ai_text_while_model_loading(client, mocker):
+    """Test /api/checkAiText asks clients to retry while the model loads in the background."""
+    status = ComponentStatus()
+    status.register("ai_detector")
+    mocker.patch("app.startup_status", status)
+    mocker.patch("app.ai_text_detector", None)
+    response = client.post('/api/checkAiText', json={"text": "Some text"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "10"
+    assert "still loading" in json.loads(response.data)["error"]
+
+def test_check_ai_text_lazy_loading(client, mocker):
+    """Test the first /api/checkAiText request loads the model when loading is lazy."""
+    detector = MagicMock(return_value=[{'label': 'Fake', 'score': 0.9}])
+    loader = mocker.patch("app.load_ai_detector_model", side_effect=lambda: setattr(app_module, "ai_text_detector", detector))
+    mocker.patch("app.AI_DETECTOR_LOADING", "lazy")
+    mocker.patch("app._ai_detector_loader", None)
+    mocker.patch("app.ai_text_detector", None)
+    mocker.patch("app.ai_detector_tokenizer", None)
+    response = client.post('/api/checkAiText', json={"text": "Lazy text."})
+    assert response.status_code == 200
+    assert json.loads(response.data)["ai_score"] == 0.9
+    loader.assert_called_once()
+
+def test_loading_the_ai_model_keeps_cached_results(client, mocker):
+    """Loading the model keeps AI results cached for the same weights, and keys them on the weights' fingerprint."""
+    model = MagicMock()
+    mocker.patch("ai_detection.load_detector", return_value=(MagicMock(), MagicMock(), model))
+    mocker.patch("ai_detection.instrument_stages")
+    mocker.patch("ai_detection.model_fingerprint", return_value="abc123")
+    mocker.patch("app.ai_text_detector", None)
+    mocker.patch("app.ai_detector_fingerprint", None)
+    mocker.patch("app.ai_detector_tokenizer", None)
+    mocker.patch("app.ai_detector_model", None)
+    app_module.result_cache.put("cached", {"ai_score": 0.9}, namespace="checkAiText")
+    app_module.load_ai_detector_model()
+    assert app_module.result_cache.get("cached", namespace="checkAiText") == {"ai_score": 0.9}
+    assert app_module.ai_detector_cache_params()["weights"] == "abc123"
+
+# --- Tests for /api/readability ---
+def test_readability_scores_one_or_many_texts(client):
+    """Test /api/readability returns readability.js's scores for a text, or for each of a list of texts."""
+    text = "The quick brown fox jumps over the lazy dog. It was extraordinarily unbelievable!"
+    response = client.post('/api/readability', json={"text": text})
+    assert response.status_code == 200
+    assert json.loads(response.data) == {"scores": {
+        "flesch_reading_ease": 59.0, "flesch_kincaid_grade": 5.7, "gunning_fog": 6.8, "smog_index": 4.4,
+        "coleman_liau_index": 12.3, "automated_readability_index": 2.9}}
+    response = client.post('/api/readability', json={"texts": [text, "  "]})
+    assert response.status_code == 200
+    results = json.loads(response.data)["results"]
+    assert results[0]["scores"]["gunning_fog"] == 6.8
+    assert results[1] == {"scores": None, "message": "Input text is empty."}
+
+def test_readability_invalid_payload(client):
+    assert client.post('/api/readability', json={}).status_code == 400
+    assert client.post('/api/readability', json={"text": 5}).status_code == 400
+    assert client.post('/api/readability', json={"texts": ["ok", 5]}).status_code == 400
+
+# --- Tests for /api/analyze ---
+
+def test_analyze_runs_checks_concurrently(client, mocker, mock_ai_detector):
+    """Test /api/analyze returns all three results, with the LanguageTool call and the model running at once."""
+    import threading
+    both_running = threading.Barrier(2, timeout=5) # Breaks (failing a check) if the two run one after another
+    mock_lt_response = MagicMock()
+    mock_lt_response.json.return_value = {"matches": [{"message": "Test error", "offset": 10, "length": 3}]}
+
+    def languagetool_post(*args, **kwargs):
+        both_running.wait()
+        return mock_lt_response
+
+    def detect(texts, batch_size):
+        both_running.wait()
+        return [{'label': 'Fake', 'score': 0.9}] * len(texts)
+
+    mocker.patch("requests.Session.post", side_effect=languagetool_post)
+    mock_ai_detector.side_effect = detect
+
+    response = client.post('/api/analyze', json={"language": "en-US", "text": "The Roman Empire was founded by Augustus in 27 BC. It spanned across Europe."})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["errors"] == {}
+    assert data["results"]["grammar"]["matches"][0]["message"] == "Test error"
+    assert data["results"]["plagiarism"]["matches"][0]["doc_id"] == "doc1_histor_rome"
+    assert data["results"]["ai"]["ai_score"] == 0.9
+    assert set(data["timings_ms"]) == {"grammar", "plagiarism", "ai", "total"}
+    assert data["cache"] == {"grammar": "MISS", "plagiarism": "MISS", "ai": "MISS"}
+
+def test_analyze_returns_partial_results(client, mocker, mock_ai_detector):
+    """Test a failing check is reported under errors while the other checks still return results."""
+    mocker.patch("requests.Session.post", side_effect=requests.exceptions.ConnectionError("Connection refused"))
+    mock_ai_detector.return_value = [{'label': 'Real', 'score': 0.8}]
+    response = client.post('/api/analyze', json={"language": "en-US", "text": "Some text to analyze."})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert set(data["results"]) == {"plagiarism", "ai"}
+    assert data["errors"]["grammar"]["status"] == 502
+    assert "Error connecting to LanguageTool server" in data["errors"]["grammar"]["error"]
+    assert "grammar" in data["timings_ms"]
+
+def test_analyze_selected_checks_and_all_failing(client, mocker):
+    """Test 'checks' limits the work, and a request whose every check failed gets that check's status."""
+    response = client.post('/api/analyze', json={"text": "No language needed here.", "checks": ["plagiarism"]})
+    assert response.status_code == 200
+    assert set(json.loads(response.data)["results"]) == {"plagiarism"}
+
+    status = ComponentStatus()
+    status.register("ai_detector")
+    mocker.patch("app.startup_status", status)
+    mocker.patch("app.ai_text_detector", None)
+    response = client.post('/api/analyze', json={"text": "Some text", "checks": ["ai"]})
+    assert response.status_code == 503
+    assert "still loading" in json.loads(response.data)["errors"]["ai"]["error"]
+
+def test_analyze_invalid_payload(client):
+    """Test /api/analyze validates the request once, up front."""
+    assert client.post('/api/analyze', json={"language": "en-US"}).status_code == 400
+    assert client.post('/api/analyze', json={"language": "en-US", "text": "   "}).status_code == 400
+    assert client.post('/api/analyze', json={"text": "Some text"}).status_code == 400 # Grammar needs a language
+    assert client.post('/api/analyze', json={"text": "Some text", "checks": ["spelling"]}).status_code == 400
+    assert client.post('/api/analyze', json={"text": "Some text", "checks": ["plagiarism"], "top_k": 0}).status_code == 400
+
+def test_analyze_incremental_rechecks_only_edited_paragraphs(client, mocker, mock_ai_detector):
+    """Test a document_id makes /api/analyze check only new paragraphs and merge offsets over the whole text."""
+    mocker.patch("app.incremental_documents", app_module.DocumentStore())
+    checked_texts = []
+
+    def languagetool_post(url, data, timeout):
+        checked_texts.append(data["text"])
+        response = MagicMock()
+        response.json.return_value = {"language": {"code": "en-US"}, "matches": [
+            {"message": "Typo", "offset": data["text"].encode("utf-16-le").find("teh".encode("utf-16-le")) // 2, "length": 3}]
+            if "teh" in data["text"] else []}
+        return response
+
+    mocker.patch("requests.Session.post", side_effect=languagetool_post)
+    mock_ai_detector.side_effect = lambda texts, batch_size: [
+        {'label': 'Fake', 'score': 0.9} if "Roman" in text else {'label': 'Real', 'score': 0.8} for text in texts]
+    rome = "The Roman Empire was founded by Augustus in 27 BC. It spanned across Europe, North Africa, and the Middle East.\n\n"
+    first = rome + "My garden 🌱 has teh roses.\n\nThe end."
+    request = {"language": "en-US", "text": first, "document_id": "essay-1"}
+    data = json.loads(client.post('/api/analyze', json=request).data)
+    assert data["segments"] == {"total": 3, "checked": {"grammar": 3, "plagiarism": 3, "ai": 1}}
+    assert checked_texts == [first] # Adjacent new segments go to LanguageTool as the text they are
+    offset = data["results"]["grammar"]["matches"][0]["offset"]
+    assert first.encode("utf-16-le")[offset * 2:(offset + 3) * 2].decode("utf-16-le") == "teh"
+    assert data["results"]["plagiarism"]["matches"][0]["doc_id"] == "doc1_histor_rome"
+    assert data["cache"] == {"grammar": None, "plagiarism": None, "ai": None}
+    # A first version gets the whole-text AI check.
+    assert data["results"]["ai"] == json.loads(client.post('/api/checkAiText', json={"text": first}).data)
+
+    edited = "Intro line 🌍.\n" + rome + "My garden 🌱 has teh roses.\n\nThe very end."
+    checked_texts.clear()
+    mock_ai_detector.reset_mock()
+    data = json.loads(client.post('/api/analyze', json=dict(request, text=edited)).data)
+    assert data["segments"] == {"total": 4, "checked": {"grammar": 2, "plagiarism": 2, "ai": 1}}
+    assert sorted(checked_texts) == ["Intro line 🌍.\n", "The very end."] # Each run on its own
+    offset = data["results"]["grammar"]["matches"][0]["offset"]
+    assert edited.encode("utf-16-le")[offset * 2:(offset + 3) * 2].decode("utf-16-le") == "teh"
+    assert data["results"]["grammar"]["language"] == {"code": "en-US"}
+
+    # The same results as a full check; the AI check of a one-window document is the whole-text one.
+    full = json.loads(client.post('/api/analyze', json={"language": "en-US", "text": edited}).data)["results"]
+    assert data["results"]["grammar"]["matches"] == full["grammar"]["matches"]
+    assert data["results"]["plagiarism"]["score"] == full["plagiarism"]["score"]
+    assert data["results"]["plagiarism"]["matches"] == full["plagiarism"]["matches"]
+    assert data["results"]["ai"] == full["ai"]
+
+def test_analyze_incremental_ai_rescores_only_changed_windows(client, mocker, mock_ai_detector):
+    """Test the AI check reuses windows of whole paragraphs unless most of the document changed."""
+    mocker.patch("app.incremental_documents", app_module.DocumentStore())
+    mock_ai_detector.side_effect = lambda texts, batch_size: [
+        {'label': 'Fake', 'score': 0.9} if "Roman" in text else {'label': 'Real', 'score': 0.8} for text in texts]
+    paragraphs = [f"Paragraph {i} is about the weather and my garden. " * 12 + "\n\n" for i in range(6)]
+    first = "".join(paragraphs)
+    request = {"text": first, "checks": ["ai"], "document_id": "essay-2"}
+    data = json.loads(client.post('/api/analyze', json=request).data)
+    assert data["segments"]["checked"] == {"ai": 3}  # Whole-text check, plus its three windows for later
+    assert data["results"]["ai"] == json.loads(client.post('/api/checkAiText', json={"text": first}).data)
+
+    edited = first.replace("Paragraph 4 is about the weather", "Paragraph 4 is about the Roman Empire", 1)
+    mock_ai_detector.reset_mock()
+    data = json.loads(client.post('/api/analyze', json=dict(request, text=edited)).data)
+    assert data["segments"]["checked"] == {"ai": 1}
+    [window_text] = mock_ai_detector.call_args.args[0]  # Truncated: no long-document model here
+    assert (paragraphs[4].replace("weather", "Roman Empire", 1) + paragraphs[5]).startswith(window_text)
+    windows = data["results"]["ai"]["windows"]
+    assert [window["ai_score"] for window in windows] == [0.2, 0.2, 0.9]
+    assert edited[windows[1]["start"]:windows[1]["end"]] == paragraphs[2] + paragraphs[3]
+    assert 0.4 < data["results"]["ai"]["ai_score"] < 0.5 and data["results"]["ai"]["prediction_label"] == "Real"
+
+    rewritten = edited.replace("weather", "Roman Empire")  # Most windows change: whole-text check again
+    data = json.loads(client.post('/api/analyze', json=dict(request, text=rewritten)).data)
+    assert "windows" not in data["results"]["ai"] and data["segments"]["checked"] == {"ai": 3}
+
+def test_analyze_incremental_passages_and_invalid_document_id(client, mocker):
+    """Test copied passages found segment by segment point into the whole text."""
+    mocker.patch("app.incremental_documents", app_module.DocumentStore())
+    copied = app_module.SAMPLE_CORPUS["doc2_python_intro"]
+    text = "Some thoughts of my own on programming.\n\nAs my source said: " + copied + "\n"
+    data = json.loads(client.post('/api/analyze', json={"text": text, "checks": ["plagiarism"], "document_id": "d"}).data)
+    passage = data["results"]["plagiarism"]["passages"][0]
+    assert passage["doc_id"] == "doc2_python_intro"
+    assert text[passage["input_start"]:passage["input_end"]] in copied
+    full = json.loads(client.post('/api/analyze', json={"text": text, "checks": ["plagiarism"]}).data)["results"]
+    assert data["results"]["plagiarism"] == full["plagiarism"]
+
+    assert client.post('/api/analyze', json={"text": "Some text", "checks": ["ai"], "document_id": ""}).status_code == 400
+    assert client.post('/api/analyze', json={"text": "Some text", "checks": ["ai"], "document_id": 7}).status_code == 400
+
+# --- Tests for /api/batch ---
+
+def test_batch_streams_results_with_one_model_call_per_batch(client, mocker, mock_ai_detector):
+    """Test /api/batch returns one JSONL line per input line, classifying each batch in one call."""
+    mocker.patch("app.BATCH_ANALYSIS_SIZE", 2)
+    mock_ai_detector.side_effect = lambda texts, batch_size: [{'label': 'Real', 'score': 0.75}] * len(texts)
+    body = "\n".join([
+        json.dumps({"id": "rome", "text": "The Roman Empire was founded by Augustus in 27 BC. It spanned across Europe."}),
+        json.dumps({"id": "mine", "text": "My own thoughts on gardening."}),
+        "not json",
+        json.dumps({"id": "empty", "text": " "}),
+    ])
+    response = client.post('/api/batch', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [result["line"] for result in results] == [1, 2, 3, 4]
+    assert results[0]["id"] == "rome" and results[0]["plagiarism"]["matches"][0]["doc_id"] == "doc1_histor_rome"
+    assert results[1]["ai"] == {"ai_score": 0.25, "prediction_label": "Real", "model_score": 0.75}
+    assert results[2] == {"line": 3, "error": "Line is not valid JSON"}
+    assert results[3]["ai"]["message"] == "Input text is empty."
+    assert results[1]["readability"]["scores"]["flesch_reading_ease"] == 105.1  # As readability.js
+    assert results[3]["readability"]["message"] == "Input text is empty."
+    assert [call.args[0] for call in mock_ai_detector.call_args_list] == [
+        ["The Roman Empire was founded by Augustus in 27 BC. It spanned across Europe.", "My own thoughts on gardening."]]
+
+def test_batch_invalid_parameters(client, mocker):
+    assert client.post('/api/batch?checks=grammar', data="").status_code == 400
+    assert client.post('/api/batch?top_k=0', data="").status_code == 400
+    mocker.patch("app.ai_text_detector", None)
+    mocker.patch("app.startup_status", ComponentStatus())
+    app_module.startup_status.register("ai_detector")
+    assert client.post('/api/batch', data="").status_code == 503
+    assert client.post('/api/batch?checks=plagiarism', data="").status_code == 200
+
+# --- Tests for /healthz and /readyz ---
+def test_healthz(client):
+    response = client.get('/healthz')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["status"] == "ok" and data["uptime_seconds"] > 0
+
+def test_readyz_reports_components(client, mocker):
+    """Test /readyz is ready once required components load; optional ones are only reported."""
+    status = ComponentStatus()
+    status.register("plagiarism_corpus")
+    status.register("ai_detector", required=False)
+    mocker.patch("app.startup_status", status)
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert json.loads(response.data)["components"]["plagiarism_corpus"]["state"] == "pending"
+
+    status.mark_ready("plagiarism_corpus", 0.5)
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["ready"] is True
+    assert data["components"]["plagiarism_corpus"]["load_seconds"] == 0.5
+    assert data["components"]["ai_detector"] == {"state": "pending", "required": False, "load_seconds": None,
+                                                 "ready_after_seconds": None, "error": None}
+
+# --- Tests for pre-fork serving ---
+def test_fork_waits_for_model_loading_and_restarts_threads(mocker):
+    """Test fork() waits for a background model load, and the child restarts the corpus re-weighting thread."""
+    import os
+    import threading
+    import time
+    loader = threading.Thread(target=time.sleep, args=(0.2,))
+    loader.start()
+    mocker.patch("app._ai_detector_loader", loader)
+    mocker.patch("app.CORPUS_REWEIGHT_INTERVAL_SECONDS", 300)
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if "corpus-reweight" in [thread.name for thread in threading.enumerate()] else 1)
+    assert not loader.is_alive()
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+# --- Tests for /metrics and profiling ---
+def test_metrics_report_requests_stages_and_upstream_latency(client, mocker, mock_ai_detector):
+    """Test /metrics exposes request counters, per-stage timings, LanguageTool latency and model batch sizes."""
+    mock_lt_response = MagicMock(status_code=200)
+    mock_lt_response.json.return_value = {"matches": []}
+    mocker.patch("requests.Session.post", return_value=mock_lt_response)
+    mock_ai_detector.return_value = [{'label': 'Fake', 'score': 0.9}]
+    client.post('/api/checkText', json={"language": "en-US", "text": "Metrics grammar text."})
+    client.post('/api/checkPlagiarism', json={"text": "Python is a versatile programming language."})
+    client.post('/api/checkPlagiarism', json={})
+    client.post('/api/checkAiText', json={"text": "Metrics AI text."})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+    assert 'http_requests_total{endpoint="/api/checkPlagiarism",method="POST",status="200"}' in text
+    assert 'http_request_errors_total{endpoint="/api/checkPlagiarism",status="400"}' in text
+    assert 'http_request_duration_seconds_count{endpoint="/api/checkAiText"}' in text
+    assert 'text_length_chars_bucket{endpoint="/api/checkPlagiarism",le="100"}' in text
+    for stage in ("preprocess", "vectorize", "similarity", "passages"):
+        assert f'check_stage_duration_seconds_count{{check="plagiarism",stage="{stage}"}}' in text
+    assert 'check_stage_duration_seconds_count{check="grammar",stage="languagetool"}' in text
+    assert 'languagetool_request_duration_seconds_count{backend="http://localhost:8081/v2/check",status="200"}' in text
+    assert 'ai_detector_batch_size_bucket{le="1"}' in text
+    assert 'result_cache_lookups_total{namespace="checkAiText",result="miss"}' in text
+
+def test_sampled_requests_are_profiled(client, mocker, tmp_path):
+    """Test PROFILE_SAMPLE_RATE runs requests under cProfile and dumps .prof files."""
+    from metrics import RequestProfiler
+    mocker.patch("app.profiler", RequestProfiler(sample_rate=1.0, directory=str(tmp_path)))
+    assert client.post('/api/checkPlagiarism', json={"text": "Profiled text about cooking."}).status_code == 200
+    assert [path.name.startswith("POST-_api_checkPlagiarism-") for path in tmp_path.iterdir()] == [True]
+
 # --- Basic NLTK data download test (does not verify download, just that function runs) ---
 def test_download_nltk_data_runs(mocker):
     """Test that download_nltk_data runs without error (mocks actual download)."""
@@ -243,3 +659,89 @@ def test_preprocess_text_for_plagiarism():
     text_only_stopwords = "the a is of for and"
     expected_empty = ""
     assert preprocess_text_for_plagiarism(text_only_stopwords) == expected_empty
+
+# --- Test plagiarism corpus index ---
+def test_corpus_index_matches_refit_on_sample_corpus():
+    """The startup index scores exactly like refitting TF-IDF on SAMPLE_CORPUS per request."""
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+    from app import plagiarism_corpus, SAMPLE_CORPUS, preprocess_text_for_plagiarism
+    corpus_index = plagiarism_corpus.snapshot
+    processed_corpus = [preprocess_text_for_plagiarism(doc) for doc in SAMPLE_CORPUS.values()]
+    processed_input = preprocess_text_for_plagiarism("Python is a popular language for data science and the web.")
+    vectorizer = TfidfVectorizer()
+    corpus_vectors = vectorizer.fit_transform(processed_corpus)
+    expected = cosine_similarity(vectorizer.transform([processed_input]), corpus_vectors)[0]
+    assert corpus_index.doc_ids == list(SAMPLE_CORPUS.keys())
+    np.testing.assert_allclose(corpus_index.query(processed_input), expected)
+
+# --- Tests for /api/corpus ingestion ---
+@pytest.fixture
+def live_corpus(mocker):
+    """Give each ingestion test its own LiveCorpus over the startup index."""
+    import app as app_module
+    from corpus_index import LiveCorpus
+    corpus = LiveCorpus(app_module.plagiarism_corpus.snapshot, app_module.preprocess_text_for_plagiarism)
+    mocker.patch("app.plagiarism_corpus", corpus)
+    return corpus
+
+def test_corpus_ingest_jsonl_and_check(client, live_corpus):
+    """Documents ingested as JSONL are immediately used by /api/checkPlagiarism."""
+    body = "\n".join([
+        json.dumps({"id": "doc5_volcanoes", "text": "Volcanoes erupt molten lava, ash and gases from magma chambers beneath the crust."}),
+        json.dumps({"id": "doc2_python_intro", "text": "Python snakes are large constrictors found in Africa and Asia."}),
+    ])
+    response = client.post('/api/corpus/documents', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["added"] == 1 and data["replaced"] == 1
+    assert data["corpus"]["documents"] == 5
+
+    response = client.post('/api/checkPlagiarism', json={"text": "Volcanoes erupt molten lava, ash and gases from magma chambers."})
+    data = json.loads(response.data)
+    assert data["status"] == "potential_plagiarism"
+    assert "doc5_volcanoes" in data["details"]
+
+def test_corpus_update_invalidates_cached_plagiarism_results(client, live_corpus):
+    """Test a cached plagiarism result is not served once the corpus changes."""
+    text = "Dinosaurs roamed the earth during the Mesozoic era for millions of years."
+    assert json.loads(client.post('/api/checkPlagiarism', json={"text": text}).data)["status"] == "no_significant_similarity"
+    assert client.post('/api/checkPlagiarism', json={"text": text}).headers["X-Cache"] == "HIT"
+    client.post('/api/corpus/documents', data=json.dumps({"id": "dinosaurs", "text": text}))
+    response = client.post('/api/checkPlagiarism', json={"text": text})
+    assert response.headers["X-Cache"] == "MISS"
+    assert json.loads(response.data)["status"] == "potential_plagiarism"
+
+def test_corpus_delete_documents(client, live_corpus):
+    response = client.delete('/api/corpus/documents', json={"ids": ["doc1_histor_rome", "missing_doc"]})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data["deleted"] == 1
+    assert data["missing"] == ["missing_doc"]
+    assert "doc1_histor_rome" not in live_corpus.snapshot.doc_ids
+
+def test_corpus_updates_reach_every_worker_sharing_a_journal(client, mocker, tmp_path):
+    """With CORPUS_JOURNAL_PATH, an update received by one worker is served by the others too."""
+    from corpus_index import JournaledCorpus
+    startup_index = app_module.plagiarism_corpus.snapshot
+    workers = [JournaledCorpus(startup_index, app_module.preprocess_text_for_plagiarism, str(tmp_path / "journal.jsonl"),
+                               sync_interval_seconds=0) for _ in range(2)]
+    mocker.patch("app.plagiarism_corpus", workers[0])
+    body = json.dumps({"id": "doc5_volcanoes", "text": "Volcanoes erupt molten lava, ash and gases from magma chambers."})
+    assert client.post('/api/corpus/documents', data=body).status_code == 200
+    assert client.delete('/api/corpus/documents', json={"ids": ["doc1_histor_rome"]}).status_code == 200
+    summary = json.loads(client.get('/api/corpus').data)
+
+    mocker.patch("app.plagiarism_corpus", workers[1])
+    workers[1].sync()  # What its sync thread does within CORPUS_SYNC_INTERVAL_SECONDS
+    assert json.loads(client.get('/api/corpus').data) == summary
+    response = client.post('/api/checkPlagiarism', json={"text": "Volcanoes erupt molten lava, ash and gases from magma chambers."})
+    assert "doc5_volcanoes" in json.loads(response.data)["details"]
+
+def test_corpus_ingest_invalid_payload(client, live_corpus):
+    response = client.post('/api/corpus/documents', data='{"id": "x", "text": "ok"}\nnot json', content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert "Line 2" in json.loads(response.data)["error"]
+    response = client.delete('/api/corpus/documents', json={"ids": "doc1_histor_rome"})
+    assert response.status_code == 400
@@ -0,0 +1,92 @@
+import itertools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import app as app_module
+import batch_pipeline
+from batch_pipeline import analyze_batches, parse_documents
+
+def fake_analyze(documents):
+    return [{"id": document["id"], "length": len(document["text"])} for document in documents]
+
+def test_parse_documents():
+    lines = ['{"id": "a", "text": "First."}', "", "not json", '{"text": "No id."}', '{"id": "b"}', b'{"id": "c", "text": "Bytes."}']
+    assert list(parse_documents(lines)) == [
+        (1, {"id": "a", "text": "First."}),
+        (3, "Line is not valid JSON"),
+        (4, {"id": 4, "text": "No id."}),
+        (5, "Line must be an object with a string 'text' field"),
+        (6, {"id": "c", "text": "Bytes."}),
+    ]
+
+def test_analyze_batches_keeps_input_order_and_reports_bad_lines():
+    lines = [json.dumps({"id": i, "text": "x" * i}) for i in range(7)] + ["{broken"]
+    batches = list(analyze_batches(lines, fake_analyze, batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 3, 2]
+    results = [result for batch in batches for result in batch]
+    assert [result.get("length") for result in results[:7]] == list(range(7))
+    assert results[7] == {"line": 8, "error": "Line is not valid JSON"}
+
+def test_analyze_batches_is_lazy_and_bounded_with_an_executor():
+    """Endless input: only a bounded number of batches are ever submitted ahead of the consumer."""
+    submitted = []
+    lock = threading.Lock()
+
+    def analyze(documents):
+        with lock:
+            submitted.append(documents[0]["id"])
+        return fake_analyze(documents)
+
+    endless = (json.dumps({"id": i, "text": "word"}) for i in itertools.count())
+    with ThreadPoolExecutor(4) as executor:
+        batches = analyze_batches(endless, analyze, batch_size=10, executor=executor, max_pending=2)
+        first = list(itertools.islice(batches, 5))
+    assert [batch[0]["id"] for batch in first] == [0, 10, 20, 30, 40]
+    assert len(submitted) <= 5 + 2 + 1
+
+@pytest.fixture
+def documents_file(tmp_path):
+    texts = ["The Roman Empire was founded by Augustus in 27 BC. It spanned across Europe, North Africa, and the Middle East.",
+             "My own thoughts on gardening and tomatoes.", "", "Guido van Rossum began working on Python in the late 1980s."]
+    path = tmp_path / "documents.jsonl"
+    path.write_text("".join(json.dumps({"id": f"doc{i}", "text": text}) + "\n" for i, text in enumerate(texts * 3)))
+    return path
+
+def run_cli(documents_file, output, *extra):
+    batch_pipeline.main([str(documents_file), str(output), "--checks", "plagiarism", "--batch-size", "2", *extra])
+    return [json.loads(line) for line in output.read_text().splitlines()]
+
+def test_cli_scores_documents(documents_file, tmp_path):
+    results = run_cli(documents_file, tmp_path / "results.jsonl")
+    assert [result["line"] for result in results] == list(range(1, 13))
+    assert results[0]["plagiarism"]["status"] == "potential_plagiarism"
+    assert results[0]["plagiarism"]["matches"][0]["doc_id"] == "doc1_histor_rome"
+    assert results[2]["plagiarism"]["status"] == "input_empty"
+    assert "ai" not in results[0]
+    assert not (tmp_path / "results.jsonl.checkpoint").exists()
+
+def test_cli_resumes_from_checkpoint_after_a_crash(documents_file, tmp_path, mocker):
+    expected = run_cli(documents_file, tmp_path / "expected.jsonl")
+
+    calls = []
+    analyze_documents = app_module.analyze_documents
+    def crash_on_fourth_batch(*args):
+        calls.append(args)
+        if len(calls) == 4:
+            raise RuntimeError("worker crashed")
+        return analyze_documents(*args)
+
+    mocker.patch("app.analyze_documents", side_effect=crash_on_fourth_batch)
+    output = tmp_path / "results.jsonl"
+    with pytest.raises(RuntimeError):
+        run_cli(documents_file, output)
+    checkpoint = json.loads((tmp_path / "results.jsonl.checkpoint").read_text())
+    assert checkpoint["lines_done"] == 6
+    with open(output, "ab") as partial:
+        partial.write(b'{"line": 7, "half a result')  # Written after the checkpoint
+
+    mocker.patch("app.analyze_documents", side_effect=analyze_documents)
+    assert run_cli(documents_file, output) == expected
+    assert app_module.analyze_documents.call_count == 3  # Only the remaining batches
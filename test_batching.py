@@ -0,0 +1,63 @@
+import threading
+import pytest
+from batching import MicroBatcher
+
+def test_concurrent_submissions_are_batched():
+    """Items submitted while the worker waits are processed in one call, results fanned back out."""
+    calls = []
+    gate = threading.Event()
+
+    def process(items):
+        gate.wait(5)  # Hold the first batch so the rest queue up behind it
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(5)]
+    gate.set()
+    assert [future.result(5) for future in futures] == [0, 2, 4, 6, 8]
+    assert all(len(call) <= 4 for call in calls)
+    assert max(len(call) for call in calls) > 1
+
+    stats = batcher.stats()
+    assert stats["items"] == 5
+    assert stats["batches"] == len(calls)
+    assert stats["queue_depth"] == 0
+
+def test_max_batch_size_is_respected():
+    sizes = []
+    ready = threading.Event()
+
+    def process(items):
+        ready.wait(5)
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(process, max_batch_size=3, max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(10)]
+    ready.set()
+    assert [future.result(5) for future in futures] == list(range(10))
+    assert max(sizes) <= 3
+
+def test_failing_item_does_not_fail_the_batch():
+    """A batch that raises is retried item by item, so only the bad item fails."""
+    gate = threading.Event()
+
+    def process(items):
+        gate.wait(5)
+        if "bad" in items:
+            raise RuntimeError("bad input")
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=50)
+    good, bad, other = batcher.submit("good"), batcher.submit("bad"), batcher.submit("other")
+    gate.set()
+    assert good.result(5) == "GOOD"
+    assert other.result(5) == "OTHER"
+    with pytest.raises(RuntimeError):
+        bad.result(5)
+
+def test_result_count_mismatch_raises():
+    batcher = MicroBatcher(lambda items: [], max_batch_size=1)
+    with pytest.raises(ValueError):
+        batcher("item", timeout=5)
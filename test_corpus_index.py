@@ -0,0 +1,277 @@
+import time
+import pytest
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from corpus_index import CorpusIndex
+
+DOCUMENTS = {
+    "rome": "roman empire founded augustus 27 bc spanned europe north africa middle east",
+    "python": "python versatile widely-used programming language known readability extensive libraries",
+    "empty": "   ",
+    "space": "space exploration began launch sputnik 1957 apollo moon landing mars",
+}
+
+def identity(text):
+    return text
+
+@pytest.fixture
+def index():
+    return CorpusIndex.build(DOCUMENTS, identity)
+
+def test_build_skips_documents_empty_after_preprocessing(index):
+    """Documents that preprocess to nothing are not indexed but keep their text for previews."""
+    assert index.doc_ids == ["rome", "python", "space"]
+    assert "empty" in index.documents
+
+def test_query_matches_refitted_vectorizer(index):
+    """Scores are identical to fitting a fresh TfidfVectorizer on the same corpus."""
+    corpus = [DOCUMENTS[doc_id] for doc_id in index.doc_ids]
+    query = "python programming language apollo unknownword"
+    vectorizer = TfidfVectorizer()
+    corpus_vectors = vectorizer.fit_transform(corpus)
+    expected = cosine_similarity(vectorizer.transform([query]), corpus_vectors)[0]
+    np.testing.assert_allclose(index.query(query), expected)
+
+def test_query_with_only_unknown_terms_scores_zero(index):
+    assert index.query("dinosaurs quantum physics").tolist() == [0.0, 0.0, 0.0]
+
+def test_save_and_load_round_trip(index, tmp_path):
+    """A saved artifact reproduces the same vocabulary, documents and scores."""
+    path = tmp_path / "corpus_index.bin"
+    index.save(path)
+    loaded = CorpusIndex.load(path)
+    assert loaded.doc_ids == index.doc_ids
+    assert loaded.documents == index.documents
+    assert loaded.terms == index.terms
+    np.testing.assert_array_equal(loaded.query("roman empire europe"), index.query("roman empire europe"))
+    assert loaded.digest == index.digest
+
+def test_empty_corpus():
+    index = CorpusIndex.build({"only_stopwords": ""}, identity)
+    assert index.n_documents == 0
+    assert index.query("anything").size == 0
+
+# --- Incremental updates ---
+def test_updates_match_full_rebuild_after_reweighting(index):
+    """Adding, replacing and deleting documents then re-weighting equals building from scratch."""
+    updated = index.updated(upserts={
+        "python": ("", "python snakes reptiles zoo"),
+        "cooking": ("", "cooking heat food baking frying boiling grilling"),
+    }, deletions=["rome"])
+    assert updated.pending_changes == 4
+    expected_documents = {"space": DOCUMENTS["space"], "python": "python snakes reptiles zoo",
+                          "cooking": "cooking heat food baking frying boiling grilling"}
+    rebuilt = CorpusIndex.build(expected_documents, identity)
+    reweighted = updated.reweighted()
+    assert reweighted.pending_changes == 0
+    assert sorted(reweighted.terms) == sorted(rebuilt.terms)
+    for query in ["python zoo", "apollo moon cooking", "roman empire"]:
+        expected = dict(zip(rebuilt.doc_ids, rebuilt.query(query)))
+        actual = dict(zip(reweighted.doc_ids, reweighted.query(query)))
+        assert actual.keys() == expected.keys()
+        for doc_id in expected:
+            assert actual[doc_id] == pytest.approx(expected[doc_id])
+
+def test_digest_follows_content_not_version_numbers(index):
+    """Same documents and update history give the same digest; different updates never collide."""
+    assert CorpusIndex.build(DOCUMENTS, identity).digest == index.digest
+    first = index.updated(upserts={"extra": ("one text", "one text")})
+    second = index.updated(upserts={"extra": ("another text", "another text")})
+    assert first.version == second.version
+    assert first.digest != second.digest != index.digest
+    assert index.updated(upserts={"extra": ("one text", "one text")}).digest == first.digest
+    assert first.reweighted().digest not in (first.digest, index.digest)
+
+def test_updates_leave_previous_snapshot_untouched(index):
+    before = index.query("python programming language")
+    index.updated(upserts={"extra": ("", "python programming language tutorial")}, deletions=["python"])
+    np.testing.assert_array_equal(index.query("python programming language"), before)
+    assert index.doc_ids == ["rome", "python", "space"]
+
+def test_deleted_terms_are_ignored_before_reweighting(index):
+    """Terms that no longer occur in any document do not affect query normalization."""
+    updated = index.updated(deletions=["rome"])
+    assert updated.query("roman empire space apollo").tolist() == pytest.approx(
+        updated.query("space apollo").tolist())
+
+def test_live_corpus_upsert_delete_and_reweight():
+    from corpus_index import LiveCorpus
+    corpus = LiveCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, reweight_threshold=10)
+    assert corpus.upsert({"new": "brand new document", "python": "python snakes", "blank": " "}) == {
+        "added": 2, "replaced": 1, "skipped": ["blank"]}
+    assert corpus.delete(["rome", "nope"]) == {"deleted": 1, "missing": ["nope"]}
+    snapshot = corpus.snapshot
+    assert sorted(snapshot.doc_ids) == ["new", "python", "space"]
+    assert snapshot.pending_changes > 0
+    assert corpus.reweight() is True
+    assert corpus.snapshot.pending_changes == 0
+    assert corpus.snapshot.version > snapshot.version
+    assert corpus.reweight() is False
+
+def test_live_corpus_reweights_in_background_past_threshold():
+    import time
+    from corpus_index import LiveCorpus
+    corpus = LiveCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, reweight_threshold=0.5)
+    corpus.upsert({"a": "alpha beta", "b": "gamma delta"})
+    deadline = time.time() + 5
+    while corpus.snapshot.pending_changes and time.time() < deadline:
+        time.sleep(0.01)
+    assert corpus.snapshot.pending_changes == 0
+
+# --- Candidate retrieval ---
+def test_search_returns_exact_top_k(index):
+    """Search ranks the same documents and scores as a brute-force query."""
+    query = "python programming space apollo europe"
+    scores = index.query(query)
+    expected = sorted(((row, score) for row, score in enumerate(scores) if score > 0), key=lambda m: -m[1])
+    results = index.search(query, top_k=2)
+    assert [row for row, _ in results] == [row for row, _ in expected[:2]]
+    assert [score for _, score in results] == pytest.approx([score for _, score in expected[:2]])
+
+def test_search_skips_documents_without_shared_terms(index):
+    assert index.search("dinosaurs quantum physics") == []
+    assert [index.doc_ids[row] for row, _ in index.search("apollo moon")] == ["space"]
+
+def test_search_max_query_terms_limits_candidates_to_rarest_terms():
+    corpus = CorpusIndex.build({
+        "a": "common shared words rareterm",
+        "b": "common shared words",
+        "c": "common shared",
+    }, identity)
+    assert {corpus.doc_ids[row] for row, _ in corpus.search("common shared words rareterm", top_k=5)} == {"a", "b", "c"}
+    limited = corpus.search("common shared words rareterm", top_k=5, max_query_terms=1)
+    assert [corpus.doc_ids[row] for row, _ in limited] == ["a"]
+    # Candidates are still scored against the whole query.
+    assert limited[0][1] == pytest.approx(corpus.query("common shared words rareterm")[0])
+
+def test_search_batch_matches_search(index):
+    """One batched product gives the same rankings and scores as searching each text."""
+    queries = ["python programming space apollo europe", "dinosaurs quantum physics", "", "apollo moon", "roman empire europe"]
+    results = index.search_batch(queries, top_k=2)
+    assert len(results) == len(queries)
+    for query, batched in zip(queries, results):
+        single = index.search(query, top_k=2)
+        assert [row for row, _ in batched] == [row for row, _ in single]
+        assert [score for _, score in batched] == pytest.approx([score for _, score in single])
+    assert CorpusIndex.build({}, identity).search_batch(queries) == [[]] * len(queries)
+
+@pytest.mark.parametrize("ratio", [0, 10 ** 9])
+def test_search_accumulates_short_and_long_postings_alike(index, monkeypatch, ratio):
+    """Summing postings by row (short postings) and into a dense array (long ones) score the same."""
+    monkeypatch.setattr("corpus_index._SPARSE_ACCUMULATION_RATIO", ratio)
+    query = "python programming space apollo europe roman"
+    scores = index.query(query)
+    results = index.search(query, top_k=5)
+    assert [index.doc_ids[row] for row, _ in results] == ["python", "space", "rome"]
+    assert [score for _, score in results] == pytest.approx([scores[row] for row, _ in results])
+    limited = index.search(query, top_k=5, max_query_terms=2)
+    assert limited and [score for _, score in limited] == pytest.approx([scores[row] for row, _ in limited])
+
+def test_live_corpus_replays_updates_made_while_reweighting(monkeypatch):
+    """Updates that land during a re-weighting pass are applied on top of its result, not lost or discarded."""
+    from corpus_index import LiveCorpus
+    corpus = LiveCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, reweight_threshold=10)
+    corpus.upsert({"new": "brand new document"})
+    reweighted = CorpusIndex.reweighted
+
+    def reweighted_during_updates(snapshot):
+        corpus.upsert({"later": "python snakes later", "python": "python snakes"})
+        corpus.delete(["rome"])
+        return reweighted(snapshot)
+
+    monkeypatch.setattr(CorpusIndex, "reweighted", reweighted_during_updates)
+    assert corpus.reweight() is True
+    monkeypatch.setattr(CorpusIndex, "reweighted", reweighted)
+    snapshot = corpus.snapshot
+    assert sorted(snapshot.doc_ids) == ["later", "new", "python", "space"]
+    assert snapshot.pending_changes == 4  # Only the replayed updates: "new" was re-weighted
+    assert corpus.reweight() is True
+    rebuilt = CorpusIndex.build({doc_id: corpus.snapshot.documents[doc_id] for doc_id in snapshot.doc_ids}, identity)
+    for query in ["python snakes", "brand new apollo"]:
+        expected = dict(zip(rebuilt.doc_ids, rebuilt.query(query)))
+        actual = dict(zip(corpus.snapshot.doc_ids, corpus.snapshot.query(query)))
+        assert actual == pytest.approx(expected)
+
+def test_journaled_corpora_apply_each_others_updates(tmp_path):
+    """Processes sharing a journal (here two instances) see every update and re-weight identically."""
+    from corpus_index import JournaledCorpus
+    journal = str(tmp_path / "journal.jsonl")
+    first, second = (JournaledCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, journal,
+                                     reweight_threshold=0.5, sync_interval_seconds=0) for _ in range(2))
+    assert first.upsert({"new": "brand new document"}) == {"added": 1, "replaced": 0, "skipped": []}
+    assert "new" not in second.snapshot.doc_ids  # Reads never wait for the journal
+    second.sync()
+    assert "new" in second.snapshot.doc_ids
+    # The second applies the first's update before its own, so it counts as a replacement.
+    assert second.upsert({"new": "brand new text", "more": "more words here"})["replaced"] == 1
+    assert second.snapshot.pending_changes == 0  # Re-weighted in line once drift passed 0.5
+    assert second.delete(["rome"]) == {"deleted": 1, "missing": []}
+    first.sync()
+    assert first.snapshot.digest == second.snapshot.digest
+    assert first.snapshot.version == second.snapshot.version
+
+    first.reweight_threshold = second.reweight_threshold = 10
+    first.upsert({"extra": "extra document"})
+    assert first.reweight() is True  # A periodic pass is journaled, so the second runs it too
+    assert first.reweight() is False
+    second.sync()
+    assert second.snapshot.pending_changes == 0
+    assert (second.snapshot.digest, second.snapshot.version) == (first.snapshot.digest, first.snapshot.version)
+    assert sorted(second.snapshot.doc_ids) == ["extra", "more", "new", "python", "space"]
+
+def test_journal_checkpoints_spare_new_processes_the_replay(tmp_path, mocker):
+    from corpus_index import JournaledCorpus
+    journal = tmp_path / "journal.jsonl"
+    leader, caught_up, behind = (JournaledCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, str(journal),
+                                                 reweight_threshold=10, sync_interval_seconds=0) for _ in range(3))
+    leader.upsert({"one": "first new document"})
+    behind.sync()
+    leader.upsert({f"doc{i}": f"document number {i}" for i in range(20)})
+    caught_up.sync()
+    assert leader.checkpoint() is True
+    leader.delete(["rome"])  # Recorded after the checkpoint
+    assert journal.read_bytes().count(b"\n") == 2  # The header and the delete
+    assert [path.name for path in tmp_path.glob("*.checkpoint-*")] == ["journal.jsonl.checkpoint-1"]
+    assert caught_up.checkpoint() is True  # A second generation; the first checkpoint goes
+    assert [path.name for path in tmp_path.glob("*.checkpoint-*")] == ["journal.jsonl.checkpoint-2"]
+
+    # Like a worker forked from the startup snapshot: it loads the checkpoint instead of replaying.
+    forked = JournaledCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, str(journal), sync_interval_seconds=0)
+    preprocess = mocker.spy(forked, "_preprocess")
+    for corpus in (forked, behind, leader):
+        corpus.sync()
+    assert preprocess.call_count == 0
+    for corpus in (forked, behind, caught_up):
+        assert (corpus.snapshot.digest, corpus.snapshot.version) == (leader.snapshot.digest, leader.snapshot.version)
+        assert sorted(corpus.snapshot.doc_ids) == sorted(leader.snapshot.doc_ids)
+        assert corpus.snapshot.query("document number") == pytest.approx(leader.snapshot.query("document number"))
+    forked.upsert({"last": "the last document"})
+    leader.sync()
+    assert "last" in leader.snapshot.doc_ids
+
+def test_only_one_process_leads_the_journal(tmp_path):
+    from corpus_index import JournaledCorpus
+    journal = str(tmp_path / "journal.jsonl")
+    first, second = (JournaledCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, journal,
+                                     sync_interval_seconds=0) for _ in range(2))
+    assert first._lead() is True and first._lead() is True
+    assert second._lead() is False
+    first._leader[1].close()  # As when the leading process exits
+    assert second._lead() is True
+
+def test_journaled_corpus_propagates_across_forked_processes(tmp_path):
+    import multiprocessing
+    from corpus_index import JournaledCorpus
+    corpus = JournaledCorpus(CorpusIndex.build(DOCUMENTS, identity), identity, str(tmp_path / "journal.jsonl"),
+                             sync_interval_seconds=0.05)
+    assert corpus.start_syncing() is True and corpus.start_syncing() is False
+    assert corpus.snapshot.n_documents == 3
+    worker = multiprocessing.get_context("fork").Process(target=corpus.upsert, args=({"forked": "written by a child"},))
+    worker.start()
+    worker.join(timeout=30)
+    assert worker.exitcode == 0
+    deadline = time.monotonic() + 10
+    while "forked" not in corpus.snapshot.doc_ids and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert "forked" in corpus.snapshot.doc_ids
@@ -0,0 +1,80 @@
+import pytest
+from fingerprint import FingerprintIndex, fingerprint, iter_tokens
+
+DOCUMENTS = {
+    "python": "Python is a versatile and widely-used programming language. Known for its readability and extensive "
+              "libraries, it's popular in web development, data science, and artificial intelligence.",
+    "cooking": "Cooking involves applying heat to food to transform its chemical and physical properties.",
+}
+ESSAY = ("My essay starts with a few sentences of my own about why I enjoy writing software at night. "
+         "Known for its readability and extensive libraries, it's popular in web development, data science, "
+         "and artificial intelligence. Then it ends with more original thoughts about coffee and keyboards.")
+
+@pytest.fixture
+def index():
+    return FingerprintIndex.build(DOCUMENTS)
+
+def test_iter_tokens_handles_words_split_across_chunks():
+    """Chunked input yields the same tokens and offsets as the whole string."""
+    chunks = [ESSAY[i:i + 7] for i in range(0, len(ESSAY), 7)]
+    assert list(iter_tokens(chunks)) == list(iter_tokens(ESSAY))
+
+def test_fingerprints_of_short_text():
+    assert list(fingerprint("too short")) == []
+    assert len(list(fingerprint("exactly five words right here"))) == 1
+
+def test_find_passages_reports_offsets_in_both_texts(index):
+    """A copied sentence inside a longer essay is found with input and document offsets."""
+    passages = index.find_passages(ESSAY)
+    assert len(passages) == 1
+    passage = passages[0]
+    assert passage["doc_id"] == "python"
+    copied = ESSAY[passage["input_start"]:passage["input_end"]]
+    source = DOCUMENTS["python"][passage["doc_start"]:passage["doc_end"]]
+    assert copied == source
+    assert "readability and extensive libraries" in copied
+
+def test_find_passages_streams_chunks(index):
+    chunks = (ESSAY[i:i + 50] for i in range(0, len(ESSAY), 50))
+    assert index.find_passages(chunks) == index.find_passages(ESSAY)
+
+def test_find_passages_looks_up_fingerprints_while_streaming(index, monkeypatch):
+    """Fingerprints are looked up batch by batch as chunks arrive; spans crossing batches merge the same way."""
+    essay = " ".join([ESSAY] * 20)
+    expected = index.find_passages(essay)
+    assert len(expected) == 20
+    consumed, lookups = [], []
+    lookup = FingerprintIndex._lookup
+
+    def recording_lookup(self, batch, dead):
+        lookups.append((len(batch), len(consumed)))
+        return lookup(self, batch, dead)
+
+    def chunks():
+        for i in range(0, len(essay), 50):
+            consumed.append(i)
+            yield essay[i:i + 50]
+
+    monkeypatch.setattr(FingerprintIndex, "_lookup", recording_lookup)
+    monkeypatch.setattr("fingerprint.LOOKUP_BATCH_SIZE", 3)
+    assert index.find_passages(chunks()) == expected
+    assert max(size for size, _ in lookups) == 3
+    assert lookups[0][1] < len(consumed)  # The first lookup ran before the input was read to the end
+
+def test_find_passages_ignores_short_common_phrases(index):
+    assert index.find_passages("I think it is popular in web development circles these days.") == []
+
+def test_updates_and_compaction(index):
+    """Replaced and deleted documents stop matching; compaction keeps the live ones."""
+    updated = index.updated({"python": "Something else entirely, nothing copied from anywhere at all here."},
+                            deletions=["cooking"])
+    assert updated.find_passages(ESSAY) == []
+    assert updated.find_passages(DOCUMENTS["cooking"]) == []
+    assert index.find_passages(ESSAY) != []  # The previous snapshot is unchanged
+
+    readded = updated.updated({"python_copy": DOCUMENTS["python"]})
+    compacted = readded.compacted()
+    assert compacted.doc_ids == ["python", "python_copy"]
+    assert len(compacted.segments) == 1
+    assert compacted.find_passages(ESSAY) == readded.find_passages(ESSAY)
+    assert compacted.find_passages(ESSAY)[0]["doc_id"] == "python_copy"
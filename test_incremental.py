@@ -0,0 +1,85 @@
+from incremental import (DocumentStore, check_segments, contiguous_runs, group_windows, merge_matches, merge_passages,
+                         split_matches, split_segments)
+
+def test_split_segments_on_paragraphs_and_sentences():
+    text = "First paragraph.\n\n  Second one.\nThird line\n" + "A sentence here. " * 10 + "Last."
+    segments = split_segments(text, max_chars=60)
+    assert "".join(segment for _, segment in segments) == text
+    assert all(text[start:start + len(segment)] == segment for start, segment in segments)
+    assert [segment for _, segment in segments[:3]] == ["First paragraph.\n\n", "  Second one.\n", "Third line\n"]
+    # The long paragraph is packed into whole sentences of at most 60 characters.
+    assert [len(segment) for _, segment in segments[3:]] == [51, 51, 51, 22]
+    assert split_segments("") == [] and split_segments("One line") == [(0, "One line")]
+    assert split_segments("x" * 100, max_chars=10) == [(0, "x" * 100)]  # One sentence stays whole
+
+def test_editing_a_sentence_keeps_earlier_segments():
+    paragraph = "".join(f"Sentence number {i} is here. " for i in range(20))
+    before = split_segments(paragraph, max_chars=100)
+    after = split_segments(paragraph.replace("number 15", "number fifteen"), max_chars=100)
+    # Only the segment holding the edited sentence changes; the boundaries after it stay put here.
+    assert [a == b for (_, a), (_, b) in zip(before, after)] == [True] * 5 + [False, True]
+
+def test_group_windows_packs_whole_segments():
+    segments = split_segments("".join(f"Paragraph {i}: " + "words " * i + "\n" for i in range(1, 9)))
+    windows = group_windows(segments, min_chars=64)  # Segments of 20, 26, 32, ... 62 characters
+    assert "".join(window for _, window in windows) == "".join(segment for _, segment in segments)
+    assert [len(window) for _, window in windows] == [78, 82, 168]  # The last one takes the short remainder
+    assert [start for start, _ in windows] == [0, 78, 160]
+    assert group_windows(segments[:1], min_chars=64) == segments[:1] and group_windows([], 64) == []
+
+def test_document_store_reuses_results_checked_with_the_same_params():
+    store = DocumentStore(max_documents=2)
+    store.put("a", "grammar", {"language": "en-US"}, {"One.": [1]})
+    assert store.get("a", "grammar", {"language": "en-US"}) == {"One.": [1]}
+    assert store.get("a", "grammar", {"language": "de-DE"}) == {}
+    assert store.get("a", "ai", {}) == {}
+    store.put("b", "grammar", {}, {})
+    store.get("a", "grammar", {"language": "en-US"})  # "a" is now the most recently used
+    store.put("c", "grammar", {}, {})
+    assert len(store) == 2 and store.get("b", "grammar", {}) == {}
+
+def test_document_store_evicts_to_stay_within_its_character_budget():
+    store = DocumentStore(max_documents=10, max_chars=100)
+    store.put("a", "grammar", {}, {"x" * 40: 1})
+    store.put("a", "ai", {}, {"y" * 30: 1})
+    store.put("b", "grammar", {}, {"z" * 20: 1})
+    store.put("a", "grammar", {}, {"x" * 10: 1})  # Replacing results frees the old ones' budget
+    assert store.chars == 60 and len(store) == 2
+    store.put("c", "grammar", {}, {"w" * 50: 1})  # "b" is the least recently used
+    assert store.chars == 90 and store.get("b", "grammar", {}) == {} and store.get("a", "ai", {}) == {"y" * 30: 1}
+    store.put("d", "grammar", {}, {"v" * 150: 1})  # Too big to keep at all
+    assert store.chars == 0 and len(store) == 0
+
+def test_check_segments_checks_each_new_text_once():
+    calls = []
+
+    def check(missing):
+        calls.append(missing)
+        return [text.upper() for _, text in missing]
+
+    segments = [(0, "old\n"), (4, "new\n"), (8, "new\n"), (12, "other")]
+    results, checked = check_segments(segments, {"old\n": "cached"}, check)
+    assert results == ["cached", "NEW\n", "NEW\n", "OTHER"] and checked == 2
+    assert calls == [[(4, "new\n"), (12, "other")]]
+    assert contiguous_runs(calls[0]) == [[(4, "new\n")], [(12, "other")]]
+    assert contiguous_runs(segments) == [segments]
+    assert check_segments(segments[:1], {"old\n": "cached"}, check) == (["cached"], 0) and len(calls) == 1
+
+def test_matches_of_adjacent_segments_are_split_and_merged_in_utf16():
+    texts = ["Emoji 🌱 teh.\n", "Second teh", "Third"]
+    # "Second teh" starts at 14 UTF-16 code units, "Third" at 24; the match at 22 crosses into "Third".
+    matches = [{"offset": 24, "length": 5}, {"offset": 9, "length": 3}, {"offset": 21, "length": 3},
+               {"offset": 22, "length": 4}]
+    parts = split_matches(matches, texts)
+    assert parts == [[{"offset": 9, "length": 3}], [{"offset": 7, "length": 3}], [{"offset": 0, "length": 5}]]
+    segments = [(0, "Before 🌍\n"), (9, texts[0]), (23, texts[1])]
+    merged = merge_matches(segments, [[], parts[0], parts[1]])
+    assert [match["offset"] for match in merged] == [19, 31]  # "Before 🌍\n" is 10 UTF-16 code units
+
+def test_merge_passages_shifts_offsets_and_orders_longest_first():
+    segments = [(0, "a" * 10), (10, "b" * 10)]
+    passages = [[{"doc_id": "x", "input_start": 2, "input_end": 5, "matched_tokens": 6}],
+                [{"doc_id": "y", "input_start": 1, "input_end": 9, "matched_tokens": 9},
+                 {"doc_id": "z", "input_start": 0, "input_end": 3, "matched_tokens": 6}]]
+    merged = merge_passages(segments, passages, limit=2)
+    assert [(p["doc_id"], p["input_start"], p["input_end"]) for p in merged] == [("y", 11, 19), ("x", 2, 5)]
@@ -0,0 +1,141 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+import requests
+from languagetool_client import LanguageToolClient, split_paragraph_chunks
+
+class StubLanguageTool(BaseHTTPRequestHandler):
+    """Flags every 'tst' like LanguageTool would (UTF-16 offsets); behaviour set on the server."""
+    protocol_version = "HTTP/1.1"  # Keep-alive
+
+    def do_POST(self):
+        server = self.server
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode(), keep_blank_values=True)
+        text = form["text"][0]
+        with server.lock:
+            server.requests.append(text)
+            server.client_ports.add(self.client_address[1])
+            failures_left = server.failures
+            server.failures = max(0, server.failures - 1)
+        time.sleep(server.delay)
+        if failures_left:
+            body, status = b"{}", 503
+        else:
+            matches = [{"message": "Possible spelling mistake found.", "offset": len(text[:m.start()].encode("utf-16-le")) // 2,
+                        "length": 3, "rule": {"id": "MORFOLOGIK_RULE_EN_US"}} for m in re.finditer("tst", text)]
+            body, status = json.dumps({"language": {"code": form["language"][0]}, "matches": matches}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubLanguageTool)
+    server.lock = threading.Lock()
+    server.requests, server.client_ports, server.failures, server.delay = [], set(), 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v2/check"
+
+@pytest.fixture
+def stubs():
+    servers = [start_stub() for _ in range(2)]
+    yield servers
+    for server, _ in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_split_paragraph_chunks():
+    text = "First paragraph here.\n\nSecond one.\nThird " + "word " * 30
+    chunks = split_paragraph_chunks(text, max_chars=40)
+    assert "".join(chunk for _, chunk in chunks) == text
+    assert all(len(chunk) <= 40 for _, chunk in chunks)
+    assert all(text[start:start + len(chunk)] == chunk for start, chunk in chunks)
+    assert chunks[0][1] == "First paragraph here.\n\nSecond one.\n"  # Paragraphs packed while they fit
+    assert split_paragraph_chunks("short", max_chars=40) == [(0, "short")]
+
+def test_long_text_is_chunked_across_backends_with_original_offsets(stubs):
+    """Matches from concurrently checked chunks point into the original text, emoji included."""
+    paragraphs = [f"Paragraph {i} has a tst in it \N{GRINNING FACE} and then another tst." for i in range(12)]
+    text = "\n\n".join(paragraphs)
+    client = LanguageToolClient([url for _, url in stubs], max_chunk_chars=150, max_workers=4)
+    result = client.check(text, "en-US")
+    assert result["language"] == {"code": "en-US"}
+    expected = [m.start() for m in re.finditer("tst", text)]
+    as_utf16 = text.encode("utf-16-le")
+    assert [as_utf16[2 * m["offset"]:2 * (m["offset"] + m["length"])].decode("utf-16-le") for m in result["matches"]] == ["tst"] * len(expected)
+    assert len(result["matches"]) == 24
+    assert all(server.requests for server, _ in stubs)  # Both backends got chunks
+    assert sum(len(server.requests) for server, _ in stubs) == len(split_paragraph_chunks(text, 150))
+
+def test_check_all_returns_each_texts_matches(stubs):
+    texts = ["One tst.", "\n\n".join(f"Paragraph {i} has a tst." for i in range(6)), "No typo."]
+    client = LanguageToolClient([url for _, url in stubs], max_chunk_chars=60)
+    results = client.check_all(texts, "en-US")
+    assert [len(result["matches"]) for result in results] == [1, 6, 0]
+    assert [texts[1][m["offset"]:m["offset"] + 3] for m in results[1]["matches"]] == ["tst"] * 6
+    assert sum(len(server.requests) for server, _ in stubs) == 2 + len(split_paragraph_chunks(texts[1], 60))
+
+def test_connections_are_reused(stubs):
+    server, url = stubs[0]
+    client = LanguageToolClient(url)
+    for _ in range(5):
+        client.check("A tst.", "en-US")
+    assert len(server.requests) == 5
+    assert len(server.client_ports) == 1
+
+def test_connections_are_reused_by_concurrent_callers(stubs, caplog):
+    """Twelve threads sharing the client keep their connections: none is discarded and reopened."""
+    server, url = stubs[0]
+    server.delay = 0.02
+    client = LanguageToolClient(url, max_workers=4, pool_size=12)
+    barrier = threading.Barrier(12)
+
+    def caller():
+        barrier.wait()
+        for _ in range(5):
+            client.check("A tst.", "en-US")
+
+    threads = [threading.Thread(target=caller) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(server.requests) == 60
+    assert len(server.client_ports) <= 12
+    assert "Connection pool is full" not in caplog.text
+
+def test_retries_transient_errors_and_fails_over(stubs):
+    (first, first_url), (second, second_url) = stubs
+    first.failures = 1
+    assert len(LanguageToolClient(first_url, retries=1, backoff_factor=0).check("A tst.", "en-US")["matches"]) == 1
+    first.failures = 10
+    client = LanguageToolClient([first_url, second_url], retries=0)
+    assert len(client.check("A tst.", "en-US")["matches"]) == 1
+    assert second.requests == ["A tst."]
+
+def test_timeout(stubs):
+    server, url = stubs[0]
+    server.delay = 0.5
+    with pytest.raises(requests.exceptions.Timeout):
+        LanguageToolClient(url, timeout=(1, 0.1), retries=0).check("A tst.", "en-US")
+
+def test_observe_reports_every_backend_request(stubs):
+    (first, first_url), (_, second_url) = stubs
+    first.failures = 10
+    observed = []
+    client = LanguageToolClient([first_url, second_url], retries=0,
+                                observe=lambda url, status, seconds: observed.append((url, status)))
+    client.check("A tst.", "en-US")
+    assert observed == [(first_url, "503"), (second_url, "200")]
+    with pytest.raises(requests.exceptions.ConnectionError):
+        LanguageToolClient("http://127.0.0.1:9/v2/check", retries=0, observe=lambda *args: observed.append(args)).check("A tst.", "en-US")
+    assert observed[-1][:2] == ("http://127.0.0.1:9/v2/check", "error")
@@ -0,0 +1,95 @@
+import pstats
+import time
+
+import pytest
+
+from metrics import Registry, RequestProfiler
+
+def test_counters_and_histograms_render_in_prometheus_format():
+    registry = Registry()
+    requests = registry.counter("http_requests_total", "Requests.", ("endpoint", "status"))
+    latency = registry.histogram("latency_seconds", "Latency.", ("endpoint",), buckets=(0.1, 1))
+    requests.inc(endpoint="/a", status=200)
+    requests.inc(2, endpoint='/b"\n', status=500)
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.observe(value, endpoint="/a")
+    assert registry.render() == (
+        '# HELP http_requests_total Requests.\n'
+        '# TYPE http_requests_total counter\n'
+        'http_requests_total{endpoint="/a",status="200"} 1\n'
+        'http_requests_total{endpoint="/b\\"\\n",status="500"} 2\n'
+        '# HELP latency_seconds Latency.\n'
+        '# TYPE latency_seconds histogram\n'
+        'latency_seconds_bucket{endpoint="/a",le="0.1"} 2\n'  # Bucket bounds are inclusive
+        'latency_seconds_bucket{endpoint="/a",le="1"} 3\n'
+        'latency_seconds_bucket{endpoint="/a",le="+Inf"} 4\n'
+        'latency_seconds_sum{endpoint="/a"} 3.65\n'
+        'latency_seconds_count{endpoint="/a"} 4\n'
+    )
+
+def test_labels_and_names_are_checked():
+    registry = Registry()
+    counter = registry.counter("events_total", "Events.", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+    with pytest.raises(ValueError):
+        registry.counter("events_total", "Again.")
+    with pytest.raises(ValueError):
+        registry.counter("bad-name", "Invalid.")
+
+def test_histogram_time():
+    registry = Registry()
+    latency = registry.histogram("stage_seconds", "Stage time.", ("stage",))
+    with pytest.raises(RuntimeError):
+        with latency.time(stage="failing"):
+            raise RuntimeError()
+    assert 'stage_seconds_count{stage="failing"} 1' in registry.render()
+
+def test_processes_sharing_a_directory_are_summed(tmp_path, mocker):
+    worker_1, worker_2 = Registry(str(tmp_path)), Registry(str(tmp_path))
+    for registry in (worker_1, worker_2):
+        registry.counter("requests_total", "Requests.").inc()
+        registry.histogram("batch_size", "Batch size.", buckets=(1, 8)).observe(4)
+    mocker.patch("metrics.os.getpid", return_value=1)
+    worker_1.save()
+    mocker.patch("metrics.os.getpid", return_value=2)
+    worker_2.counter("unsaved_total", "Only in worker 2's live values.").inc()
+    rendered = worker_2.render()
+    assert "requests_total 2\n" in rendered
+    assert 'batch_size_bucket{le="8"} 2\n' in rendered and "batch_size_sum 8\n" in rendered
+    assert "unsaved_total 1\n" in rendered
+    assert [path.name.split("-")[1] for path in tmp_path.iterdir()] == ["1"]
+
+def test_recycled_process_ids_do_not_overwrite_snapshots(tmp_path, mocker):
+    """A restarted worker that gets an exited worker's process id keeps its counts in a file of its own."""
+    mocker.patch("metrics.os.getpid", return_value=7)
+    exited, restarted = Registry(str(tmp_path)), Registry(str(tmp_path))
+    for registry, count in ((exited, 5), (restarted, 1)):
+        registry.counter("requests_total", "Requests.").inc(count)
+        registry.save(force=True)
+    assert len(list(tmp_path.iterdir())) == 2
+    assert "requests_total 6\n" in Registry(str(tmp_path)).render()
+
+def test_save_is_throttled(tmp_path):
+    registry = Registry(str(tmp_path), write_interval=0.2)
+    counter = registry.counter("requests_total", "Requests.")
+    registry.save()
+    counter.inc()
+    registry.save()  # Too soon: written at the end of the interval instead
+    snapshot_file = next(tmp_path.iterdir())
+    assert '"samples": []' in snapshot_file.read_text()
+    time.sleep(0.5)
+    assert '"samples": [[[], 1]]' in snapshot_file.read_text()
+
+def test_request_profiler_samples_and_dumps_stats(tmp_path):
+    assert RequestProfiler(sample_rate=0, directory=str(tmp_path)).start() is None
+    profiler = RequestProfiler(sample_rate=1, directory=str(tmp_path / "profiles"))
+    running = profiler.start()
+    assert profiler.start() is None  # One profile at a time
+    sum(range(1000))
+    path = profiler.stop(running, "POST-/api/checkText")
+    assert path.startswith(str(tmp_path / "profiles" / "POST-_api_checkText-"))
+    assert pstats.Stats(path).total_calls > 0
+    running = profiler.start()  # Free again once stopped
+    assert running is not None
+    profiler.stop(running, "again")
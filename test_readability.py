@@ -0,0 +1,129 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+from readability import (SCORES, STATISTICS, _js_round_1, clean_text, score, score_batch, score_statistics, syllable_count,
+                         text_statistics)
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_readability_fixtures.json")
+
+EDGE_CASES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Readability formulas estimate how difficult a passage is to understand. They count words, sentences and syllables!",
+    "Well-known, state-of-the-art, mother-in-law; co-operate: re-enter (briefly) - and so on, and on, and on.",
+    "Wait... what?! Really?? Yes!!! No. Mr. Smith met Dr. Jones at 5 p.m. in the U.K. on Jan. 3rd.",
+    "   Leading spaces\tand tabs.\nNew lines\r\nand carriage returns\rare spaces.  Double  spaces   too.  ",
+    "<h1>Title</h1><p>First paragraph.</p><p>Second paragraph</p><ul><li>One</li><li>Two</li></ul> a < b > c",
+    "No terminator at all here",
+    "Simile forever shoreline. Unhappily, the forelegs were useless and the friendliness was unbelievable.",
+    "Beautiful delicious serious social potential curious religion musician Asia fashioned lovely ache changed",
+    "Quiet client diet science pier piano tiniest scientism McDonald coalition quality annual didn't equity",
+    "Rhythm myth crwth tsk hmm 1234 5678 x y z. Iii aaa eee ooo uuu.",
+    "Naïve café résumé — Ünïcödé façade non-breaking em-space　ideographic﻿BOM words.",
+    "CAPITALISED Words Are Proper Nouns Everywhere Beautifully Organised. International Corporations.",
+    "a",
+    "...",
+]
+
+WORDS = ("the a of and to in is it was he she they we you cats dogs house running jumped quickly beautiful "
+         "university international organization communication responsibility understanding education "
+         "simile forever shoreline unhappy foreleg carelessly friendliness sings singing walkers player "
+         "social potential precious religion creation fashioned delicious serious curious musician caucasia "
+         "crossed lovely changed judged carved observed hated decides purse hearse deal deign "
+         "piano quiet client diet riet audience alien McDonald realism little saddle coalition quality annual "
+         "couldn't equity pier tiniest Mr. Dr. U.S. e.g. 3.14 1,000 well-known x-ray mother-in-law "
+         "Rome Europe Apollo Python naïve café , ; : ! ? ... ( ) - -- <b> </b> </p> </li>").split()
+
+def random_texts(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        sentences = []
+        for _ in range(rng.randint(1, 6)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(1, 25))]
+            words[0] = words[0].capitalize()
+            sentences.append(" ".join(words) + rng.choice([".", ".", "!", "?", "", "..", "\n", ".\n\n", ";"]))
+        texts_separator = rng.choice([" ", "  ", "\n", "\r\n", "\t"])
+        yield rng.choice(["", " ", "\n"]) + texts_separator.join(sentences)
+
+def fixture_texts():
+    return EDGE_CASES + list(random_texts(300))
+
+def generate_fixtures():
+    """Scores and syllable counts from readability.js itself, run under node."""
+    script = """
+        const textstatistics = require("./readability.js");
+        const input = JSON.parse(require("fs").readFileSync(0, "utf8"));
+        const stats = textstatistics("x");
+        console.log(JSON.stringify({
+            syllables: Object.fromEntries(input.words.map(word => [word, stats.syllableCount(word)])),
+            texts: input.texts.map(text => {
+                const s = textstatistics(text);
+                return {text: text, scores: {
+                    flesch_reading_ease: s.fleschKincaidReadingEase(),
+                    flesch_kincaid_grade: s.fleschKincaidGradeLevel(),
+                    gunning_fog: s.gunningFogScore(),
+                    smog_index: s.smogIndex(),
+                    coleman_liau_index: s.colemanLiauIndex(),
+                    automated_readability_index: s.automatedReadabilityIndex(),
+                }};
+            }),
+        }));
+    """
+    words = sorted(set(WORDS) | {word for text in EDGE_CASES for word in text.split()})
+    result = subprocess.run(["node", "-e", script], input=json.dumps({"words": words, "texts": fixture_texts()}),
+                            capture_output=True, text=True, check=True, cwd=os.path.dirname(FIXTURES_PATH))
+    return json.loads(result.stdout)
+
+@pytest.fixture(scope="module")
+def fixtures():
+    with open(FIXTURES_PATH, encoding="utf-8") as fixtures_file:
+        return json.load(fixtures_file)
+
+def test_syllable_counts_match_readability_js(fixtures):
+    assert {word: syllable_count(word) for word in fixtures["syllables"]} == fixtures["syllables"]
+
+def test_scores_match_readability_js(fixtures):
+    for fixture in fixtures["texts"]:
+        assert score(fixture["text"]) == fixture["scores"], fixture["text"]
+
+def test_batch_scores_match_single_scores(fixtures):
+    texts = [fixture["text"] for fixture in fixtures["texts"]]
+    assert score_batch(texts) == [fixture["scores"] for fixture in fixtures["texts"]]
+    assert score_batch([]) == []
+
+@pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+def test_fixtures_are_current(fixtures):
+    assert generate_fixtures() == fixtures
+
+def test_cleaning_replaces_only_the_first_match_per_pass():
+    # readability.js's rules have no /g flag, so every pass replaces one more comma.
+    assert clean_text("a, b, c, d") == "a b, c, d."
+    assert clean_text(clean_text("a, b, c, d")) == "a b  c, d.."
+    assert clean_text("<p>One</p><p>Two</p>") == "One. Two."
+
+def test_statistics_use_the_second_and_third_cleaning_passes():
+    statistics = dict(zip(STATISTICS, text_statistics("Hi there. Bye")))
+    # Each pass appends a terminator: "Hi there. Bye.." then "Hi there. Bye..."
+    assert statistics["sentences"] == 3 and statistics["sentences_3"] == 4
+    assert statistics["words"] == statistics["words_3"] == 4
+
+def test_scores_round_halves_up_like_math_round():
+    # Math.round(2.5) is 3 and Math.round(-2.5) is -2; Python's round() gives 2 and -2.
+    assert _js_round_1(np.array([0.25, -0.25, 0.35, -0.04])).tolist() == [0.3, -0.2, 0.4, -0.0]
+    scores = score_statistics([[25, 8, 1, 8, 0, 8, 1, 0]] * 3)
+    assert set(scores) == set(SCORES) and all(len(values) == 3 for values in scores.values())
+
+def test_constructor_is_an_ordinary_word():
+    # readability.js finds Object.prototype.constructor among its exceptions and returns NaN scores.
+    assert syllable_count("constructor") == 3
+    assert all(np.isfinite(value) for value in score("The constructor was built.").values())
+
+if __name__ == "__main__":
+    # Regenerate the fixtures after changing readability.js: python test_readability.py
+    with open(FIXTURES_PATH, "w", encoding="utf-8") as fixtures_file:
+        json.dump(generate_fixtures(), fixtures_file, indent=1, ensure_ascii=False)
+        fixtures_file.write("\n")
@@ -0,0 +1,81 @@
+import time
+
+from result_cache import ResultCache, cache_key
+
+def test_cache_key_covers_namespace_text_and_params():
+    key = cache_key("checkText", "A tst.", {"language": "en-US"})
+    assert key == cache_key("checkText", "A tst.", {"language": "en-US"})
+    assert key != cache_key("checkText", "A tst. ", {"language": "en-US"})  # Offsets depend on exact text
+    assert key != cache_key("checkText", "A tst.", {"language": "en-GB"})
+    assert key != cache_key("checkAiText", "A tst.", {"language": "en-US"})
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", {"n": 1})
+    cache.put("b", {"n": 2})
+    assert cache.get("a") == {"n": 1}  # "b" is now least recently used
+    cache.put("c", {"n": 3})
+    assert cache.get("b") is None and cache.get("a") == {"n": 1} and cache.get("c") == {"n": 3}
+
+    cache = ResultCache(max_bytes=20)
+    cache.put("a", {"text": "x" * 8})
+    cache.put("b", {"text": "y" * 8})
+    assert cache.get("a") is None and cache.get("b") == {"text": "y" * 8}
+    cache.put("big", {"text": "z" * 50})  # Larger than the whole cache: not stored
+    assert cache.get("big") is None and cache.stats()["evictions"] == 1
+
+def test_values_are_copies():
+    cache = ResultCache()
+    value = {"matches": []}
+    cache.put("a", value)
+    value["matches"].append(1)
+    cache.get("a")["matches"].append(2)
+    assert cache.get("a") == {"matches": []}
+
+def test_ttl_expiry(mocker):
+    now = time.time()
+    clock = mocker.patch("result_cache.time.time", return_value=now)
+    cache = ResultCache(ttl_seconds=60)
+    cache.put("a", 1, namespace="checkText")
+    clock.return_value = now + 59
+    assert cache.get("a", namespace="checkText") == 1
+    clock.return_value = now + 61
+    assert cache.get("a", namespace="checkText") is None
+    stats = cache.stats()
+    assert (stats["expirations"], stats["entries"]) == (1, 0)
+    assert stats["namespaces"]["checkText"] == {"hits": 1, "memory_hits": 1, "expirations": 1, "misses": 1}
+
+def test_disk_tier_survives_restart_and_invalidation(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    cache = ResultCache(disk_path=path)
+    cache.put("a", {"ai_score": 0.9}, namespace="checkAiText")
+    cache.put("b", {"matches": []}, namespace="checkText")
+
+    restarted = ResultCache(disk_path=path)
+    assert restarted.get("a", namespace="checkAiText") == {"ai_score": 0.9}
+    assert restarted.get("a", namespace="checkAiText") == {"ai_score": 0.9}
+    assert (restarted.stats()["disk_hits"], restarted.stats()["memory_hits"]) == (1, 1)  # Promoted to memory
+
+    restarted.invalidate("checkAiText")
+    assert restarted.get("a", namespace="checkAiText") is None
+    assert ResultCache(disk_path=path).get("a") is None
+    assert ResultCache(disk_path=path).get("b") == {"matches": []}
+
+def test_memory_hits_do_not_wait_for_the_disk_tier(tmp_path):
+    import threading
+    cache = ResultCache(disk_path=str(tmp_path / "results.sqlite"))
+    cache.put("a", {"ai_score": 0.9})
+    results = []
+    with cache._disk_lock:  # As if another thread were in the middle of a slow SQLite commit
+        reader = threading.Thread(target=lambda: results.append(cache.get("a")))
+        reader.start()
+        reader.join(timeout=5)
+        assert results == [{"ai_score": 0.9}]
+    cache.put("b", 2)
+    assert ResultCache(disk_path=cache.disk_path).get("b") == 2
+
+def test_disabled_cache():
+    cache = ResultCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["enabled"] is False
@@ -38,10 +38,12 @@ function updateTestSummary() {
 
 // --- Mocking ---
 let mockFetchResponses = {};
+let mockFetchRequests = []; // { url, options } of every call, in order
 const originalFetch = window.fetch; // Store original fetch
 
 function mockFetch(url, options) {
     logTestMessage(`Mock Fetch called for URL: ${url}`);
+    mockFetchRequests.push({ url, options });
     if (mockFetchResponses[url]) {
         const mockResponse = mockFetchResponses[url];
         if (mockResponse.error) {
@@ -65,6 +67,7 @@ function setupMockFetch(url, data, ok = true, status = 200, error = false, error
 
 function resetMockFetch() {
     mockFetchResponses = {};
+    mockFetchRequests = [];
 }
 
 // --- DOM Elements (from test_runner.html) ---
@@ -72,6 +75,7 @@ const textInput = document.getElementById('text-input');
 const checkTextButton = document.getElementById('check-text-button');
 const checkPlagiarismButton = document.getElementById('check-plagiarism-button');
 const checkAiTextButton = document.getElementById('check-ai-text-button');
+const checkAllButton = document.getElementById('check-all-button');
 const resultsContent = document.getElementById('results-content');
 const readabilityResultsDiv = document.getElementById('readability-results');
 const plagiarismResultsDiv = document.getElementById('plagiarism-results');
@@ -145,7 +149,17 @@ async function testPlagiarismCheck() {
     await wait();
     recordTestResult('Plagiarism: Successful API response displays results', plagiarismResultsDiv.innerHTML.includes('potential_plagiarism') && plagiarismResultsDiv.innerHTML.includes('85.0%'));
 
-    // Test 3: API error
+    // Test 3: Copied passages are listed with the matching input excerpt
+    textInput.value = 'My own intro. Its fall in 476 AD marked the beginning of the Middle Ages. My own ending.';
+    setupMockFetch('http://localhost:5000/api/checkPlagiarism', {
+        status: 'partial_plagiarism', score: 0.31, details: '1 copied passage(s) found',
+        passages: [{ doc_id: 'doc1_histor_rome', input_start: 14, input_end: 71, doc_start: 150, doc_end: 207, matched_tokens: 12 }]
+    });
+    checkPlagiarismButton.click();
+    await wait();
+    recordTestResult('Plagiarism: Copied passages are listed', plagiarismResultsDiv.innerHTML.includes('Copied Passages (1)') && plagiarismResultsDiv.innerHTML.includes('Its fall in 476 AD') && plagiarismResultsDiv.innerHTML.includes('plagiarism-warning'));
+
+    // Test 4: API error
     textInput.value = 'Error test for plagiarism.';
     setupMockFetch('http://localhost:5000/api/checkPlagiarism', { error: 'API Error' }, false, 500, true);
     checkPlagiarismButton.click();
@@ -184,6 +198,15 @@ async function testAiTextCheck() {
     await wait();
     recordTestResult('AI Text: Successful API response (Human detected) displays results', aiTextResultsDiv.innerHTML.includes('10.0%') && aiTextResultsDiv.innerHTML.includes('Likely human-written'));
 
+    // Test 3b: Long document scored in windows
+    textInput.value = 'A long document. '.repeat(100);
+    setupMockFetch('http://localhost:5000/api/checkAiText', {
+        ai_score: 0.6, prediction_label: 'Fake', model_score: 0.6, truncated: false, scored_chars: 1700,
+        windows: [{ start: 0, end: 1200, tokens: 510, ai_score: 0.7 }, { start: 900, end: 1700, tokens: 380, ai_score: 0.5 }]
+    });
+    checkAiTextButton.click();
+    await wait();
+    recordTestResult('AI Text: Long document lists window scores', aiTextResultsDiv.innerHTML.includes('Scored in 2 sections') && aiTextResultsDiv.innerHTML.includes('Characters 900-1700: 50.0%'));
 
     // Test 4: API error
     textInput.value = 'Error test for AI text.';
@@ -196,6 +219,41 @@ async function testAiTextCheck() {
     logTestMessage('--- Finished AI Text Check Tests ---');
 }
 
+async function testRunAllChecks() {
+    logTestMessage('--- Starting Run All Checks Tests ---');
+
+    // Test 1: All results from one request, with a failed check shown in its own box
+    textInput.value = 'This is a testt. Its fall in 476 AD marked the beginning of the Middle Ages.';
+    setupMockFetch('http://localhost:5000/api/analyze', {
+        results: {
+            grammar: { matches: [{ message: 'Spelling mistake', context: { text: 'testt', offset: 10, length: 5 }, shortMessage: 'Typo', replacements: [{value: 'test'}] }] },
+            plagiarism: { status: 'potential_plagiarism', score: 0.85, details: 'High similarity with doc1' }
+        },
+        errors: { ai: { error: 'AI text detection model is not available yet; it is still loading.', status: 503 } },
+        cache: { grammar: 'MISS', plagiarism: 'MISS' },
+        timings_ms: { grammar: 40.2, plagiarism: 3.1, ai: 0.1, total: 40.9 }
+    });
+    checkAllButton.click();
+    await wait(100);
+    recordTestResult('All Checks: Grammar results are displayed', resultsContent.innerHTML.includes('Spelling mistake'));
+    recordTestResult('All Checks: Plagiarism results are displayed', plagiarismResultsDiv.innerHTML.includes('85.0%'));
+    recordTestResult('All Checks: Failed check shows its error', aiTextResultsDiv.innerHTML.includes('Failed to detect AI text') && aiTextResultsDiv.innerHTML.includes('still loading'));
+    recordTestResult('All Checks: Readability also runs', readabilityResultsDiv.innerHTML.includes('Readability Scores'));
+
+    // Test 2: Invalid request
+    setupMockFetch('http://localhost:5000/api/analyze', { error: "Missing 'language' field" }, false, 400);
+    checkAllButton.click();
+    await wait(100);
+    recordTestResult('All Checks: Request error is shown in every box', resultsContent.innerHTML.includes('Failed to run checks') && aiTextResultsDiv.innerHTML.includes("Missing 'language' field"));
+
+    // Test 3: Every run sends the same document id, so the server re-checks only what changed
+    const analyzeBodies = mockFetchRequests.filter(call => call.url.endsWith('/api/analyze')).map(call => JSON.parse(call.options.body));
+    recordTestResult('All Checks: Runs share one document id', analyzeBodies.length === 2 && !!analyzeBodies[0].document_id && analyzeBodies[0].document_id === analyzeBodies[1].document_id);
+
+    resetMockFetch();
+    logTestMessage('--- Finished Run All Checks Tests ---');
+}
+
 
 // --- Run all tests ---
 async function runAllTests() {
@@ -205,6 +263,7 @@ async function runAllTests() {
     await testGrammarAndStyleCheck();
     await testPlagiarismCheck();
     await testAiTextCheck();
+    await testRunAllChecks();
     
     // Restore original fetch
     window.fetch = originalFetch;
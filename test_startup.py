@@ -0,0 +1,30 @@
+import pytest
+from startup import ComponentStatus, process_uptime
+
+def test_component_lifecycle_and_readiness():
+    status = ComponentStatus()
+    status.register("corpus")
+    status.register("model", required=False)
+    assert not status.is_ready()
+    with status.loading("corpus"):
+        assert status.state("corpus") == "loading"
+    assert status.state("corpus") == "ready"
+    assert status.is_ready()  # The optional model does not gate readiness
+    snapshot = status.snapshot()
+    assert snapshot["corpus"]["load_seconds"] >= 0
+    assert snapshot["corpus"]["ready_after_seconds"] > 0
+    assert snapshot["model"]["state"] == "pending"
+
+def test_loading_failure_is_recorded_and_reraised():
+    status = ComponentStatus()
+    with pytest.raises(RuntimeError):
+        with status.loading("model"):
+            raise RuntimeError("weights missing")
+    assert status.state("model") == "failed"
+    assert status.snapshot()["model"]["error"] == "weights missing"
+    assert not status.is_ready()
+
+def test_process_uptime_increases():
+    first = process_uptime()
+    assert first > 0
+    assert process_uptime() >= first
@@ -0,0 +1,57 @@
+import random
+import string
+
+import nltk
+import pytest
+from corpus_index import _analyze
+from text_normalization import PUNCTUATION_TOKENS, normalize, normalize_batch, tokenize
+
+def original_preprocess(text):
+    """The preprocessing app.py used before text_normalization.py."""
+    tokens = nltk.word_tokenize(text.lower())
+    tokens = [token for token in tokens if token not in string.punctuation]
+    stop_words = nltk.corpus.stopwords.words('english')
+    return " ".join(token for token in tokens if token not in stop_words)
+
+EDGE_CASES = [
+    "The Roman Empire was founded by Augustus in 27 BC. It spanned across Europe, North Africa, and the Middle East.",
+    "It's state-of-the-art and/or well-known; we'll see. Can't, won't, cannot, gonna, wanna' -- 'tis o'clock!",
+    'He said "hello" (quietly)... U.S. e.g. 3.14 1,000 10:30 $5 50% email@x.com x+y foo_bar naïve café',
+    "Don’t “curly” quotes, rock'n'roll, they've' you're' cats' toys. Mr. Smith [note] {x} <y> a*b #tag @user",
+]
+
+WORDS = ("the a of and to in is it was he she they we you i me my not no can't won't don't it's we'll they've "
+         "I'm you're I'd cats' Rome's cannot gonna gimme wanna gotta lemme 'tis o'clock rock'n'roll state-of-the-art "
+         "and/or e.g. U.S. Mr. 3.14 1,000 10:30 $5 50% email@x.com x+y foo_bar naïve don’t “quoted” 'single' (paren) "
+         "[bracket] {brace} <angle> -- ... well-known Python language empire Europe Apollo 1969 — – ; : , ! ? * & # @ ^ ~ | = + _").split()
+
+def random_texts(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(3, 40))]
+        yield " ".join(word.capitalize() if rng.random() < 0.1 else
+                       word + rng.choice(".,!?;:\"')") if rng.random() < 0.08 else word for word in words)
+
+@pytest.mark.parametrize("text", EDGE_CASES + list(random_texts(300)))
+def test_regex_tokenizer_gives_the_same_index_terms_as_nltk(text):
+    assert _analyze(normalize(text)) == _analyze(original_preprocess(text))
+
+@pytest.mark.parametrize("text", EDGE_CASES)
+def test_nltk_tokenizer_reproduces_the_original_output(text):
+    assert normalize(text, tokenizer="nltk") == original_preprocess(text)
+
+def test_tokenize_splits_like_nltk():
+    assert tokenize("We'll see: it's state-of-the-art, isn't it? Cannot... 1,000") == [
+        "we", "'ll", "see", "it", "'s", "state-of-the-art", "is", "n't", "it", "can", "not", "1,000"]
+
+def test_punctuation_runs_are_dropped_like_the_original_substring_test():
+    assert {"", "(", "()", "*+,", "..."} - PUNCTUATION_TOKENS == {"..."}
+    assert normalize("()", tokenizer="nltk") == ""
+
+def test_normalize_batch():
+    texts = [EDGE_CASES[0], EDGE_CASES[1], EDGE_CASES[0], ""]
+    assert normalize_batch(texts) == [normalize(text) for text in texts]
+
+def test_unknown_tokenizer():
+    with pytest.raises(ValueError):
+        normalize("Some text", tokenizer="spacy")
@@ -0,0 +1,84 @@
+"""Text normalization for plagiarism scoring: lowercase, tokenize, drop stopwords and punctuation.
+
+Stopwords and punctuation are frozen sets, built once, so filtering a token is
+one hash lookup. Two tokenizers are available:
+
+* ``"regex"`` (default): one pass of regular expressions applying the rules of
+  NLTK's word tokenizer that decide which tokens survive filtering (clitics
+  such as ``n't`` and ``'ll``, ``cannot``/``gonna``-style splits, quotes,
+  brackets and sentence punctuation split off, hyphenated and dotted words
+  kept whole). It yields the same index terms as ``"nltk"`` without Punkt
+  sentence splitting. Tokens that contain no word characters (quotes,
+  brackets, ...) are dropped rather than kept, as they never become terms.
+* ``"nltk"``: ``nltk.word_tokenize``, the original behaviour.
+
+NLTK only treats a period as sentence-final where Punkt ends a sentence, while
+the regex tokenizer splits off every trailing period; the two differ only if a
+stopword is followed by an abbreviation-like period (``"no. 5"``).
+"""
+import functools
+import re
+import string
+
+TOKENIZERS = ("regex", "nltk")
+
+# `token not in string.punctuation` (the original filter) is a substring test, so any
+# run of consecutive punctuation characters, e.g. "()" or "*+", is dropped as well.
+PUNCTUATION_TOKENS = frozenset(string.punctuation[start:end] for start in range(len(string.punctuation) + 1)
+                               for end in range(start, len(string.punctuation) + 1))
+
+# Characters NLTK always splits off as tokens of their own, none of which contain word
+# characters, plus ":" and "," unless a digit follows (times and numbers stay whole) and
+# an opening apostrophe that does not start a clitic ("'quoted" but not "'s").
+_SEPARATORS_RE = re.compile(r"""[«»“”‘’„`"?!;@#$%&*()\[\]{}<>‒-―]|\.{2,}|--|[:,](?!\d)"""
+                            r"""|(?<!\w)'(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)""")
+# Clitics split off the end of a token ("don't" -> "do n't", "we'll" -> "we 'll"), by NLTK's
+# two rules in its order, so "you're'" -> "you 're '".
+_CLITIC_RES = (re.compile(r"(?<=[^' ])('s|'m|'d|')$"), re.compile(r"(?<=[^' ])('ll|'re|'ve|n't)$"))
+# Words NLTK then splits in two ("cannot" -> "can not"); a space is inserted after the first part.
+_CONTRACTIONS_RE = re.compile(r"\b(can(?=not\b)|gim(?=me\b)|gon(?=na\b)|got(?=ta\b)|lem(?=me\b)|d(?='ye\b)"
+                              r"|more(?='n\b)|wan(?=na(?:\s|$)))")
+
+
+@functools.lru_cache(maxsize=None)
+def english_stopwords():
+    """NLTK's English stopwords as a frozenset (read from the NLTK data once, on first use)."""
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words("english"))
+
+
+def tokenize(text, tokenizer="regex"):
+    """Lowercased tokens of `text`, before stopword and punctuation filtering."""
+    text = text.lower()
+    if tokenizer == "nltk":
+        import nltk
+        return nltk.word_tokenize(text)
+    if tokenizer != "regex":
+        raise ValueError(f"Unknown tokenizer {tokenizer!r}; expected one of {', '.join(TOKENIZERS)}")
+    tokens = []
+    for token in _SEPARATORS_RE.sub(" ", text).split():
+        token = token.rstrip(".")
+        clitics = []
+        for clitic_re in _CLITIC_RES:
+            clitic = clitic_re.search(token)
+            if clitic:
+                clitics.insert(0, clitic.group())
+                token = token[:clitic.start()]
+        if token:
+            tokens.append(token)
+        tokens.extend(clitics)
+    return _CONTRACTIONS_RE.sub(r"\1 ", " ".join(tokens)).split()
+
+
+def normalize(text, tokenizer="regex"):
+    """Space-joined tokens of `text` that are neither stopwords nor punctuation."""
+    stopwords = english_stopwords()
+    return " ".join(token for token in tokenize(text, tokenizer)
+                    if token not in stopwords and token not in PUNCTUATION_TOKENS)
+
+
+def normalize_batch(texts, tokenizer="regex"):
+    """`normalize` for many texts; identical texts are only processed once."""
+    normalized = {}
+    return [normalized[text] if text in normalized else normalized.setdefault(text, normalize(text, tokenizer))
+            for text in texts]